@@ -1,45 +1,107 @@
-import os, time, numpy as np, pandas as pd, wrds
+import os, time, threading, numpy as np, pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import panel_io
+import query_backend
+import query_cache
+import telemetry
 
 CRSP_FILE = "crsp_raw.parquet"
-
-# WRDS connection
-print("Login to WRDS")
-conn = wrds.Connection(wrds_username="maryamahli")
+CRSP_DIR = Path("crsp_raw")  # one Parquet partition per year; finished years are skipped on rerun
+YEARS = range(1973, 2026)
+N_CONN = int(os.environ.get("WRDS_CONNECTIONS", 4))
+# DAILY=1 also pulls crsp.dsf (year partitions under crsp_daily/, for stage 17) and the daily French factors
+DAILY = os.environ.get("DAILY", "") == "1"
+FRENCH = "https://mba.tuck.dartmouth.edu/pages/faculty/ken.french/ftp/"
+telemetry.start_stage("01_pull_clean")
+
+# WRDS connection for comp / link: queries go through the shared cache, which only logs in on a miss
+conn = query_cache.CachedConnection()
+
+# Small pool: one connection per worker thread, opened on first use
+_local, _pool = threading.local(), []
+
+def pooled_conn():
+    if not hasattr(_local, "conn"):
+        _local.conn = query_backend.connect()
+        _pool.append(_local.conn)
+    return _local.conn
+
+def pull_crsp_year(yr: int) -> int:
+    q = f"""
+    SELECT m.permno, m.date, n.shrcd, n.exchcd,
+           m.ret, d.dlret, m.prc, m.shrout
+    FROM   crsp.msf AS m
+    LEFT JOIN crsp.msedelist AS d
+           ON m.permno = d.permno AND m.date = d.dlstdt
+    JOIN   crsp.msenames AS n
+           ON m.permno = n.permno
+          AND m.date BETWEEN n.namedt AND n.nameendt
+    WHERE  m.date BETWEEN '{yr}-01-31' AND '{yr}-12-31'
+      AND  n.shrcd IN (10,11);
+    """
+    df = pooled_conn().raw_sql(q, date_cols=["date"])
+    df["mktcap"] = df["prc"].abs() * df["shrout"]
+    df["retx"]   = (1 + df["ret"].fillna(0)) * (1 + df["dlret"].fillna(0)) - 1
+
+    # write-then-rename so an interrupted pull never leaves a half-written partition
+    tmp = CRSP_DIR / f"crsp_{yr}.parquet.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, CRSP_DIR / f"crsp_{yr}.parquet")
+    return len(df)
+
+def pull_dsf_year(yr: int) -> int:
+    # Daily returns only (~20x the monthly rows), one year partition per query
+    q = f"""
+    SELECT d.permno, d.date, d.ret
+    FROM   crsp.dsf AS d
+    JOIN   crsp.msenames AS n
+           ON d.permno = n.permno
+          AND d.date BETWEEN n.namedt AND n.nameendt
+    WHERE  d.date BETWEEN '{yr}-01-01' AND '{yr}-12-31'
+      AND  n.shrcd IN (10,11);
+    """
+    df = pooled_conn().raw_sql(q, date_cols=["date"])
+    panel_io.write_daily_year(df, yr)
+    return len(df)
 
 # CRSP pull or load saved file
+sec = telemetry.begin("crsp_pull")
 if os.path.exists(CRSP_FILE):
     print(f"Reading CRSP from {CRSP_FILE}")
     crsp = pd.read_parquet(CRSP_FILE)
 else:
-    print("Pulling CRSP year by year")
-    t0, chunks = time.time(), []
-    for yr in range(1973, 2026):
-        q = f"""
-        SELECT m.permno, m.date, n.shrcd, n.exchcd,
-               m.ret, d.dlret, m.prc, m.shrout
-        FROM   crsp.msf AS m
-        LEFT JOIN crsp.msedelist AS d
-               ON m.permno = d.permno AND m.date = d.dlstdt
-        JOIN   crsp.msenames AS n
-               ON m.permno = n.permno
-              AND m.date BETWEEN n.namedt AND n.nameendt
-        WHERE  m.date BETWEEN '{yr}-01-31' AND '{yr}-12-31'
-          AND  n.shrcd IN (10,11);
-        """
-        df = conn.raw_sql(q, date_cols=["date"])
-        print(f"{yr}: {len(df):,} rows")
-        if df.empty:
-            continue
-        df["mktcap"] = df["prc"].abs() * df["shrout"]
-        df["retx"]   = (1 + df["ret"].fillna(0)) * (1 + df["dlret"].fillna(0)) - 1
-        chunks.append(df)
-
-    crsp = pd.concat(chunks, ignore_index=True)
-    print(f"CRSP concat complete ({len(crsp):,} rows) in {time.time() - t0:.1f} sec")
-    crsp.to_parquet(CRSP_FILE)
-    print(f"Saved raw CRSP to {CRSP_FILE}")
+    CRSP_DIR.mkdir(exist_ok=True)
+    todo = [yr for yr in YEARS if not (CRSP_DIR / f"crsp_{yr}.parquet").exists()]
+    print(f"Pulling CRSP: {len(YEARS) - len(todo)} years cached, {len(todo)} to pull on {N_CONN} connections")
+
+    t0, failed = time.time(), {}
+    try:
+        with ThreadPoolExecutor(max_workers=N_CONN) as pool:
+            futures = {pool.submit(pull_crsp_year, yr): yr for yr in todo}
+            for fut in as_completed(futures):
+                yr = futures[fut]
+                try:
+                    print(f"{yr}: {fut.result():,} rows")
+                except Exception as exc:
+                    failed[yr] = exc
+                    print(f"{yr}: FAILED ({exc})")
+    finally:
+        for c in _pool:
+            c.close()
+        _pool.clear()
+    if failed:
+        raise RuntimeError(f"CRSP pull failed for {sorted(failed)}; re-run to resume")
+
+    parts = [pd.read_parquet(CRSP_DIR / f"crsp_{yr}.parquet") for yr in YEARS]
+    crsp = pd.concat([p for p in parts if not p.empty], ignore_index=True)
+    print(f"CRSP assembled ({len(crsp):,} rows) in {time.time() - t0:.1f} sec")
+crsp["date"] = panel_io.month_end(crsp["date"])
+sec.add_rows(len(crsp))
+sec.end()
 
 # Compustat pull
+sec = telemetry.begin("comp_pull")
 print("Pulling Compustat fundamentals")
 q_comp = """
 SELECT gvkey, datadate, fyear, seq, ceq, txditc, pstkrv
@@ -50,8 +112,11 @@ WHERE  indfmt='INDL' AND datafmt='STD' AND consol='C' AND popsrc='D'
 comp = conn.raw_sql(q_comp, date_cols=["datadate"])
 comp["be"] = comp["ceq"].fillna(0) + comp["txditc"].fillna(0) - comp["pstkrv"].fillna(0)
 comp = comp[comp["be"] > 0]
+sec.add_rows(len(comp))
+sec.end()
 
 # Link table
+sec = telemetry.begin("link_merge")
 print("Linking Compustat to CRSP")
 q_ccm = """
 SELECT gvkey, lpermno AS permno,
@@ -64,8 +129,11 @@ link = conn.raw_sql(q_ccm, date_cols=["linkdt","linkenddt"])
 comp = comp.merge(link, on="gvkey", how="inner")
 mask = (comp["datadate"] >= comp["linkdt"]) & (comp["datadate"] <= comp["linkenddt"])
 comp = comp.loc[mask]
+sec.add_rows(len(comp))
+sec.end()
 
 # Book-to-market labels
+sec = telemetry.begin("style_labels")
 crsp["year"] = crsp["date"].dt.year
 dec = (crsp[crsp["date"].dt.month == 12]
        .loc[:, ["permno","year","mktcap","exchcd"]]
@@ -73,51 +141,95 @@ dec = (crsp[crsp["date"].dt.month == 12]
 bm = comp.merge(dec, on=["permno","fyear"], how="inner")
 bm["bm"] = bm["be"] / bm["dec_mktcap"]
 
-labels = []
-for yr, grp in bm[bm["exchcd"] == 1].groupby("fyear"):
-    p30, p70 = np.percentile(grp["bm"].dropna(), [30, 70])
-    tmp = bm[bm["fyear"] == yr].copy()
-    tmp["style"] = "Neutral"
-    tmp.loc[tmp["bm"] >= p70, "style"] = "Value"
-    tmp.loc[tmp["bm"] <= p30, "style"] = "Growth"
-    labels.append(tmp[["permno","fyear","style"]])
-labels = pd.concat(labels)
-
-labels["start"] = pd.to_datetime(labels["fyear"].astype(str)) + pd.offsets.MonthEnd(6)
-crsp = crsp.merge(labels[["permno","style","start"]],
-                  how="left", left_on=["permno","date"], right_on=["permno","start"])
-crsp["style"] = crsp.groupby("permno")["style"].ffill()
+# NYSE 30/70 breakpoints for all fiscal years in one grouped quantile, then vectorised labels
+bp = bm.loc[bm["exchcd"] == 1].groupby("fyear")["bm"].quantile([0.3, 0.7]).unstack()
+bp.columns = ["p30", "p70"]
+labels = bm[["permno","fyear","bm"]].join(bp, on="fyear", how="inner")
+labels["style"] = np.select([labels["bm"] <= labels["p30"], labels["bm"] >= labels["p70"]],
+                            ["Growth", "Value"], "Neutral")
+
+# Labels take effect on a CRSP month-end (as the old exact-date merge required) and carry forward
+labels["start"] = (pd.to_datetime(labels["fyear"].astype(str)) + pd.offsets.MonthEnd(6)).astype(crsp["date"].dtype)
+on_panel = pd.MultiIndex.from_frame(labels[["permno","start"]]).isin(pd.MultiIndex.from_frame(crsp[["permno","date"]]))
+labels = (labels.loc[on_panel, ["permno","style","start"]]
+                .drop_duplicates(["permno","start"], keep="last")
+                .sort_values("start"))
+crsp = pd.merge_asof(crsp.sort_values("date", kind="stable"), labels,
+                     left_on="date", right_on="start", by="permno", direction="backward")
+
+# STYLE_FREQ=monthly: also relabel every month on rolling NYSE breakpoints and current market cap
+if panel_io.STYLE_FREQ == "monthly":
+    crsp["style_monthly"] = panel_io.monthly_styles(crsp, comp)
+sec.add_rows(len(crsp))
+sec.end()
 
 # French factor pull
-def load_french(url, skiprows):
+def load_french(url, skiprows, daily=False):
     raw = pd.read_csv(url, skiprows=skiprows)
     raw = raw.rename(columns={"Unnamed: 0": "yyyymm"})
     raw = raw[raw["yyyymm"].fillna("").astype(str).str.strip().str.isdigit()]
 
     df = raw.melt(id_vars=["yyyymm"], var_name="factor", value_name="ret")
 
-    df["yyyymm"] = df["yyyymm"].astype(str).str.strip().str.slice(0, 6).str.zfill(6)
-    df["date"] = pd.to_datetime(df["yyyymm"], format="%Y%m", errors="coerce") + pd.offsets.MonthEnd(0)
+    if daily:  # yyyymmdd trading days, kept as they are
+        df["date"] = pd.to_datetime(df["yyyymm"].astype(str).str.strip(), format="%Y%m%d", errors="coerce")
+    else:
+        df["yyyymm"] = df["yyyymm"].astype(str).str.strip().str.slice(0, 6).str.zfill(6)
+        df["date"] = pd.to_datetime(df["yyyymm"], format="%Y%m", errors="coerce") + pd.offsets.MonthEnd(0)
 
     df["ret"] = pd.to_numeric(df["ret"], errors="coerce") / 100
     df = df.dropna(subset=["date", "ret"])
 
     return df.pivot(index="date", columns="factor", values="ret").reset_index()
 
+sec = telemetry.begin("french_pull")
 print("Pulling French factors")
-ff3 = load_french(
-    "https://mba.tuck.dartmouth.edu/pages/faculty/ken.french/ftp/F-F_Research_Data_Factors.CSV",
-    skiprows=3)
-ff5 = load_french(
-    "https://mba.tuck.dartmouth.edu/pages/faculty/ken.french/ftp/F-F_Research_Data_5_Factors_2x3.CSV",
-    skiprows=3)
+ff3 = query_cache.cached_url(FRENCH + "F-F_Research_Data_Factors.CSV", load_french, skiprows=3)
+ff5 = query_cache.cached_url(FRENCH + "F-F_Research_Data_5_Factors_2x3.CSV", load_french, skiprows=3)
 factors = ff3.merge(ff5[["date","RMW","CMA"]], on="date", how="left").rename(columns={"Mkt-RF": "MKT_RF"})
+sec.add_rows(len(factors))
+sec.end()
+
+# Daily CRSP and French factors (optional)
+if DAILY:
+    sec = telemetry.begin("daily_pull")
+    todo = sorted(set(YEARS) - set(panel_io.daily_years()))
+    print(f"Pulling CRSP daily: {len(YEARS) - len(todo)} years cached, {len(todo)} to pull on {N_CONN} connections")
+    failed = {}
+    try:
+        with ThreadPoolExecutor(max_workers=N_CONN) as pool:
+            futures = {pool.submit(pull_dsf_year, yr): yr for yr in todo}
+            for fut in as_completed(futures):
+                yr = futures[fut]
+                try:
+                    n = fut.result()
+                except Exception as exc:
+                    failed[yr] = exc
+                    print(f"{yr}: FAILED ({exc})")
+                    continue
+                print(f"{yr}: {n:,} daily rows")
+                sec.add_rows(n)
+    finally:
+        for c in _pool:
+            c.close()
+        _pool.clear()
+    if failed:
+        raise RuntimeError(f"CRSP daily pull failed for {sorted(failed)}; re-run to resume")
+
+    ff3d = query_cache.cached_url(FRENCH + "F-F_Research_Data_Factors_daily.CSV", load_french, skiprows=4, daily=True)
+    ff5d = query_cache.cached_url(FRENCH + "F-F_Research_Data_5_Factors_2x3_daily.CSV", load_french, skiprows=3, daily=True)
+    factors_daily = ff3d.merge(ff5d[["date","RMW","CMA"]], on="date", how="left").rename(columns={"Mkt-RF": "MKT_RF"})
+    factors_daily.astype({c: "float32" for c in panel_io.FACTOR_COLS}).to_parquet(panel_io.DAILY_FACTORS_FILE, index=False)
+    sec.end()
 
 # Save parquet files
+sec = telemetry.begin("save_outputs")
 print("Saving Parquet files")
-crsp.to_parquet("crsp_clean.parquet")
-comp[["permno","fyear","be"]].to_parquet("comp_clean.parquet")
-factors.to_parquet("french_factors.parquet", index=False)
+panel_io.to_parquet(crsp, "crsp_clean.parquet")
+panel_io.to_parquet(comp[["permno","fyear","be"]], "comp_clean.parquet")
+panel_io.to_parquet(factors, "french_factors.parquet", index=False)
+sec.add_rows(len(crsp))
+sec.end()
 
 print("Script complete. Files saved")
 conn.close()
@@ -1,13 +1,21 @@
 import pandas as pd
 from pathlib import Path
+import artifacts
+import feasibility
+import panel_io
+import telemetry
+import wide_panel
+
+telemetry.start_stage("02_feasible_panel")
 
 OUT_DIR = Path("outputs")
 OUT_DIR.mkdir(exist_ok=True)
 
 # Load files
+sec = telemetry.begin("parquet_read")
 print("Loading crsp_clean.parquet and french_factors.parquet")
-crsp = pd.read_parquet("crsp_clean.parquet")
-factors   = pd.read_parquet("french_factors.parquet")
+crsp = artifacts.read_parquet("crsp_clean.parquet")
+factors   = artifacts.read_parquet("french_factors.parquet")
 
 if factors.index.name == "date":
     factors = factors.reset_index()
@@ -15,7 +23,16 @@ if factors.index.name == "date":
 if factors.columns.duplicated().any():
     factors = factors.loc[:, ~factors.columns.duplicated()]
 
+# STYLE_FREQ=monthly: the monthly labels from 01 become "style" in the panel and the wide arrays
+if panel_io.STYLE_FREQ == "monthly":
+    if "style_monthly" not in crsp.columns:
+        raise SystemExit("STYLE_FREQ=monthly needs crsp_clean.parquet from 01 run with STYLE_FREQ=monthly")
+    crsp = crsp.rename(columns={"style": "style_annual", "style_monthly": "style"})
+sec.add_rows(len(crsp))
+sec.end()
+
 # Merge and compute excess return
+sec = telemetry.begin("factor_merge")
 print("Merging factors onto CRSP")
 crsp = crsp.merge(factors[["date", "RF"]], on="date", how="left")
 crsp["rexcess"] = crsp["retx"] - crsp["RF"]
@@ -26,18 +43,39 @@ crsp_f = crsp.merge(factors[["date"] + factor_cols], on="date", how="left")
 
 front = ["permno", "date", "rexcess", "RF"] + factor_cols
 crsp_f = crsp_f[[*front, *[c for c in crsp_f.columns if c not in front]]]
+sec.add_rows(len(crsp_f))
+sec.end()
+
+sec = telemetry.begin("parquet_write")
+panel_io.write_panel(crsp_f)
+panel_io.write_factors(factors[factors["date"].isin(crsp_f["date"].unique())])
+print("Saved crsp_factors/ (year partitions)  →  shape", crsp_f.shape)
+sec.add_rows(len(crsp_f))
+sec.end()
 
-crsp_f.to_parquet(OUT_DIR / "crsp_factors.parquet")
-print("Saved crsp_factors.parquet  →  shape", crsp_f.shape)
+sec = telemetry.begin("wide_build")
+n_dup = wide_panel.build(crsp_f)
+print("Saved wide/ memory-mapped date × PERMNO arrays"
+      + (f" ({n_dup:,} duplicate (permno, date) rows dropped)" if n_dup else ""))
+sec.add_rows(len(crsp_f))
+sec.end()
+
+sec = telemetry.begin("feasibility_index")
+W = wide_panel.load()
+feasibility.build(W)
+print("Saved wide/ feasibility bitmaps and prefix sums")
+sec.add_rows(W.shape[0] * W.shape[1])
+sec.end()
 
 # Find feasible stocks
+sec = telemetry.begin("feasibility_scan")
 print("Scanning for PERMNOs with at least 60 factor complete months")
-req_cols = ["rexcess", "MKT_RF", "SMB", "HML", "RMW", "CMA"]
-
-mask_complete = crsp_f[req_cols].notna().all(axis=1)
-feasible_permnos = (crsp_f[mask_complete].groupby("permno")["date"].count().pipe(lambda s: s[s >= 60]).index.astype(int)).tolist()
+n_valid = feasibility.load().total("valid")
+feasible_permnos = W.permnos[n_valid >= 60].astype(int).tolist()
 
 Path(OUT_DIR / "permnos_feasible.txt").write_text("\n".join(map(str, feasible_permnos)))
+sec.add_rows(len(crsp_f))
+sec.end()
 
 # Summary
 print("\n*** Summary ***")
@@ -45,5 +83,7 @@ print(f"Total CRSP rows: {len(crsp_f):,}")
 print(f"\nPERMNOs with at least 60 clean months: {len(feasible_permnos):,}")
 print("First 10 viable PERMNOs:", feasible_permnos[:10])
 print("\nOutputs written:")
-print("outputs/crsp_factors.parquet")
+print("outputs/crsp_factors/")
+print("outputs/factors_monthly.parquet")
+print("outputs/wide/ (with the feasibility index)")
 print("outputs/permnos_feasible.txt")
\ No newline at end of file
@@ -1,20 +1,40 @@
-import time, sys
+import os, time, sys
 from pathlib import Path
-import pandas as pd, statsmodels.api as sm
+import numpy as np, pandas as pd
 import pyarrow.parquet as pq
+import artifacts
+import beta_estimators
+import feasibility
+import panel_io
+import precision
+import telemetry
+import wide_panel
+
+telemetry.start_stage("03_betas_mu")
 
 OUT = Path("outputs")
 OUT.mkdir(exist_ok=True)
-PARTS_DIR = OUT / "beta_parts"
-PARTS_DIR.mkdir(exist_ok=True)
 
-CRSP_F = OUT / "crsp_factors.parquet"
 FEAS_TXT = OUT / "permnos_feasible.txt"
-DONE_TXT = OUT / "permnos_done.txt"
-MU_PQ = OUT / "mu_vectors.parquet"
 
-WINDOW = 36
-LAMBDA_ROLL = 180
+# BETA_WINDOW / LAMBDA_ROLL / BETA_ESTIMATORS env vars override these (sweep.py sets them per job)
+WINDOW = int(os.environ.get("BETA_WINDOW", 36))
+LAMBDA_ROLL = int(os.environ.get("LAMBDA_ROLL", 180))
+# Premia behind μ: "ts" rolls the factor returns themselves; "fm" rolls stage 19's monthly
+# Fama-MacBeth slopes (outputs/fm_lambda.parquet, per model) and writes mu_vectors_fm.parquet,
+# mu_vectors_{tag}_fm.parquet, ... (MU_TAG = "fm" / "{tag}_fm" in 05). Betas already fitted are kept
+LAMBDA_SOURCE = os.environ.get("LAMBDA_SOURCE", "ts")
+FM_LAMBDA_FILE = OUT / "fm_lambda.parquet"
+# "rolling" refits a WINDOW-month OLS each month and keeps the untagged file names
+# (beta_parts/, permnos_done.txt, mu_vectors.parquet); the recursive estimators write
+# beta_parts_{tag}/, permnos_done_{tag}.txt and mu_vectors_{tag}.parquet. They also keep each
+# stock's RLS state in rls_state_{tag}/: on a later run a done stock whose history has grown is
+# updated from its state with the new months only, into beta_parts_{tag}/permno_{p}_{YYYYMMDD}.parquet
+# Only "rolling" runs by default; the others are opt-in, e.g. BETA_ESTIMATORS=rolling,ewma,expanding,grid
+ESTIMATORS = os.environ.get("BETA_ESTIMATORS", "rolling").split(",")
+EWMA_HALFLIFE = 24  # months; the EWMA and expanding fits start after WINDOW observations
+# "grid" fits every window length in one pass per stock, tagged w{W} (beta_parts_w24/, mu_vectors_w24.parquet, ...)
+WINDOW_GRID = [24, 36, 60]
 REQUIRED = ["rexcess","MKT_RF","SMB","HML","RMW","CMA"]
 factor_sets = {
     "CAPM": ["MKT_RF"],
@@ -22,68 +42,155 @@ factor_sets = {
     "FF5" : ["MKT_RF","SMB","HML","RMW","CMA"],
 }
 
-# Load data
-crsp_f = pd.read_parquet(CRSP_F)
-feas_permnos = {int(x) for x in Path(FEAS_TXT).read_text().split()}
-done_permnos = set()
-if DONE_TXT.exists():
-    done_permnos = {int(x) for x in Path(DONE_TXT).read_text().split()}
-
-todo_permnos = sorted(feas_permnos - done_permnos)
-print(f"Feasible {len(feas_permnos):,}; done {len(done_permnos):,}; left {len(todo_permnos):,}")
-
-t0 = time.time()
-
-try:
-    for idx, permno in enumerate(todo_permnos, 1):
-        g_clean = crsp_f[crsp_f.permno == permno].sort_values("date").dropna(subset=REQUIRED).reset_index(drop=True)
-        if len(g_clean) < WINDOW:
-            with DONE_TXT.open("a") as f: f.write(f"{permno}\n")
-            continue
 
-        rows = []
-        for end_ix in range(WINDOW-1, len(g_clean)):
-            win = g_clean.iloc[end_ix-WINDOW+1:end_ix+1]
-            row = {"permno": permno, "date": win.iloc[-1]["date"]}
-            for mdl, cols in factor_sets.items():
-                res = sm.OLS(win["rexcess"], sm.add_constant(win[cols])).fit()
-                for c in cols:
-                    row[f"beta_{mdl}_{c}"] = res.params[c]
-            rows.append(row)
+def out_paths(tag: str):
+    sfx = "" if tag == "rolling" else f"_{tag}"
+    mu_sfx = sfx + ("_fm" if LAMBDA_SOURCE == "fm" else "")
+    return OUT / f"beta_parts{sfx}", OUT / f"permnos_done{sfx}.txt", OUT / f"mu_vectors{mu_sfx}.parquet"
 
-        if rows:
-            pd.DataFrame(rows).to_parquet(PARTS_DIR / f"permno_{permno}.parquet", index=False, compression="snappy")
-            #print(f"permno {permno}: {len(rows):,} rows")
 
-        with DONE_TXT.open("a") as f: f.write(f"{permno}\n")
+def state_path(tag: str, permno: int) -> Path:
+    return OUT / f"rls_state_{tag}" / f"permno_{permno}.npz"
 
-        if idx % 250 == 0 or idx == len(todo_permnos):
-            elapsed = time.time() - t0
-            eta = (len(todo_permnos) - idx) * (elapsed / idx)
-            pct = idx / len(todo_permnos)
 
-            print(f"  • {idx:>6}/{len(todo_permnos):,} permnos "
-                  f"({pct:4.1%}) | elapsed {elapsed / 60:5.1f} min | ETA {eta / 60:5.1f} min")
+def beta_tags() -> list[str]:
+    return [t for e in ESTIMATORS for t in ([f"w{w}" for w in WINDOW_GRID] if e == "grid" else [e])]
 
 
-except KeyboardInterrupt:
-    print("\nInterrupted – progress saved. Re-run to resume.")
-    sys.exit(0)
+# Load data
+feas_permnos = {int(x) for x in Path(FEAS_TXT).read_text().split()}
 
-print("\nRolling betas finished: files in outputs/beta_parts/")
+sec = telemetry.begin("wide_load")
+W = wide_panel.load()
+FX = feasibility.load()
+# Returns and factors in the compute precision (PRECISION=float32 halves what the fits read)
+fac = panel_io.read_factors(["date", *REQUIRED[1:]]).set_index("date").reindex(W.dates).to_numpy(precision.DTYPE)
+sec.add_rows(len(feas_permnos))
+sec.end()
+
+
+def rolling_rows(permno, g_clean) -> pd.DataFrame:
+    import statsmodels.api as sm  # deferred: only the rolling estimator uses it
+    rows = []
+    for end_ix in range(WINDOW-1, len(g_clean)):
+        win = g_clean.iloc[end_ix-WINDOW+1:end_ix+1]
+        row = {"permno": permno, "date": win.iloc[-1]["date"]}
+        for mdl, cols in factor_sets.items():
+            res = sm.OLS(win["rexcess"], sm.add_constant(win[cols])).fit()
+            for c in cols:
+                row[f"beta_{mdl}_{c}"] = res.params[c]
+            row[f"resvol_{mdl}"] = np.sqrt(res.mse_resid)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def recursive_rows(permno, g_clean, lam, prior=None):
+    # prior = (fits, last date fed) from a saved state: only the months after it are fed
+    models, skip = None, 0
+    if prior is not None:
+        models, last = prior
+        skip = int(np.searchsorted(g_clean["date"].to_numpy(), last, side="right"))
+    g_new = g_clean.iloc[skip:]
+    betas, models = beta_estimators.recursive_betas(g_new["rexcess"].to_numpy(), g_new[REQUIRED[1:]].to_numpy(),
+                                                    REQUIRED[1:], factor_sets, lam, WINDOW, models)
+    out = pd.DataFrame({"permno": permno, "date": g_new["date"].to_numpy(), **betas})
+    return out.iloc[max(WINDOW-1-skip, 0):], models
+
+
+def grid_rows(permno, g_clean) -> dict[str, pd.DataFrame]:
+    grid = beta_estimators.window_grid_betas(g_clean["rexcess"].to_numpy(), g_clean[REQUIRED[1:]].to_numpy(),
+                                             REQUIRED[1:], factor_sets, WINDOW_GRID)
+    return {f"w{w}": pd.DataFrame({"permno": permno, "date": g_clean["date"].to_numpy(), **betas}).iloc[w-1:]
+            for w, betas in grid.items()}
+
+
+for tag in ESTIMATORS:
+    parts_dir, done_txt, _ = out_paths(tag)
+    grid_dirs = {t: out_paths(t)[0] for t in beta_tags() if t.startswith("w")} if tag == "grid" else {tag: parts_dir}
+    for d in grid_dirs.values():
+        d.mkdir(exist_ok=True)
+    min_len = min(WINDOW_GRID) if tag == "grid" else WINDOW
+    lam = {"ewma": beta_estimators.ewma_lambda(EWMA_HALFLIFE), "expanding": 1.0}.get(tag)
+
+    done_permnos = set()
+    if done_txt.exists():
+        done_permnos = {int(x) for x in Path(done_txt).read_text().split()}
+
+    # Recursive estimators: done stocks with more clean months than their saved state has seen
+    priors = {}
+    if lam is not None:
+        state_path(tag, 0).parent.mkdir(exist_ok=True)
+        have = sorted(p for p in feas_permnos & done_permnos if state_path(tag, p).exists())
+        for p, n_valid in zip(have, FX.total("valid", W.cols(have))):
+            models, last = beta_estimators.load_state(state_path(tag, p))
+            if n_valid > next(iter(models.values())).n:
+                priors[p] = (models, last)
+
+    todo_permnos = sorted((feas_permnos - done_permnos) | set(priors))
+    todo_cols = W.cols(todo_permnos)
+    # Clean months per stock from the prefix sums, so short histories are skipped unread
+    todo_clean = np.where(todo_cols >= 0, FX.total("valid", todo_cols.clip(0)), 0)
+    print(f"[{tag}] Feasible {len(feas_permnos):,}; done {len(done_permnos):,}; left {len(todo_permnos) - len(priors):,}"
+          + (f"; {len(priors):,} to update" if priors else ""))
+
+    t0 = time.time()
+
+    section = {"rolling": "ols_loop", "grid": "gram_loop_grid"}.get(tag, f"rls_loop_{tag}")
+    with telemetry.section(section) as ols:
+        try:
+            for idx, permno in enumerate(todo_permnos, 1):
+                j = todo_cols[idx - 1]
+                if todo_clean[idx - 1] < min_len:
+                    with done_txt.open("a") as f: f.write(f"{permno}\n")
+                    continue
+                ok = W.valid[:, j]
+                g_clean = pd.DataFrame(fac[ok], columns=REQUIRED[1:])
+                g_clean.insert(0, "rexcess", W.rexcess[ok, j].astype(precision.DTYPE))
+                g_clean.insert(0, "date", W.dates[ok])
+
+                if tag == "grid":
+                    by_tag = grid_rows(permno, g_clean)
+                elif tag == "rolling":
+                    by_tag = {tag: rolling_rows(permno, g_clean)}
+                else:
+                    rows, models = recursive_rows(permno, g_clean, lam, priors.get(permno))
+                    by_tag = {tag: rows}
+
+                for t, rows in by_tag.items():
+                    ols.add_rows(len(rows))
+                    if len(rows):
+                        name = f"permno_{permno}_{rows['date'].iloc[0]:%Y%m%d}" if permno in priors else f"permno_{permno}"
+                        precision.floats(rows).to_parquet(grid_dirs[t] / f"{name}.parquet", index=False, compression="snappy")
+                        #print(f"permno {permno}: {len(rows):,} rows")
+
+                # State after the betas, so an interrupted update is redone from the old state
+                if lam is not None:
+                    beta_estimators.save_state(state_path(tag, permno), models, g_clean["date"].iloc[-1])
+                if permno not in priors:
+                    with done_txt.open("a") as f: f.write(f"{permno}\n")
+
+                if idx % 250 == 0 or idx == len(todo_permnos):
+                    elapsed = time.time() - t0
+                    eta = (len(todo_permnos) - idx) * (elapsed / idx)
+                    pct = idx / len(todo_permnos)
+
+                    print(f"  • {idx:>6}/{len(todo_permnos):,} permnos "
+                          f"({pct:4.1%}) | elapsed {elapsed / 60:5.1f} min | ETA {eta / 60:5.1f} min")
+
+
+        except KeyboardInterrupt:
+            print("\nInterrupted – progress saved. Re-run to resume.")
+            sys.exit(0)
+
+    # μ built before the update misses the new months
+    if priors:
+        for mu_pq in (OUT / f"mu_vectors_{tag}.parquet", OUT / f"mu_vectors_{tag}_fm.parquet"):
+            mu_pq.unlink(missing_ok=True)
+
+    print(f"\n{tag.capitalize()} betas finished: files in {', '.join(f'{d}/' for d in grid_dirs.values())}")
 
 # μ-vectors
-if MU_PQ.exists():
-    print("μ-vectors already exist")
-    sys.exit(0)
-
-print("Building μ-vectors")
-
-beta_ds = pq.ParquetDataset(PARTS_DIR)
-betas = beta_ds.read().to_pandas()
-
-factors = (pd.read_parquet("french_factors.parquet").assign(date=lambda d: pd.to_datetime(d["date"]) + pd.offsets.MonthEnd(0))
-             .sort_values("date").set_index("date"))
+factors = (artifacts.read_parquet("french_factors.parquet").sort_values("date").set_index("date"))
 
 for col in ["MKT_RF","SMB","HML","RMW","CMA","RF"]:
     factors[col] = pd.to_numeric(factors[col], errors="coerce")
@@ -95,19 +202,37 @@ for col in ["MKT_RF","SMB","HML","RMW","CMA","RF"]:
 
 lambda_bar = pd.concat(lambda_parts, axis=1).dropna(subset=["MKT_RF"])
 
-betas["date"] = pd.to_datetime(betas["date"]) + pd.offsets.MonthEnd(0)
-betas = betas.merge(lambda_bar, left_on="date", right_index=True, how="left")
-
-mu_rows = []
-for r in betas.itertuples():
-    mu_rows.append({
-        "permno": r.permno, "date": r.date,
-        "mu_capm": r.beta_CAPM_MKT_RF * r.MKT_RF + r.RF,
-        "mu_ff3":  r.beta_FF3_MKT_RF*r.MKT_RF + r.beta_FF3_SMB*r.SMB + r.beta_FF3_HML*r.HML + r.RF,
-        "mu_ff5":  (r.beta_FF5_MKT_RF*r.MKT_RF + r.beta_FF5_SMB*r.SMB + r.beta_FF5_HML*r.HML + r.beta_FF5_RMW*r.RMW +
-                    r.beta_FF5_CMA*r.CMA + r.RF)
-    })
-
-mu_df = pd.DataFrame(mu_rows).drop_duplicates(["permno", "date"], keep="last")
-pd.DataFrame(mu_rows).to_parquet(MU_PQ, index=False)
-print(f"Saved μ-vectors to {MU_PQ} ({len(mu_rows):,} rows)")
+# Premia per model: the same factor-return means for all three, or the mean of each model's last
+# LAMBDA_ROLL FM cross-sections, carried over months without one (with the same rolled RF)
+if LAMBDA_SOURCE == "fm":
+    fm = artifacts.read_parquet(FM_LAMBDA_FILE)
+    lambdas = {}
+    for mdl, cols in factor_sets.items():
+        part = fm[fm["model"] == mdl].set_index("date").sort_index()[cols]
+        part = part.rolling(LAMBDA_ROLL, min_periods=LAMBDA_ROLL).mean().reindex(factors.index).ffill()
+        lambdas[mdl] = part.join(lambda_bar["RF"], how="inner").dropna(subset=["MKT_RF"])
+else:
+    lambdas = {mdl: lambda_bar for mdl in factor_sets}
+
+for tag in beta_tags():
+    parts_dir, _, mu_pq = out_paths(tag)
+    if mu_pq.exists():
+        print(f"μ-vectors already exist ({mu_pq})")
+        continue
+
+    print(f"Building μ-vectors ({tag})")
+
+    with telemetry.section("mu_build" if tag == "rolling" else f"mu_build_{tag}") as sec:
+        beta_ds = pq.ParquetDataset(parts_dir)
+        betas = beta_ds.read().to_pandas()
+
+        # μ = β'λ + RF, one column per model
+        mu_df = betas[["permno", "date"]].copy()
+        for mdl, cols in factor_sets.items():
+            lam = lambdas[mdl].reindex(betas["date"])
+            mu_df[f"mu_{mdl.lower()}"] = (sum(betas[f"beta_{mdl}_{c}"].to_numpy(np.float64) * lam[c].to_numpy() for c in cols)
+                                          + lam["RF"].to_numpy())
+
+        artifacts.to_parquet(precision.floats(mu_df), mu_pq, index=False)
+        print(f"Saved μ-vectors to {mu_pq} ({len(mu_df):,} rows)")
+        sec.add_rows(len(mu_df))
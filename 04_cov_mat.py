@@ -1,68 +1,106 @@
-import time
+import os, time
 from pathlib import Path
 import pandas as pd, numpy as np
-from sklearn.covariance import LedoitWolf
 import joblib
+import cov_estimators
+import feasibility
+import precision
+import telemetry
+import wide_panel
+
+telemetry.start_stage("04_cov_mat")
 
 OUT = Path("outputs")
-COV_DIR = OUT / "cov_mats"
-COV_DIR.mkdir(parents=True, exist_ok=True)
 
-PANEL_PARQUET = OUT / "crsp_factors.parquet"
 FEASIBLE_TXT = OUT / "permnos_feasible.txt"
 
-WINDOW = 60
+# COV_WINDOW / COV_ESTIMATORS env vars override these (sweep.py sets them per job)
+WINDOW = int(os.environ.get("COV_WINDOW", 60))
 STYLE_BUCKETS = ["Value", "Growth"]
+# Any of cov_estimators.ESTIMATORS ("lw", "oas", "sample", "ewma", "nonlinear"); all share one
+# centred Gram pass per window. "lw" keeps outputs/cov_mats/, the others write cov_mats_{tag}/.
+# "nonlinear" adds an N x N eigendecomposition per window. Only "lw", which 05 reads, runs by
+# default; the others are opt-in, e.g. COV_ESTIMATORS=lw,oas,sample,ewma
+COV_ESTIMATORS = os.environ.get("COV_ESTIMATORS", "lw").split(",")
+COV_EWMA_HALFLIFE = 24  # months
+
+def cov_dir(tag: str) -> Path:
+    return OUT / ("cov_mats" if tag == "lw" else f"cov_mats_{tag}")
 
-def shrink_cov(ret_matrix: pd.DataFrame) -> pd.DataFrame:
-    lw = LedoitWolf().fit(ret_matrix)
-    cov = pd.DataFrame(lw.covariance_, index=ret_matrix.columns, columns=ret_matrix.columns)
-    return cov
+for tag in COV_ESTIMATORS:
+    cov_dir(tag).mkdir(parents=True, exist_ok=True)
 
-def already_done(style: str, date: pd.Timestamp) -> bool:
-    return (COV_DIR / f"Σ_{style}_{date:%Y%m%d}.joblib").exists()
+def estimate(tag: str, m: cov_estimators.WindowMoments) -> np.ndarray:
+    with telemetry.hot(f"cov_fit_{tag}", rows=m.N):
+        if tag == "ewma":
+            return cov_estimators.ewma(m, COV_EWMA_HALFLIFE)
+        return cov_estimators.ESTIMATORS[tag](m)
 
-def save_cov(style: str, date: pd.Timestamp, perm_list: list[int], cov_df: pd.DataFrame) -> None:
+def already_done(tag: str, style: str, date: pd.Timestamp) -> bool:
+    return (cov_dir(tag) / f"Σ_{style}_{date:%Y%m%d}.joblib").exists()
+
+def save_cov(tag: str, style: str, date: pd.Timestamp, perm_list: list[int], cov: np.ndarray) -> None:
     payload = {
         "permnos": perm_list,
-        "cov": cov_df.values.astype(np.float32)
+        "cov": cov.astype(np.float32)
     }
-    joblib.dump(payload, COV_DIR / f"Σ_{style}_{date:%Y%m%d}.joblib", compress=3)
+    joblib.dump(payload, cov_dir(tag) / f"Σ_{style}_{date:%Y%m%d}.joblib", compress=3)
 
 # Load panel
-print("Loading CRSP-factor panel")
-panel = pd.read_parquet(PANEL_PARQUET)
-feas_permnos = {int(x) for x in Path(FEASIBLE_TXT).read_text().split()}
-panel = panel[panel["permno"].isin(feas_permnos)]
-panel["date"] = pd.to_datetime(panel["date"]) + pd.offsets.MonthEnd(0)
+sec = telemetry.begin("wide_load")
+print("Loading wide return matrix")
+feas_permnos = [int(x) for x in Path(FEASIBLE_TXT).read_text().split()]
+W = wide_panel.load()
+FX = feasibility.load()
+feas_cols = np.sort(W.cols(feas_permnos))
+feas_cols = feas_cols[feas_cols >= 0]
+sec.add_rows(len(feas_cols))
+sec.end()
 
 # Rolling loop
+sec = telemetry.begin("rolling_cov_loop")
 start_time = time.time()
 
 for style in STYLE_BUCKETS:
-    g_sty = panel[panel["style"] == style].copy()
-    if g_sty.empty:
+    in_style = W.style[:, feas_cols] == W.style_code(style)
+    style_rows = np.flatnonzero(in_style.any(axis=1))
+    if not len(style_rows):
         print(f"[{style}] no rows – skipping")
         continue
 
-    unique_dates = sorted(g_sty["date"].unique())
+    unique_dates = W.dates[style_rows]
     print(f"[{style}] {len(unique_dates)} month-ends to process")
 
     for i, date in enumerate(unique_dates):
         if i < WINDOW - 1:
             continue
-        if already_done(style, date):
+        todo = [t for t in COV_ESTIMATORS if not already_done(t, style, date)]
+        if not todo:
             continue
 
-        win = g_sty[g_sty["date"].between(unique_dates[i-WINDOW+1], date)]
-        ret_mat = win.pivot_table(index="date", columns="permno", values="rexcess")
-
-        ret_mat = ret_mat.dropna(axis=1)
-        if ret_mat.shape[1] < 2:
+        # Window rows as a slice when contiguous, so the memmap block is a view
+        rows = style_rows[i-WINDOW+1:i+1]
+        contiguous = rows[-1] - rows[0] == len(rows) - 1
+        sl = slice(rows[0], rows[-1] + 1) if contiguous else rows
+
+        # Stocks in the style with a return in every window month; over contiguous rows the
+        # prefix-sum index answers the return half, and only the kept columns are read
+        keep = in_style[rows].all(axis=0)
+        if contiguous:
+            keep &= FX.complete("ret", rows[-1], WINDOW, feas_cols)
+        else:
+            keep &= ~np.isnan(W.rexcess[sl][:, feas_cols]).any(axis=0)
+        if keep.sum() < 2:
             continue
+        perm_list = W.permnos[feas_cols[keep]].tolist()
+        block = W.rexcess[sl][:, feas_cols[keep]]
 
-        cov_df = shrink_cov(ret_mat)
-        save_cov(style, date, cov_df.columns.tolist(), cov_df)
+        # One centred Gram pass shared by every estimator still missing for this window
+        with telemetry.hot("gram_pass", rows=len(perm_list)):
+            m = cov_estimators.WindowMoments(block, precision.DTYPE)
+        for tag in todo:
+            save_cov(tag, style, date, perm_list, estimate(tag, m))
+        sec.add_rows(1)
 
         if (i+1) % 24 == 0 or i == len(unique_dates) - 1:
             elapsed = time.time() - start_time
@@ -70,5 +108,6 @@ for style in STYLE_BUCKETS:
             pct = done / len(unique_dates)
             eta = (len(unique_dates)-done) * (elapsed / done)
             print(f"[{style}] {done:4}/{len(unique_dates)} ({pct:4.1%}) | elapsed {elapsed / 60:5.1f} min | ETA {eta / 60:5.1f} min")
+sec.end()
 
-print("\nAll covariance matrices saved to outputs/cov_mats/")
+print(f"\nAll covariance matrices saved to {', '.join(f'{cov_dir(t)}/' for t in COV_ESTIMATORS)}")
@@ -1,42 +1,68 @@
-import time
+import os, time
 from pathlib import Path
-import pandas as pd, numpy as np, cvxpy as cp
+import pandas as pd, numpy as np
 import joblib
+import artifacts
+import optimiser
+import panel_io
+import precision
+import telemetry
+
+telemetry.start_stage("05_optimise")
 
 OUT = Path("outputs")
-COV_DIR = OUT / "cov_mats"
+# Σ from stage 04: "lw" (legacy cov_mats/) or another COV_ESTIMATORS tag ("oas", "sample", "ewma", "nonlinear");
+# "daily" reads stage 17's daily-return Σ (cov_mats_daily/)
+COV_TAG = "lw"
+COV_DIR = OUT / ("cov_mats" if COV_TAG == "lw" else f"cov_mats_{COV_TAG}")
 WEIGHT_DIR = OUT / "weights"
 WEIGHT_DIR.mkdir(exist_ok=True)
 
-MU_FILE = OUT / "mu_vectors.parquet"
-PANEL_FILE = OUT / "crsp_factors.parquet"
+# μ-vectors from stage 03: "rolling" (legacy mu_vectors.parquet), "ewma", "expanding" or a grid window "w24" / "w36" / "w60";
+# "daily" reads stage 17's daily-beta μ; "fm" / "{tag}_fm" the Fama-MacBeth premia (03 with LAMBDA_SOURCE=fm)
+MU_TAG = "rolling"
+MU_FILE = OUT / ("mu_vectors.parquet" if MU_TAG == "rolling" else f"mu_vectors_{MU_TAG}.parquet")
 
 MODELS = {"CAPM": "mu_capm", "FF3": "mu_ff3", "FF5": "mu_ff5"}
-TARGET = 0.005 # ≥0.5% monthly expected excess return
+TARGET = float(os.environ.get("TARGET", 0.005)) # ≥0.5% monthly expected excess return
+# "BATCH" solves blocks of months together (optimiser.solve_batch), with ECOS where polishing fails
 SOLVER = "ECOS"
 
 # Load μ-vectors and style panel
-mu_all = pd.read_parquet(MU_FILE)
-panel = pd.read_parquet(PANEL_FILE)[["permno", "date", "style"]]
-panel["date"] = pd.to_datetime(panel["date"]) + pd.offsets.MonthEnd(0)
+sec = telemetry.begin("parquet_read")
+mu_all = artifacts.read_parquet(MU_FILE)
+panel = panel_io.read_panel(["permno", "date", "style"], styles=["Value", "Growth"])
+sec.add_rows(len(mu_all) + len(panel))
+sec.end()
 
 print("μ-vector rows:", len(mu_all))
 print("Panel rows:", len(panel))
 
-def optimise(mu_vec, Sigma):
-    n = len(mu_vec)
-    w = cp.Variable(n)
-    prob = cp.Problem(cp.Minimize(cp.quad_form(w, Sigma)), [cp.sum(w) == 1, w >= 0, mu_vec @ w >= TARGET])
-    prob.solve(solver=SOLVER, warm_start=True)
-    return None if w.value is None else w.value.round(10)
-
 start = time.time()
 
+
+def record(writers, date, permnos, mdl, w):
+    if w is not None:
+        writers[mdl].extend({"date": date, "permno": p, "weight": w_i} for p, w_i in zip(permnos, w) if w_i > 0)
+
+
+def solve_pending(writers, pending):
+    # SOLVER = "BATCH": one batched solve for the queued months, every model of a month on its Σ
+    if pending:
+        results = optimiser.solve_batch([(Sigma, mus) for _, _, Sigma, mus in pending], TARGET)
+        for (date, permnos, _, _), res in zip(pending, results):
+            for mdl, (w, _) in res.items():
+                record(writers, date, permnos, mdl, w)
+        pending.clear()
+
+
 # Optimise weights for each style and model
+sec = telemetry.begin("optimise_loop")
 for style in ["Value", "Growth"]:
 
     style_mask = panel[panel["style"] == style][["permno", "date"]]
     writers = {m: [] for m in MODELS}
+    pending, cells = [], 0
 
     cov_files = sorted(COV_DIR.glob(f"Σ_{style}_*.joblib"))
     if not cov_files:
@@ -46,11 +72,13 @@ for style in ["Value", "Growth"]:
     print(f"\n[{style}] {len(cov_files)} month-ends to optimise")
     for k, fp in enumerate(cov_files, 1):
         date_str = fp.stem.split("_")[-1]
-        date     = pd.to_datetime(date_str) + pd.offsets.MonthEnd(0)
+        date     = pd.to_datetime(date_str)
 
-        payload  = joblib.load(fp)
+        with telemetry.hot("cov_load"):
+            payload  = joblib.load(fp)
         permnos  = payload["permnos"]
-        Sigma    = payload["cov"].astype(float)
+        # Σ in the compute precision; cvxpy hands the solver a float64 problem either way
+        Sigma    = payload["cov"].astype(precision.DTYPE)
 
         live = set(style_mask[style_mask["date"] == date]["permno"])
         keep_idx = [i for i, p in enumerate(permnos) if p in live]
@@ -61,26 +89,37 @@ for style in ["Value", "Growth"]:
 
         mu_row = mu_all[mu_all["date"] == date].drop_duplicates("permno", keep="last").set_index("permno").reindex(permnos)
 
+        mus = {}
         for mdl, col in MODELS.items():
             mu_vec = mu_row[col].values
             if np.isnan(mu_vec).any():
                 continue
-
-            w = optimise(mu_vec, Sigma)
-            if w is None:
-                continue
-
-            writers[mdl].extend({"date": date, "permno": p, "weight": w_i} for p, w_i in zip(permnos, w) if w_i > 0)
+            mus[mdl] = mu_vec
+
+        if SOLVER == "BATCH" and mus:
+            pending.append((date, permnos, Sigma, mus))
+            cells += len(permnos) ** 2
+            if cells >= optimiser.BATCH_CELLS:
+                solve_pending(writers, pending)
+                cells = 0
+        else:
+            for mdl, mu_vec in mus.items():
+                record(writers, date, permnos, mdl, optimiser.optimise(mu_vec, Sigma, TARGET, SOLVER))
+        sec.add_rows(1)
 
         if k % 24 == 0 or k == len(cov_files):
             elapsed = (time.time() - start) / 60
             pct = k / len(cov_files)
             print(f"{k:4}/{len(cov_files)} months, ({pct:4.1%}) elapsed {elapsed:5.1f} min")
 
+    solve_pending(writers, pending)
     for mdl, rows in writers.items():
         if rows:
             out_path = WEIGHT_DIR / f"weights_{style}_{mdl}.parquet"
-            pd.DataFrame(rows).to_parquet(out_path, index=False)
+            artifacts.to_parquet(precision.floats(pd.DataFrame(rows)), out_path, index=False)
             print(f"  [{style}] wrote {len(rows):,} rows → {out_path}")
+sec.end()
 
+if SOLVER == "BATCH":
+    print("Batched solves: {polished:,} polished, {fallback:,} via ECOS, {infeasible:,} infeasible".format(**optimiser.batch_stats))
 print(f"\nAll optimisations finished in {(time.time()-start)/60:5.1f} minutes.")
\ No newline at end of file
@@ -1,22 +1,24 @@
 import numpy as np, pandas as pd
 from pathlib import Path
 from scipy.stats import skew, kurtosis
+import artifacts
+import crises
+import precision
+import telemetry
+import wide_panel
+
+telemetry.start_stage("06_backtest_metrics")
 
 # File paths & crisis windows
 OUT_DIR = Path("outputs")
 WGT_DIR = OUT_DIR / "weights"
 
-PANEL = pd.read_parquet("outputs/crsp_factors.parquet")[["permno","date","rexcess"]].copy()
-PANEL["date"] = pd.to_datetime(PANEL["date"]) + pd.offsets.MonthEnd(0)
+sec = telemetry.begin("wide_load")
+W = wide_panel.load()
+sec.add_rows(W.shape[0] * W.shape[1])
+sec.end()
 
-CRISES = {
-    "Full"        : ("1900-01-31",  "2100-12-31"),
-    "Black87"     : ("1987-08-31",  "1987-12-31"),
-    "DotCom"      : ("2000-03-31",  "2002-09-30"),
-    "GFC"         : ("2007-07-31",  "2009-03-31"),
-    "Covid"       : ("2020-02-29",  "2021-03-31"),
-    "RateShock22" : ("2022-01-31",  "2023-10-31"),
-}
+CRISES = {"Full": crises.FULL, **crises.CRISES}
 
 # Functions
 def cvar(series, p=0.05):
@@ -58,27 +60,30 @@ def add_arrows(df):
     return nice
 
 # Build portfolio return series
+sec = telemetry.begin("pnl_build")
 returns_all = []
 
 for fp in sorted(WGT_DIR.glob("weights_*.parquet")):
     style, model = fp.stem.split("_")[1:]
     tag = f"{style}_{model}"
 
-    wgt = pd.read_parquet(fp)
-    wgt["date"] = pd.to_datetime(wgt["date"]) + pd.offsets.MonthEnd(0)
+    wgt = artifacts.read_parquet(fp)
     wgt["hold_date"] = wgt["date"] + pd.offsets.MonthEnd(1)
 
-    merged = wgt.merge(PANEL, left_on=["permno","hold_date"], right_on=["permno","date"], how="left", suffixes=("","_ret")).dropna(subset=["rexcess"])
+    wgt["rexcess"] = W.lookup(W.rexcess, wgt["hold_date"], wgt["permno"], precision.DTYPE)
+    merged = wgt.dropna(subset=["rexcess"])
 
-    port_ret = merged.groupby("hold_date").apply(lambda df: np.dot(df["weight"],df["rexcess"]), include_groups=False).rename(tag)
+    port_ret = (merged["weight"] * merged["rexcess"]).groupby(merged["hold_date"]).sum().rename(tag)
     returns_all.append(port_ret)
+sec.end()
 
 # Combine into a single DataFrame
-rets = pd.concat(returns_all, axis=1).sort_index()
-rets.to_parquet(OUT_DIR / "pnl_series.parquet")
+rets = precision.floats(pd.concat(returns_all, axis=1).sort_index())
+artifacts.to_parquet(rets, OUT_DIR / "pnl_series.parquet")
 print(f"Built P&L series – shape {rets.shape}")
 
 # Compute risk metrics
+sec = telemetry.begin("risk_metrics")
 rows = []
 for lbl, (t0, t1) in CRISES.items():
     sub = rets.loc[t0:t1]
@@ -122,10 +127,17 @@ for lbl, (t0, t1) in CRISES.items():
 
 metrics = pd.DataFrame(rows)
 metrics.to_parquet(OUT_DIR / "risk_metrics.parquet")
+sec.add_rows(len(metrics))
+sec.end()
 
 # Display
 print("\n=====  Risk metrics  =====")
 for win in metrics["window"].unique():
     block = metrics[metrics["window"] == win]
     print(f"\n### {win} ###")
-    print(add_arrows(block).to_string(index=False))
\ No newline at end of file
+    print(add_arrows(block).to_string(index=False))
+# Accuracy guard against a float64 run (PRECISION_REF=<its outputs/>)
+if precision.REF_DIR:
+    check = precision.compare(Path(precision.REF_DIR), OUT_DIR)
+    check.to_parquet(OUT_DIR / "precision_check.parquet", index=False)
+    precision.report(check)
@@ -1,21 +1,22 @@
-import pandas as pd, wrds
+import pandas as pd
 import numpy as np
 from pathlib import Path
+import artifacts
+import query_cache
+import telemetry
+import wide_panel
+
+telemetry.start_stage("07_benchmark_pull")
 
 # Paths & constants
 OUT_DIR = Path("outputs");  OUT_DIR.mkdir(exist_ok=True)
-CACHE_SP500 = Path("sp500_tr.parquet")
 START, END = "1973-01-31", "2025-12-31"
 DATE_IDX = pd.date_range(START, END, freq="ME")
 
-# S&P-500 total-return (sprtrn) from crsp.msi
+# S&P-500 total-return (sprtrn) from crsp.msi, served from the shared query cache
 def load_sp500_tr(force_refresh=False):
 
-    if CACHE_SP500.exists() and not force_refresh:
-        return pd.read_parquet(CACHE_SP500)["SP500_TR"]
-
-    print("Pulling S&P-500 total return (sprtrn) from crsp.msi")
-    conn = wrds.Connection(wrds_username="maryamahli")
+    conn = query_cache.CachedConnection()
 
     q = f"""
         SELECT date, sprtrn
@@ -23,55 +24,70 @@ def load_sp500_tr(force_refresh=False):
         WHERE  date BETWEEN '{START}' AND '{END}'
         ORDER  BY date;
     """
-    df = conn.raw_sql(q, date_cols=["date"])
+    df = conn.raw_sql(q, date_cols=["date"], refresh=force_refresh or None)
     conn.close()
 
     df["sprtrn"] = pd.to_numeric(df["sprtrn"], errors="coerce")
-    ser = df.set_index("date")["sprtrn"].resample("ME").last().rename("SP500_TR")
-    ser.to_frame().to_parquet(CACHE_SP500)
-    print(f"Cached S&P-500 TR to {CACHE_SP500.name} ({len(ser):,} rows)")
-    return ser
+    return df.set_index("date")["sprtrn"].resample("ME").last().rename("SP500_TR")
+
 
+# Per-date style sums over the wide arrays, a block of months at a time
+def style_sums(W, style: str, block: int = 60) -> pd.DataFrame:
+    code = W.style_code(style)
+    out = np.zeros((len(W.dates), 4))
+    for lo in range(0, len(W.dates), block):
+        sl = slice(lo, lo + block)
+        in_sty = W.style[sl] == code
+        r = W.rexcess[sl].astype(np.float64)
+        me = W.mktcap[sl].astype(np.float64)
+        has_r = in_sty & ~np.isnan(r)
+        has_me = in_sty & ~np.isnan(me)
+        out[sl, 0] = has_r.sum(axis=1)
+        out[sl, 1] = np.where(has_r, r, 0).sum(axis=1)
+        out[sl, 2] = np.where(has_r & has_me, r * me, 0).sum(axis=1)
+        out[sl, 3] = np.where(has_me, me, 0).sum(axis=1)
+    return pd.DataFrame(out, index=W.dates, columns=["n_ret", "sum_ret", "sum_me_ret", "sum_me"])
 
 # Equal-weight style helper
-def equal_weight(panel: pd.DataFrame, style: str) -> pd.Series:
-    sub = panel[panel["style"] == style]
-    ew = sub.groupby("date", observed=True, sort=False).agg(EW_Return=("rexcess", "mean")).squeeze()
+def equal_weight(W, style: str) -> pd.Series:
+    s = style_sums(W, style)
+    ew = (s["sum_ret"] / s["n_ret"]).where(s["n_ret"] > 0)
     ew.name = f"EW_{style}"
     return ew
 
 # Cap-weighted style helper
-def value_weight(panel: pd.DataFrame, style: str) -> pd.Series:
-    sub = panel[panel["style"] == style]
-    def wavg(df):
-        if df["rexcess"].isna().all():
-            return np.nan
-        return (df["rexcess"] * df["me"]).sum() / df["me"].sum()
-    vw = sub.groupby("date", observed=True).apply(wavg, include_groups=False)
+def value_weight(W, style: str) -> pd.Series:
+    s = style_sums(W, style)
+    vw = (s["sum_me_ret"] / s["sum_me"]).where(s["n_ret"] > 0)
     vw.name = f"VW_{style}"
     return vw
 
-# Load CRSP-factor panel & RF
-panel = pd.read_parquet("outputs/crsp_factors.parquet", columns=["date", "style", "rexcess", "mktcap"]).rename(columns={"mktcap": "me"}).assign(date=lambda d: pd.to_datetime(d["date"])+pd.offsets.MonthEnd(0))
+# Load wide panel & RF
+sec = telemetry.begin("wide_load")
+panel = wide_panel.load()
 
-ff = pd.read_parquet("french_factors.parquet")
+ff = artifacts.read_parquet("french_factors.parquet")
 if ff.index.name != "date":
     ff = ff.set_index("date")
-ff.index = pd.to_datetime(ff.index) + pd.offsets.MonthEnd(0)
 rf = (ff["RF"] / 100).reindex(DATE_IDX)
+sec.add_rows(panel.shape[0] * panel.shape[1])
+sec.end()
 
 # Assemble benchmark DataFrame
+sec = telemetry.begin("benchmark_build")
 bench = pd.DataFrame(index=DATE_IDX)
 bench["SP500_TR"] = load_sp500_tr().reindex(DATE_IDX) # total return
 bench["EW_Value"] = equal_weight(panel, "Value").reindex(DATE_IDX)
 bench["VW_Value"] = value_weight(panel, "Value").reindex(DATE_IDX)
 bench["EW_Growth"] = equal_weight(panel, "Growth").reindex(DATE_IDX)
 bench["VW_Growth"] = value_weight(panel, "Growth").reindex(DATE_IDX)
+sec.add_rows(len(bench))
+sec.end()
 
 # Only convert S&P-500 to excess return
 bench["SP500_TR"] = bench["SP500_TR"] - rf # now excess return
 bench.rename(columns={"SP500_TR": "SP500_ER"}, inplace=True)
-bench.to_parquet(OUT_DIR / "benchmarks.parquet")
+artifacts.to_parquet(bench, OUT_DIR / "benchmarks.parquet")
 
 print("\n=== Benchmark series created ===")
 print(bench.describe().loc[["count", "mean", "std", "min", "max"]])
@@ -19,6 +19,10 @@ sys.stdout = Tee(sys.stdout, log_path.open("w", encoding="utf-8"))
 import warnings, numpy as np, pandas as pd
 from pathlib import Path
 warnings.filterwarnings("ignore", category=FutureWarning)
+import artifacts
+import telemetry
+
+telemetry.start_stage("08_benchmark_comparison")
 
 # Constants & helpers
 CRISES = {
@@ -53,8 +57,8 @@ def max_dd_and_recov(s: pd.Series):
     return mdd, months
 
 # Load data
-rets = pd.read_parquet("outputs/pnl_series.parquet") # strategies
-bench = pd.read_parquet("outputs/benchmarks.parquet") # benchmarks
+rets = artifacts.read_parquet("outputs/pnl_series.parquet") # strategies
+bench = artifacts.read_parquet("outputs/benchmarks.parquet") # benchmarks
 
 # Synchronise dates
 rets.index = pd.to_datetime(rets.index)
@@ -64,6 +68,7 @@ rets = rets.reindex(common_idx)
 bench = bench.reindex(common_idx)
 
 # Compute metrics
+sec = telemetry.begin("compare_metrics")
 rows = []
 for win, (t0, t1) in CRISES.items():
     sub_r = rets.loc[t0:t1]
@@ -110,6 +115,8 @@ for win, (t0, t1) in CRISES.items():
                 "beta": beta,
                 "rho": rho,
             })
+sec.add_rows(len(rows))
+sec.end()
 
 cmp = pd.DataFrame(rows)
 
@@ -3,6 +3,10 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 from functools import partial
 from scipy.stats import skew, kurtosis
+import artifacts
+import telemetry
+
+telemetry.start_stage("09_plots")
 
 # Settings
 ROLL = 60 # Rolling moment
@@ -20,8 +24,8 @@ CRISES = {
 }
 
 # Load series
-rets  = pd.read_parquet(OUT / "pnl_series.parquet")
-bench = pd.read_parquet(OUT / "benchmarks.parquet")
+rets  = artifacts.read_parquet(OUT / "pnl_series.parquet")
+bench = artifacts.read_parquet(OUT / "benchmarks.parquet")
 rets.index = pd.to_datetime(rets.index); bench.index = pd.to_datetime(bench.index)
 all_ser = pd.concat([rets, bench], axis=1).sort_index()
 all_ser.columns.name = "series"
@@ -49,12 +53,15 @@ def roll_moment(series, func):
             .apply(lambda x: func(pd.Series(x).dropna()), raw=False))
 
 # Compute rolling matrices
+sec = telemetry.begin("rolling_moments")
 roll_var  = all_ser.apply(lambda col: col.rolling(ROLL, min_periods=MIN_VALID).var())
 roll_skew = all_ser.apply(lambda col: roll_moment(col, skew_f))
 roll_kurt = all_ser.apply(lambda col: roll_moment(col, kurt_f))
 
 pd.concat({"var":  roll_var, "skew": roll_skew, "kurt": roll_kurt}, axis=1)\
   .to_parquet(OUT / f"rolling_moments_{ROLL}m.parquet")
+sec.add_rows(len(all_ser))
+sec.end()
 
 # Crisis shading
 def shade_crises(ax, y_pos=0.02, fontsize=7):
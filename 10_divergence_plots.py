@@ -1,6 +1,11 @@
 from pathlib import Path
 import pandas as pd
 import matplotlib.pyplot as plt
+import artifacts
+import panel_io
+import telemetry
+
+telemetry.start_stage("10_divergence_plots")
 
 OUT = Path("outputs")
 WEI_DIR = OUT / "weights"
@@ -8,11 +13,9 @@ WEI_DIR = OUT / "weights"
 
 # Rolling volatility of factor returns
 fac = (
-    pd.read_parquet(OUT / "crsp_factors.parquet",
-                    columns=["date", "MKT_RF", "RMW", "CMA", "HML", "SMB"])
-      .assign(date=lambda d: pd.to_datetime(d["date"]) + pd.offsets.MonthEnd(0))
+    panel_io.read_factors(["date", "MKT_RF", "RMW", "CMA", "HML", "SMB"])
       .set_index("date")
-      .groupby("date").first()
+      .sort_index()
 )
 
 ts_vol = fac.rolling(window=12, min_periods=3).std()
@@ -30,8 +33,7 @@ print("Saved plot: factor_vol.png")
 # Cross-model correlation of μ‑vectors
 MU_PARQ = OUT / "mu_vectors.parquet"
 
-mu = pd.read_parquet(MU_PARQ)
-mu["date"] = pd.to_datetime(mu["date"]) + pd.offsets.MonthEnd(0)
+mu = artifacts.read_parquet(MU_PARQ)
 
 def corr_row(df):
     return pd.Series({
@@ -50,8 +52,7 @@ print("Saved plot: mu_corr.png")
 
 
 # Cross‑model correlation of portfolio returns
-pnl = pd.read_parquet(OUT / "pnl_series.parquet")
-pnl.index = pd.to_datetime(pnl.index) + pd.offsets.MonthEnd(0)
+pnl = artifacts.read_parquet(OUT / "pnl_series.parquet")
 
 pairs = {
     # Growth
@@ -81,14 +82,13 @@ weight_files = sorted(WEI_DIR.glob("weights_*.parquet"))
 frames = []
 for fp in weight_files:
     _, style, model = fp.stem.split("_", maxsplit=2)
-    tmp = pd.read_parquet(fp)
+    tmp = artifacts.read_parquet(fp)
     tmp["style"] = style  # Value / Growth
     tmp["model"] = model  # CAPM / FF3 / FF5
     frames.append(tmp)
 
 w = (
     pd.concat(frames, ignore_index=True)
-        .assign(date=lambda d: pd.to_datetime(d["date"]) + pd.offsets.MonthEnd(0))
         .pivot_table(index=["permno", "date", "style"], # 3 level index
                      columns="model", # CAPM / FF3 / FF5 columns
                      values="weight")
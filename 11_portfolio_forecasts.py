@@ -1,6 +1,11 @@
 import numpy as np
 import pandas as pd
 from pathlib import Path
+import artifacts
+import panel_io
+import telemetry
+
+telemetry.start_stage("11_portfolio_forecasts")
 
 OUT_DIR = Path("outputs")
 WEIGHTS_DIR = OUT_DIR / "weights"
@@ -9,20 +14,20 @@ STYLES = ["Growth", "Value"]
 MODELS = ["CAPM", "FF3", "FF5"]
 
 # Portfolio‑level forecasts
-mu = (pd.read_parquet(OUT_DIR / "mu_vectors.parquet")
+mu = (artifacts.read_parquet(OUT_DIR / "mu_vectors.parquet")
         .rename(columns={"mu_capm": "CAPM",
                          "mu_ff3" : "FF3",
                          "mu_ff5" : "FF5"})
         .melt(id_vars=["permno", "date"], var_name="model", value_name="mu").dropna())
 
-rf = pd.read_parquet(OUT_DIR / "crsp_factors.parquet")[["date", "RF"]].drop_duplicates()
+rf = panel_io.read_factors(["date", "RF"])
 
 rows = []
 for style in STYLES:
     for model in MODELS:
         w_path = WEIGHTS_DIR / f"weights_{style}_{model}.parquet"
 
-        w = pd.read_parquet(w_path)  # date, permno, weight
+        w = artifacts.read_parquet(w_path)  # date, permno, weight
         df = w.merge(mu[mu.model == model], on=["permno", "date"]).merge(rf, on="date", how="left")
 
         df["excess_mu"] = df["mu"] - df["RF"]
@@ -43,7 +48,7 @@ fc.to_parquet(OUT_DIR / "model_port_mu_forecasts.parquet", index=False)
 print("Forecasts saved: outputs/model_port_mu_forecasts.parquet")
 
 # Rolling RMSE & CVaR
-pnl = pd.read_parquet(OUT_DIR / "pnl_series.parquet").reset_index(names="date")
+pnl = artifacts.read_parquet(OUT_DIR / "pnl_series.parquet").reset_index(names="date")
 pnl["date"] = pd.to_datetime(pnl["date"])
 pnl.columns = ["date"] + [c.replace("_", " ") for c in pnl.columns[1:]]
 
@@ -52,6 +57,7 @@ frame = pnl.merge(fc, on="date", how="inner").set_index("date").sort_index()
 rmse = lambda x: float(np.sqrt(np.mean(x**2)))
 cvar5 = lambda x: float(x[x <= np.quantile(x, 0.05)].mean())
 
+sec = telemetry.begin("rolling_rmse_cvar")
 records = []
 for style in STYLES:
     for model in MODELS:
@@ -65,6 +71,8 @@ for style in STYLES:
             win = ser.iloc[end - WINDOW:end]
             err = win[real] - win[pred]
             records.append({"style": style, "model": model, "end_date": win.index[-1], "rmse": rmse(err), "cvar5": cvar5(err)})
+sec.add_rows(len(records))
+sec.end()
 
 detail = pd.DataFrame(records)
 detail.to_csv(OUT_DIR / "ownPL_tests_detail.csv", index=False)
@@ -3,31 +3,41 @@ import pandas as pd
 from pathlib import Path
 from arch.utility import cov_nw
 from scipy import stats
+import artifacts
+import panel_io
+import telemetry
+import wide_panel
+
+telemetry.start_stage("12_clarkwest")
 
 OUT_DIR = Path("outputs")
-mu = (pd.read_parquet(OUT_DIR / "mu_vectors.parquet")
+mu = (artifacts.read_parquet(OUT_DIR / "mu_vectors.parquet")
         .rename(columns={"mu_capm": "CAPM",
                          "mu_ff3" : "FF3",
                          "mu_ff5" : "FF5"}))
 
-rf = pd.read_parquet(OUT_DIR / "crsp_factors.parquet")[["permno", "date", "rexcess", "RF"]]
+W = wide_panel.load()
+rf = panel_io.read_factors(["date", "RF"])
 mu["date"] = pd.to_datetime(mu["date"]) + pd.offsets.MonthEnd(1)  # align forecasts to t+1
-panel = rf.merge(mu, on=["permno", "date"], how="inner").dropna()
+mu["rexcess"] = W.lookup(W.rexcess, mu["date"], mu["permno"])
+panel = mu.merge(rf, on="date", how="inner").dropna()
 
 for m in ["CAPM", "FF3", "FF5"]:
     panel[f"{m}_EXC"] = panel[m] - panel["RF"]
 
-def mse(x): return (x**2).mean()
-
-loss = (panel.groupby("date")
-              .agg(
-                  LCAPM = ("rexcess", lambda y: mse(y - panel.loc[y.index, "CAPM_EXC"])),
-                  LFF3  = ("rexcess", lambda y: mse(y - panel.loc[y.index, "FF3_EXC"])),
-                  LFF5  = ("rexcess", lambda y: mse(y - panel.loc[y.index, "FF5_EXC"])),
-                  ADJ35 = ("rexcess", lambda y: mse(panel.loc[y.index, "FF3_EXC"] - panel.loc[y.index, "CAPM_EXC"])),
-                  ADJ53 = ("rexcess", lambda y: mse(panel.loc[y.index, "FF5_EXC"] - panel.loc[y.index, "FF3_EXC"])),
-                  ADJ55 = ("rexcess", lambda y: mse(panel.loc[y.index, "FF5_EXC"] - panel.loc[y.index, "CAPM_EXC"]))
-              ))
+sec = telemetry.begin("loss_groupby")
+# squared errors row-wise, then one grouped mean per date
+sq = pd.DataFrame({
+    "LCAPM": (panel["rexcess"] - panel["CAPM_EXC"])**2,
+    "LFF3":  (panel["rexcess"] - panel["FF3_EXC"])**2,
+    "LFF5":  (panel["rexcess"] - panel["FF5_EXC"])**2,
+    "ADJ35": (panel["FF3_EXC"] - panel["CAPM_EXC"])**2,
+    "ADJ53": (panel["FF5_EXC"] - panel["FF3_EXC"])**2,
+    "ADJ55": (panel["FF5_EXC"] - panel["CAPM_EXC"])**2,
+})
+loss = sq.groupby(panel["date"]).mean()
+sec.add_rows(len(panel))
+sec.end()
 
 cw = pd.DataFrame({
     "d_CPvsFF3":  loss["LCAPM"] - (loss["LFF3"] - loss["ADJ35"]),
@@ -1,5 +1,8 @@
 import numpy as np, pandas as pd
 from pathlib import Path
+import telemetry
+
+telemetry.start_stage("13_bootstrap")
 
 np.random.seed(42)  # reproducibility
 OUT = Path("outputs")
@@ -22,6 +25,7 @@ def draw_series(errs, block):
     return errs[np.array(idx[:T])]
 
 
+sec = telemetry.begin("block_bootstrap")
 rows = []
 for (style, model), g in d.groupby(["style", "model"]):
     errs = g[["rmse", "cvar5"]].to_numpy()
@@ -39,6 +43,8 @@ for (style, model), g in d.groupby(["style", "model"]):
         rows.append({"style": style, "model": model,
                      "metric": metric, "lower": low,
                      "median": med, "upper": high})
+sec.add_rows(len(rows))
+sec.end()
 
 pd.DataFrame(rows).to_csv(OUT / "bootstrap_CI.csv", index=False)
 print("Saved results: outputs/bootstrap_CI.csv")
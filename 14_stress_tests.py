@@ -0,0 +1,132 @@
+import itertools, time
+from pathlib import Path
+import numpy as np, pandas as pd
+import pyarrow.parquet as pq
+import artifacts
+import crises
+import telemetry
+
+telemetry.start_stage("14_stress_tests")
+
+# Paths & constants
+OUT_DIR = Path("outputs")
+WGT_DIR = OUT_DIR / "weights"
+PARTS_DIR = OUT_DIR / "beta_parts"
+USER_SCENARIOS = Path("stress_scenarios.csv")  # optional: scenario, MKT_RF, SMB, HML, RMW, CMA (decimal shocks)
+
+FACTORS = ["MKT_RF", "SMB", "HML", "RMW", "CMA"]
+BETA_COLS = [f"beta_FF5_{f}" for f in FACTORS]
+
+# Hypothetical shocks: every combination of these one-period factor moves (6 × 5⁴ = 3,750 scenarios)
+SHOCK_GRID = {
+    "MKT_RF": [-0.30, -0.20, -0.10, -0.05, 0.0, 0.05],
+    "SMB"   : [-0.10, -0.05, 0.0, 0.05, 0.10],
+    "HML"   : [-0.10, -0.05, 0.0, 0.05, 0.10],
+    "RMW"   : [-0.10, -0.05, 0.0, 0.05, 0.10],
+    "CMA"   : [-0.10, -0.05, 0.0, 0.05, 0.10],
+}
+
+# Scenario set: crisis replays, shock grid, user file
+with telemetry.section("scenario_build") as sec:
+    ff = artifacts.read_parquet("french_factors.parquet").sort_values("date").set_index("date")[FACTORS].astype(float)
+
+    scen = []
+    for lbl, (t0, t1) in crises.CRISES.items():
+        sub = ff.loc[t0:t1].dropna()
+        if sub.empty:
+            continue
+        scen.append({"scenario": f"{lbl}_cum", "kind": "replay", **((1 + sub).prod() - 1).to_dict()})
+        scen.append({"scenario": f"{lbl}_worst_month", "kind": "replay", **sub.loc[sub["MKT_RF"].idxmin()].to_dict()})
+
+    for combo in itertools.product(*SHOCK_GRID.values()):
+        name = "grid:" + ",".join(f"{f}{s:+.2f}" for f, s in zip(FACTORS, combo))
+        scen.append({"scenario": name, "kind": "grid", **dict(zip(FACTORS, combo))})
+
+    if USER_SCENARIOS.exists():
+        user = pd.read_csv(USER_SCENARIOS).reindex(columns=["scenario", *FACTORS]).fillna({f: 0.0 for f in FACTORS})
+        scen += [{**r, "kind": "user"} for r in user.to_dict("records")]
+
+    scenarios = pd.DataFrame(scen)[["scenario", "kind", *FACTORS]]
+    S = scenarios[FACTORS].to_numpy(np.float64)  # (n_scen, 5)
+    sec.add_rows(len(scenarios))
+
+print(f"{len(scenarios):,} scenarios "
+      f"({(scenarios['kind'] == 'replay').sum()} replays, {(scenarios['kind'] == 'grid').sum():,} grid, "
+      f"{(scenarios['kind'] == 'user').sum()} user)")
+
+# Portfolio FF5 exposures: Σ_i w_i β_i per strategy and rebalance date
+with telemetry.section("exposure_build") as sec:
+    betas = pq.ParquetDataset(PARTS_DIR).read(columns=["permno", "date", *BETA_COLS]).to_pandas()
+    betas = betas.drop_duplicates(["permno", "date"], keep="last")
+
+    expo = []
+    for fp in sorted(WGT_DIR.glob("weights_*.parquet")):
+        style, model = fp.stem.split("_")[1:]
+        wgt = artifacts.read_parquet(fp).merge(betas, on=["permno", "date"], how="left")
+        has = wgt[BETA_COLS].notna().all(axis=1)
+        e = (wgt.loc[has, BETA_COLS].mul(wgt.loc[has, "weight"], axis=0)).groupby(wgt.loc[has, "date"]).sum()
+        e["coverage"] = wgt.loc[has, "weight"].groupby(wgt.loc[has, "date"]).sum()
+        e["strategy"] = f"{style}_{model}"
+        expo.append(e.reset_index())
+        sec.add_rows(len(wgt))
+
+    expo = pd.concat(expo, ignore_index=True)
+    strategies = sorted(expo["strategy"].unique())
+    dates = pd.DatetimeIndex(sorted(expo["date"].unique()))
+
+    # Dense (strategy, date, factor) cube, NaN where a strategy has no portfolio that month
+    B = np.full((len(strategies), len(dates), len(FACTORS)), np.nan)
+    B[pd.Index(strategies).get_indexer(expo["strategy"]), dates.get_indexer(expo["date"])] = expo[BETA_COLS].to_numpy()
+
+expo.rename(columns=dict(zip(BETA_COLS, FACTORS))).to_parquet(OUT_DIR / "stress_exposures.parquet", index=False)
+
+# Scenario P&L for every scenario × strategy × date in one product
+with telemetry.section("stress_product") as sec:
+    t0 = time.perf_counter()
+    pnl = np.einsum("sk,ptk->spt", S, B)  # (n_scen, n_strat, n_dates)
+    sec.add_rows(pnl.size)
+    print(f"Stressed {pnl.size:,} scenario-portfolio-months in {time.perf_counter() - t0:.2f} s")
+
+# Summaries
+with telemetry.section("stress_summary") as sec:
+    last = np.array([np.flatnonzero(~np.isnan(B[p, :, 0]))[-1] for p in range(len(strategies))])
+    worst_t = np.nanargmin(np.where(np.isnan(pnl), np.inf, pnl), axis=2)
+
+    summary = pd.DataFrame({
+        "scenario"  : np.repeat(scenarios["scenario"].to_numpy(), len(strategies)),
+        "kind"      : np.repeat(scenarios["kind"].to_numpy(), len(strategies)),
+        "strategy"  : np.tile(strategies, len(scenarios)),
+        "latest"    : pnl[:, np.arange(len(strategies)), last].ravel(),
+        "mean"      : np.nanmean(pnl, axis=2).ravel(),
+        "worst"     : np.nanmin(pnl, axis=2).ravel(),
+        "worst_date": dates[worst_t.ravel()],
+        "best"      : np.nanmax(pnl, axis=2).ravel(),
+    })
+    summary.to_parquet(OUT_DIR / "stress_summary.parquet", index=False)
+
+    # Per date: worst scenario for each strategy, plus every crisis replay
+    worst_s = np.nanargmin(np.where(np.isnan(pnl), np.inf, pnl), axis=0)  # (n_strat, n_dates)
+    by_date = pd.DataFrame({
+        "date"          : np.tile(dates, len(strategies)),
+        "strategy"      : np.repeat(strategies, len(dates)),
+        "worst_scenario": scenarios["scenario"].to_numpy()[worst_s.ravel()],
+        "worst_pnl"     : np.take_along_axis(pnl, worst_s[None], axis=0)[0].ravel(),
+    })
+    for i in np.flatnonzero(scenarios["kind"].to_numpy() == "replay"):
+        by_date[scenarios["scenario"].iat[i]] = pnl[i].ravel()
+    by_date = by_date[~np.isnan(B[:, :, 0]).ravel()]
+    by_date.to_parquet(OUT_DIR / "stress_by_date.parquet", index=False)
+    sec.add_rows(len(summary) + len(by_date))
+
+# Console output
+pd.set_option("display.width", 160)
+replays = summary[summary["kind"] != "grid"].pivot(index="scenario", columns="strategy", values="latest")
+print("\n=====  Crisis replays and user scenarios on the latest portfolios (factor P&L)  =====")
+print(replays.to_string(float_format="{:+.4f}".format) if not replays.empty else "none (no crisis window in the factor history)")
+
+grid_latest = summary[summary["kind"] == "grid"]
+print("\n=====  Worst grid shock per strategy (latest portfolios)  =====")
+print(grid_latest.loc[grid_latest.groupby("strategy")["latest"].idxmin(), ["strategy", "scenario", "latest"]]
+      .to_string(index=False, float_format="{:+.4f}".format))
+
+print("\nSaved stress_exposures.parquet, stress_summary.parquet and stress_by_date.parquet")
@@ -0,0 +1,152 @@
+import os, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np, pandas as pd
+import pyarrow.parquet as pq
+import artifacts
+import telemetry
+
+# Paths & constants
+OUT_DIR = Path("outputs")
+WGT_DIR = OUT_DIR / "weights"
+PARTS_DIR = OUT_DIR / "beta_parts"
+
+FACTORS = ["MKT_RF", "SMB", "HML", "RMW", "CMA"]
+GEN_MODEL = "FF5"              # stage-03 betas and resvol that generate stock returns
+FACTOR_DRAW = "bootstrap"      # "bootstrap" (BLOCK-month blocks of history), "normal" or "t" (fitted)
+BLOCK = 1
+T_DOF = 5
+N_SIMS = 10_000
+CHUNK = 500                    # simulations per task; memory is CHUNK × strategies × months
+N_WORKERS = int(os.environ.get("MC_WORKERS", os.cpu_count() or 1))
+SEED = 42
+CVAR_P = 0.05
+METRICS = ["mean", "stdev", "sharpe", "cvar_5", "max_dd"]
+
+
+# Simulation kernel (module level so worker processes can import it)
+def draw_factors(rng, hist: np.ndarray, n: int, T: int, mode: str) -> np.ndarray:
+    # (n, T, K) factor paths
+    if mode == "bootstrap":
+        n_blocks = -(-T // BLOCK)
+        starts = rng.integers(0, len(hist) - BLOCK + 1, size=(n, n_blocks))
+        idx = (starts[..., None] + np.arange(BLOCK)).reshape(n, -1)[:, :T]
+        return hist[idx]
+    mu, cov = hist.mean(axis=0), np.cov(hist, rowvar=False)
+    z = rng.multivariate_normal(np.zeros(len(mu)), cov, size=(n, T))
+    if mode == "t":  # scaled so the covariance still matches the history
+        z *= np.sqrt((T_DOF - 2) / rng.chisquare(T_DOF, size=(n, T, 1)))
+    return mu + z
+
+
+def path_metrics(r: np.ndarray) -> dict[str, np.ndarray]:
+    # Same definitions as stage 06, one row per simulated path
+    mu, sd = r.mean(axis=1), r.std(axis=1, ddof=1)
+    cutoff = np.quantile(r, CVAR_P, axis=1, keepdims=True)
+    cum = np.cumprod(1 + r, axis=1)
+    return {
+        "mean": mu,
+        "stdev": sd,
+        "sharpe": np.where(sd > 0, mu / np.where(sd > 0, sd, 1), np.nan),
+        "cvar_5": np.nanmean(np.where(r <= cutoff, r, np.nan), axis=1),
+        "max_dd": (cum / np.maximum.accumulate(cum, axis=1) - 1).min(axis=1),
+    }
+
+
+def simulate_chunk(seed, n: int, B: np.ndarray, sig: np.ndarray, hist: np.ndarray, mode: str) -> np.ndarray:
+    # B: (P, T, K) portfolio exposures, sig: (P, T) residual vol, NaN where a strategy has no portfolio.
+    # Portfolio return = exposure · factor draw + residual vol × N(0, 1); returns (P, n, n_metrics)
+    rng = np.random.default_rng(seed)
+    P, T, _ = B.shape
+    F = draw_factors(rng, hist, n, T, mode)
+    R = np.einsum("ctk,ptk->cpt", F, np.nan_to_num(B)) + np.nan_to_num(sig) * rng.standard_normal((n, P, T))
+
+    out = np.full((P, n, len(METRICS)), np.nan)
+    for p in range(P):
+        live = ~np.isnan(B[p, :, 0])
+        if live.sum() < 2:
+            continue
+        m = path_metrics(R[:, p, live])
+        out[p] = np.column_stack([m[k] for k in METRICS])
+    return out
+
+
+if __name__ == "__main__":
+    telemetry.start_stage("15_monte_carlo")
+
+    # Factor history
+    hist = (artifacts.read_parquet("french_factors.parquet").sort_values("date")[FACTORS]
+              .apply(pd.to_numeric, errors="coerce").dropna().to_numpy(np.float64))
+
+    # Portfolio exposures Σ w β and residual vol √(Σ w² σ²) per strategy and rebalance date
+    with telemetry.section("exposure_build") as sec:
+        beta_cols = [f"beta_{GEN_MODEL}_{f}" for f in FACTORS]
+        vol_col = f"resvol_{GEN_MODEL}"
+        betas = pq.ParquetDataset(PARTS_DIR).read(columns=["permno", "date", *beta_cols, vol_col]).to_pandas()
+        betas = betas.drop_duplicates(["permno", "date"], keep="last")
+
+        parts = []
+        for fp in sorted(WGT_DIR.glob("weights_*.parquet")):
+            style, model = fp.stem.split("_")[1:]
+            wgt = artifacts.read_parquet(fp).merge(betas, on=["permno", "date"], how="inner").dropna(subset=[*beta_cols, vol_col])
+            e = wgt[beta_cols].mul(wgt["weight"], axis=0).groupby(wgt["date"]).sum()
+            e["resvar"] = (wgt["weight"] ** 2 * wgt[vol_col] ** 2).groupby(wgt["date"]).sum()
+            e["strategy"] = f"{style}_{model}"
+            parts.append(e.reset_index())
+            sec.add_rows(len(wgt))
+
+        expo = pd.concat(parts, ignore_index=True)
+        strategies = sorted(expo["strategy"].unique())
+        dates = pd.DatetimeIndex(sorted(expo["date"].unique()))
+        si, ti = pd.Index(strategies).get_indexer(expo["strategy"]), dates.get_indexer(expo["date"])
+        B = np.full((len(strategies), len(dates), len(FACTORS)), np.nan)
+        B[si, ti] = expo[beta_cols].to_numpy()
+        sig = np.full((len(strategies), len(dates)), np.nan)
+        sig[si, ti] = np.sqrt(expo["resvar"].to_numpy())
+
+    # Chunked simulation across processes
+    with telemetry.section("simulate", rows=N_SIMS * len(strategies)):
+        t0 = time.perf_counter()
+        sizes = [min(CHUNK, N_SIMS - i) for i in range(0, N_SIMS, CHUNK)]
+        seeds = np.random.SeedSequence(SEED).spawn(len(sizes))
+        with ProcessPoolExecutor(max_workers=N_WORKERS) as ex:
+            futs = [ex.submit(simulate_chunk, s, n, B, sig, hist, FACTOR_DRAW) for s, n in zip(seeds, sizes)]
+            sims = np.concatenate([f.result() for f in futs], axis=1)  # (P, N_SIMS, n_metrics)
+        print(f"{N_SIMS:,} paths × {len(strategies)} strategies × {len(dates)} months "
+              f"({FACTOR_DRAW}) in {time.perf_counter() - t0:.1f} s on {N_WORKERS} workers")
+
+    # Distributions vs the realised path
+    with telemetry.section("summaries") as sec:
+        mc = pd.DataFrame(sims.reshape(-1, len(METRICS)), columns=METRICS)
+        mc.insert(0, "sim", np.tile(np.arange(N_SIMS), len(strategies)))
+        mc.insert(0, "strategy", np.repeat(strategies, N_SIMS))
+        mc.to_parquet(OUT_DIR / "mc_metrics.parquet", index=False)
+
+        realised = {}
+        pnl_fp = OUT_DIR / "pnl_series.parquet"
+        if pnl_fp.exists():
+            pnl = artifacts.read_parquet(pnl_fp)
+            for strat in strategies:
+                if strat in pnl.columns and pnl[strat].notna().sum() >= 2:
+                    m = path_metrics(pnl[strat].dropna().to_numpy()[None, :])
+                    realised[strat] = {k: float(v[0]) for k, v in m.items()}
+
+        rows = []
+        for strat, g in mc.groupby("strategy"):
+            for k in METRICS:
+                v = g[k].dropna()
+                q = v.quantile([0.05, 0.25, 0.5, 0.75, 0.95]).to_numpy()
+                real = realised.get(strat, {}).get(k, np.nan)
+                rows.append({"strategy": strat, "metric": k, "mean": v.mean(),
+                             "p05": q[0], "p25": q[1], "p50": q[2], "p75": q[3], "p95": q[4],
+                             "realised": real, "realised_pct": (v < real).mean() if np.isfinite(real) else np.nan})
+        summary = pd.DataFrame(rows)
+        summary.to_parquet(OUT_DIR / "mc_summary.parquet", index=False)
+        sec.add_rows(len(mc))
+
+    pd.set_option("display.width", 160)
+    for k in ["sharpe", "cvar_5", "max_dd"]:
+        print(f"\n=====  {k}: simulated distribution vs realised  =====")
+        print(summary[summary["metric"] == k].drop(columns="metric").to_string(index=False, float_format="{:+.4f}".format))
+
+    print("\nSaved mc_metrics.parquet and mc_summary.parquet")
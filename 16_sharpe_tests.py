@@ -0,0 +1,160 @@
+import itertools, time
+from pathlib import Path
+import numpy as np, pandas as pd
+from scipy.stats import norm
+import artifacts
+import telemetry
+
+telemetry.start_stage("16_sharpe_tests")
+
+# Paths & constants
+OUT_DIR = Path("outputs")
+HAC_LAGS = None       # Newey-West lags; None → floor(4 (T/100)^(2/9))
+BLOCK = 12            # circular block length (months)
+REPS = 5000
+CHUNK_BYTES = 1 << 30     # float64 working memory per bootstrap batch
+LIVE_PAIR_ARRAYS = 5      # (reps, months, pairs) arrays alive at once in pair_moments: J, Xi, Xj and two temporaries
+MIN_OBS = 24              # months two series must share for a test
+SEED = 42
+
+# Sharpe ratios as SR = μ / √(γ − μ²) with γ = E[r²], so every test is a smooth function of the
+# first and second moments (Ledoit & Wolf, 2008). Each pair uses the months both series have, as
+# in stage 08. IRs are Sharpe ratios of active returns (strategy − benchmark), ddof = 0 as in 08.
+
+
+def sharpe(m1: np.ndarray, m2: np.ndarray) -> np.ndarray:
+    # 0 for a constant series, so an all-zero column turns SR_a − SR_0 into a test of SR_a = 0
+    var = m2 - m1 ** 2
+    return np.where(var > 0, m1 / np.sqrt(np.where(var > 0, var, 1)), 0.0)
+
+
+def pair_moments(X: np.ndarray, M: np.ndarray, pairs: np.ndarray):
+    # X (..., T, S) with 0 where missing and M its 0/1 mask. For every pair (i, j) over the months
+    # both have: the joint mask J (..., T, P), the count n (..., P) and [μ_i, μ_j, γ_i, γ_j] (..., P, 4)
+    i, j = pairs[:, 0], pairs[:, 1]
+    J = M[..., i] * M[..., j]
+    n = J.sum(axis=-2)
+    Xi, Xj = X[..., i] * J, X[..., j] * J
+    m = np.stack([Xi.sum(-2), Xj.sum(-2), (Xi * X[..., i]).sum(-2), (Xj * X[..., j]).sum(-2)], axis=-1)
+    return J, n, m / np.maximum(n, 1)[..., None]
+
+
+def sr_diff(m: np.ndarray) -> np.ndarray:
+    return sharpe(m[..., 0], m[..., 2]) - sharpe(m[..., 1], m[..., 3])
+
+
+def delta_tests(X: np.ndarray, M: np.ndarray, pairs: np.ndarray, lags: int):
+    # HAC delta-method test of SR_i − SR_j for every pair at once: per-pair moment series
+    # u_t = [r_i − μ_i, r_j − μ_j, r_i² − γ_i, r_j² − γ_j] (zero outside the pair's months) and their
+    # Newey-West (Bartlett) long-run covariance, all as (T, P, 4) arrays
+    J, n, m = pair_moments(X, M, pairs)
+    i, j = pairs[:, 0], pairs[:, 1]
+    U = J[..., None] * (np.stack([X[:, i], X[:, j], X[:, i] ** 2, X[:, j] ** 2], axis=-1) - m)
+    Psi = np.einsum("tpa,tpb->pab", U, U)
+    for l in range(1, lags + 1):
+        G = np.einsum("tpa,tpb->pab", U[l:], U[:-l])
+        Psi += (1 - l / (lags + 1)) * (G + G.transpose(0, 2, 1))
+    Psi /= np.maximum(n, 1)[:, None, None]
+
+    def grad(m1, m2):  # ∂SR/∂μ, ∂SR/∂γ (0 for a constant series)
+        v = np.where(m2 - m1 ** 2 > 0, (m2 - m1 ** 2) ** 1.5, np.inf)
+        return m2 / v, -m1 / (2 * v)
+
+    (a1, a2), (b1, b2) = grad(m[:, 0], m[:, 2]), grad(m[:, 1], m[:, 3])
+    g = np.stack([a1, -b1, a2, -b2], axis=1)
+    se = np.sqrt(np.einsum("pa,pab,pb->p", g, Psi, g) / np.maximum(n, 1))
+
+    diff = sr_diff(m)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(n >= MIN_OBS, diff / se, np.nan)
+    return np.where(n >= MIN_OBS, diff, np.nan), se, t, 2 * norm.sf(np.abs(t)), n
+
+
+def block_bootstrap(X: np.ndarray, M: np.ndarray, pairs: np.ndarray, rng) -> np.ndarray:
+    # Circular block bootstrap of SR_i − SR_j: one set of block indices per replication is shared
+    # by every series (keeps their cross-correlation), and each batch of replications is resampled
+    # with one fancy index. Two-sided p-values from the re-centred distribution
+    T = len(X)
+    n_blocks = -(-T // BLOCK)
+    diff_hat = sr_diff(pair_moments(X, M, pairs)[2])
+    # Bytes per replication: the row index, the resampled X and M (T, S) and the pair arrays (T, P)
+    per_rep = 8 * T * (1 + 2 * X.shape[1] + LIVE_PAIR_ARRAYS * len(pairs))
+    chunk = max(1, CHUNK_BYTES // per_rep)
+
+    exceed = np.zeros(len(pairs))
+    for lo in range(0, REPS, chunk):
+        n = min(chunk, REPS - lo)
+        starts = rng.integers(0, T, size=(n, n_blocks))
+        idx = ((starts[..., None] + np.arange(BLOCK)) % T).reshape(n, -1)[:, :T]
+        d = sr_diff(pair_moments(X[idx], M[idx], pairs)[2])     # (n, P)
+        exceed += (np.abs(d - diff_hat) >= np.abs(diff_hat)).sum(axis=0)
+    return (exceed + 1) / (REPS + 1)
+
+
+# Load and align
+with telemetry.section("load") as sec:
+    rets = artifacts.read_parquet(OUT_DIR / "pnl_series.parquet")
+    bench = artifacts.read_parquet(OUT_DIR / "benchmarks.parquet")
+    rets.index, bench.index = pd.to_datetime(rets.index), pd.to_datetime(bench.index)
+
+    rets = rets.dropna(how="all")
+    bench = bench.reindex(rets.index)
+    strats, bms = list(rets.columns), list(bench.columns)
+
+    # Active returns for the IR tests, resampled together with the raw series
+    active = pd.concat({f"{s}|{b}": rets[s] - bench[b] for s in strats for b in bms}, axis=1)
+    data = pd.concat([rets, bench, active], axis=1)
+    cols = list(data.columns)
+    M = data.notna().to_numpy(np.float64)
+    X = data.fillna(0).to_numpy(np.float64)
+    T = len(X)
+    lags = HAC_LAGS if HAC_LAGS is not None else int(4 * (T / 100) ** (2 / 9))
+    sec.add_rows(X.size)
+
+print(f"{len(strats)} strategies, {len(bms)} benchmarks, {T} months "
+      f"({data.index.min():%Y-%m} → {data.index.max():%Y-%m}); HAC lags {lags}, block {BLOCK}, {REPS:,} reps")
+
+# Pairs: strategy vs strategy and strategy vs benchmark (Sharpe), strategy vs strategy per benchmark (IR)
+pos = {c: k for k, c in enumerate(cols)}
+zero = len(cols)   # an all-zero column: SR_a − SR_0 tests IR_a = 0
+X = np.hstack([X, np.zeros((T, 1))])
+M = np.hstack([M, np.ones((T, 1))])
+rows = []
+for a, b in itertools.combinations(strats, 2):
+    rows.append(("sharpe", a, b, "", pos[a], pos[b]))
+for a in strats:
+    for b in bms:
+        rows.append(("sharpe", a, b, "", pos[a], pos[b]))
+for bm in bms:
+    for a in strats:
+        rows.append(("ir", a, "", bm, pos[f"{a}|{bm}"], zero))
+    for a, b in itertools.combinations(strats, 2):
+        rows.append(("ir", a, b, bm, pos[f"{a}|{bm}"], pos[f"{b}|{bm}"]))
+tests = pd.DataFrame(rows, columns=["test", "a", "b", "benchmark", "i", "j"])
+pairs = tests[["i", "j"]].to_numpy()
+
+# HAC delta method and circular block bootstrap over every pair at once
+with telemetry.section("hac_tests", rows=len(pairs)):
+    t0 = time.perf_counter()
+    diff, se, t, p, n_obs = delta_tests(X, M, pairs, lags)
+    hac_s = time.perf_counter() - t0
+
+with telemetry.section("block_bootstrap", rows=len(pairs) * REPS):
+    t0 = time.perf_counter()
+    p_boot = np.where(n_obs >= MIN_OBS, block_bootstrap(X, M, pairs, np.random.default_rng(SEED)), np.nan)
+    boot_s = time.perf_counter() - t0
+
+tests = tests.drop(columns=["i", "j"]).assign(diff=diff, se_hac=se, t_hac=t, p_hac=p, p_boot=p_boot, n_months=n_obs.astype(int))
+tests.to_parquet(OUT_DIR / "sharpe_tests.parquet", index=False)
+tests.to_csv(OUT_DIR / "sharpe_tests.csv", index=False)
+print(f"{len(tests):,} tests: HAC {hac_s:.2f} s, bootstrap {boot_s:.2f} s")
+
+# Console output
+pd.set_option("display.width", 160)
+show = tests.assign(b=tests["b"].where(tests["b"] != "", "0"))
+for kind, title in [("sharpe", "Sharpe-ratio differences (SR_a − SR_b)"), ("ir", "Information ratios vs benchmark (IR_a − IR_b)")]:
+    sub = show[show["test"] == kind].sort_values("p_hac").head(15)
+    print(f"\n=====  {title}, smallest HAC p-values  =====")
+    print(sub.drop(columns=["test", "n_months"]).to_string(index=False, float_format="{:+.4f}".format))
+
+print("\nSaved outputs/sharpe_tests.parquet and sharpe_tests.csv")
@@ -0,0 +1,191 @@
+import os, sys, time
+from pathlib import Path
+import numpy as np, pandas as pd
+import joblib
+import artifacts
+import cov_estimators
+import panel_io
+import precision
+import telemetry
+import wide_panel
+
+telemetry.start_stage("17_daily_betas_cov")
+
+# Betas and Σ from daily returns, sampled at month-ends. crsp_daily/ (01 with DAILY=1) is streamed one
+# year partition at a time; the last window of trading days is carried into the next year, so memory
+# is about (days in a year + window) × feasible PERMNOs × 4 bytes plus one year of long rows, e.g.
+# ~50 MB for 25,000 PERMNOs, whatever the length of the history
+OUT = Path("outputs")
+FEAS_TXT = OUT / "permnos_feasible.txt"
+PARTS_DIR = OUT / "beta_parts_daily"          # betas_{year}.parquet: permno, month-end date, beta_*, resvol_*
+MU_FILE = OUT / "mu_vectors_daily.parquet"    # MU_TAG = "daily" in 05
+
+# DAILY_BETA_WINDOW / DAILY_COV_WINDOW (trading days) and DAILY_COV_ESTIMATORS env vars override these
+BETA_DAYS = int(os.environ.get("DAILY_BETA_WINDOW", 252))
+COV_DAYS = int(os.environ.get("DAILY_COV_WINDOW", 252))
+MIN_BETA_DAYS = int(0.8 * BETA_DAYS)   # returns needed in the beta window
+# Σ: at most this share of window days missing; they are filled with the stock's window mean, which
+# adds nothing to its covariances (04 needs every month; a single missing day is far more common)
+MAX_COV_MISSING = 0.05
+# "lw" writes cov_mats_daily/ (COV_TAG = "daily" in 05), the others cov_mats_daily_{tag}/
+COV_ESTIMATORS = os.environ.get("DAILY_COV_ESTIMATORS", "lw").split(",")
+COV_EWMA_HALFLIFE = 126  # trading days
+DAYS_PER_MONTH = 21      # resvol and Σ are scaled to a month, to sit next to the monthly μ in 05
+LAMBDA_ROLL = int(os.environ.get("LAMBDA_ROLL", 180))
+STYLE_BUCKETS = ["Value", "Growth"]
+FACTORS = ["MKT_RF", "SMB", "HML", "RMW", "CMA"]
+MODELS = {"CAPM": ["MKT_RF"], "FF3": ["MKT_RF", "SMB", "HML"], "FF5": FACTORS}
+
+
+def cov_dir(tag: str) -> Path:
+    return OUT / ("cov_mats_daily" if tag == "lw" else f"cov_mats_daily_{tag}")
+
+
+def cov_path(tag: str, style: str, date: pd.Timestamp) -> Path:
+    return cov_dir(tag) / f"Σ_{style}_{date:%Y%m%d}.joblib"
+
+
+def estimate(tag: str, m: cov_estimators.WindowMoments) -> np.ndarray:
+    with telemetry.hot(f"cov_fit_{tag}", rows=m.N):
+        if tag == "ewma":
+            return cov_estimators.ewma(m, COV_EWMA_HALFLIFE)
+        return cov_estimators.ESTIMATORS[tag](m)
+
+
+def load_year(yr: int, permnos: np.ndarray, fac: pd.DataFrame):
+    # Dense (trading day × PERMNO) excess returns for one partition, NaN where missing; only days
+    # the daily factor file covers
+    d = panel_io.read_daily_year(yr, permnos)
+    days = pd.DatetimeIndex(np.sort(d["date"].unique()))
+    days = days[days.isin(fac.index)]
+    d = d[d["date"].isin(days)]
+    f = fac.loc[days]
+    R = np.full((len(days), len(permnos)), np.nan, dtype=np.float32)
+    R[days.get_indexer(d["date"]), np.searchsorted(permnos, d["permno"].to_numpy())] = (
+        d["ret"].to_numpy(np.float64) - f["RF"].to_numpy()[days.get_indexer(d["date"])])
+    return days, R, f[FACTORS].to_numpy(np.float64)
+
+
+def window_betas(R: np.ndarray, F: np.ndarray, live: np.ndarray) -> dict[str, np.ndarray]:
+    # OLS of every column of R on each factor set over the window rows it has, as one batched solve
+    # on masked Gram matrices (CAPM / FF3 are sub-blocks of FF5); columns not in `live` are skipped
+    mask = ~np.isnan(R[:, live])
+    M, Y = mask.astype(np.float64), np.nan_to_num(R[:, live]).astype(np.float64)
+    Z = np.column_stack([np.ones(len(F)), F])
+    k = Z.shape[1]
+    G = (M.T @ (Z[:, :, None] * Z[:, None, :]).reshape(len(Z), -1)).reshape(-1, k, k)  # Σ_t m_tn z_t z_t'
+    b = Y.T @ Z  # Y is already 0 where m_tn = 0
+    yy = (M * Y * Y).sum(axis=0)
+    n = mask.sum(axis=0)
+
+    out = {}
+    for mdl, cols in MODELS.items():
+        ix = [0] + [1 + FACTORS.index(c) for c in cols]
+        theta = np.linalg.solve(G[:, ix][:, :, ix], b[:, ix][..., None])[..., 0]
+        for i, c in enumerate(cols, 1):
+            out[f"beta_{mdl}_{c}"] = theta[:, i]
+        rss = np.maximum(yy - (theta * b[:, ix]).sum(axis=1), 0)
+        out[f"resvol_{mdl}"] = np.sqrt(rss / (n - len(ix)) * DAYS_PER_MONTH)
+    return out
+
+
+# Universe, monthly styles and daily factors
+with telemetry.section("setup") as sec:
+    years = panel_io.daily_years()
+    if not years:
+        print("No crsp_daily/ partitions (run 01 with DAILY=1); nothing to do")
+        sys.exit(0)
+    feas = np.array(sorted(int(x) for x in FEAS_TXT.read_text().split()), dtype=np.int32)
+    W = wide_panel.load()
+    wcols = W.cols(feas)
+    fac = pd.read_parquet(panel_io.DAILY_FACTORS_FILE).set_index("date").sort_index()
+    fac = fac[[*FACTORS, "RF"]].astype(np.float64).dropna()
+    PARTS_DIR.mkdir(parents=True, exist_ok=True)
+    for tag in COV_ESTIMATORS:
+        cov_dir(tag).mkdir(parents=True, exist_ok=True)
+    sec.add_rows(len(feas))
+
+print(f"{len(feas):,} feasible PERMNOs, {len(years)} daily partitions "
+      f"({years[0]}–{years[-1]}); windows {BETA_DAYS} / {COV_DAYS} days")
+
+# Stream year partitions, carrying the last max(window) − 1 days across boundaries
+carry = max(BETA_DAYS, COV_DAYS) - 1
+c_days, c_R, c_F = pd.DatetimeIndex([]), np.empty((0, len(feas)), np.float32), np.empty((0, len(FACTORS)))
+start_time = time.time()
+
+for k, yr in enumerate(years):
+    betas_fp = PARTS_DIR / f"betas_{yr}.parquet"
+    with telemetry.section("chunk_read") as sec:
+        days, R, F = load_year(yr, feas, fac)
+        sec.add_rows(int((~np.isnan(R)).sum()))
+    days, R, F = c_days.append(days), np.vstack([c_R, R]), np.vstack([c_F, F])
+    first = len(c_days)
+
+    # Last trading day of each month in this partition (the final one also for a partial month)
+    month = days + pd.offsets.MonthEnd(0)
+    ends = [e for e in range(first, len(days)) if e == len(days) - 1 or month[e + 1] != month[e]]
+
+    with telemetry.section("month_ends") as sec:
+        rows = []
+        for e in ends:
+            date = month[e]
+            in_month = month[first:e + 1] == date
+
+            if not betas_fp.exists() and e + 1 >= BETA_DAYS:
+                win = slice(e - BETA_DAYS + 1, e + 1)
+                Rw = R[win]
+                live = ((~np.isnan(Rw)).sum(axis=0) >= MIN_BETA_DAYS) & ~np.isnan(R[first:e + 1][in_month]).all(axis=0)
+                if live.any():
+                    with telemetry.hot("beta_fit", rows=int(live.sum())):
+                        rows.append(pd.DataFrame({"permno": feas[live], "date": date, **window_betas(Rw, F[win], live)}))
+
+            if e + 1 >= COV_DAYS and W.row(date) >= 0:
+                win = slice(e - COV_DAYS + 1, e + 1)
+                # In the style at every monthly-panel month-end the window spans, returns on most days
+                m_rows = [r for r in map(W.row, np.unique(month[win])) if r >= 0]
+                styles = np.where(wcols[None, :] >= 0, W.style[m_rows][:, wcols.clip(0)], wide_panel.NO_STYLE)
+                complete = np.isnan(R[win]).mean(axis=0) <= MAX_COV_MISSING
+                for style in STYLE_BUCKETS:
+                    todo = [t for t in COV_ESTIMATORS if not cov_path(t, style, date).exists()]
+                    keep = (styles == W.style_code(style)).all(axis=0) & complete
+                    if not todo or keep.sum() < 2:
+                        continue
+                    block = R[win][:, keep]
+                    block = np.where(np.isnan(block), np.nanmean(block, axis=0), block)
+                    with telemetry.hot("gram_pass", rows=int(keep.sum())):
+                        mom = cov_estimators.WindowMoments(block, precision.DTYPE)
+                    for tag in todo:
+                        payload = {"permnos": feas[keep].tolist(),
+                                   "cov": (estimate(tag, mom) * DAYS_PER_MONTH).astype(np.float32)}
+                        joblib.dump(payload, cov_path(tag, style, date), compress=3)
+            sec.add_rows(1)
+
+        if rows:
+            pd.concat(rows, ignore_index=True).to_parquet(betas_fp, index=False)
+
+    c_days, c_R, c_F = days[-carry:], R[-carry:], F[-carry:]
+    elapsed = time.time() - start_time
+    print(f"{yr}: {len(days) - first} days, {len(ends)} month-ends | elapsed {elapsed / 60:5.1f} min "
+          f"| ETA {(len(years) - k - 1) * elapsed / (k + 1) / 60:5.1f} min")
+
+# μ-vectors: daily betas × the same LAMBDA_ROLL-month factor premia as 03
+beta_files = sorted(PARTS_DIR.glob("betas_*.parquet"))
+if not beta_files:
+    print(f"\nNo daily betas to build μ-vectors from (no month-end with {BETA_DAYS} days of history)")
+    sys.exit(0)
+
+with telemetry.section("mu_build") as sec:
+    factors = artifacts.read_parquet("french_factors.parquet").sort_values("date").set_index("date")
+    lam = factors[[*FACTORS, "RF"]].apply(pd.to_numeric, errors="coerce").rolling(LAMBDA_ROLL, min_periods=LAMBDA_ROLL).mean()
+    lam = lam.dropna(subset=["MKT_RF"])
+
+    betas = pd.concat([pd.read_parquet(fp) for fp in beta_files], ignore_index=True)
+    l = lam.reindex(betas["date"]).to_numpy()
+    mu = betas[["permno", "date"]].copy()
+    for mdl, cols in MODELS.items():
+        mu[f"mu_{mdl.lower()}"] = sum(betas[f"beta_{mdl}_{c}"].to_numpy() * l[:, FACTORS.index(c)] for c in cols) + l[:, -1]
+    artifacts.to_parquet(mu, MU_FILE, index=False)
+    sec.add_rows(len(mu))
+
+print(f"\nSaved {len(betas):,} daily-window betas to {PARTS_DIR}/, μ-vectors to {MU_FILE} "
+      f"and Σ to {', '.join(f'{cov_dir(t)}/' for t in COV_ESTIMATORS)}")
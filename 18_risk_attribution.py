@@ -0,0 +1,119 @@
+import time
+from pathlib import Path
+import numpy as np, pandas as pd
+import joblib
+import pyarrow.parquet as pq
+import artifacts
+import telemetry
+
+telemetry.start_stage("18_risk_attribution")
+
+# Paths & constants
+OUT_DIR = Path("outputs")
+WGT_DIR = OUT_DIR / "weights"
+PARTS_DIR = OUT_DIR / "beta_parts"
+COV_TAG = "lw"   # Σ the weights were optimised on (COV_TAG in 05)
+COV_DIR = OUT_DIR / ("cov_mats" if COV_TAG == "lw" else f"cov_mats_{COV_TAG}")
+COV_WINDOW = 60  # months of factor returns behind Ω, as behind Σ in 04
+
+STYLES = ["Value", "Growth"]
+FACTORS = ["MKT_RF", "SMB", "HML", "RMW", "CMA"]
+MODELS = {"CAPM": ["MKT_RF"], "FF3": ["MKT_RF", "SMB", "HML"], "FF5": FACTORS}
+
+# Ex-ante split of σ_p² = w'Σw for every (style, model, date):
+#   marginal ∂σ_p/∂w_i = (Σw)_i / σ_p and component w_i (Σw)_i / σ_p, which sum to σ_p
+#   factor   b'Ωb with b = B'w from the model's own stage-03 betas and Ω the factor covariance over
+#            the Σ window; specific = σ_p² − factor, whatever the model's factors leave unexplained
+# Σ is loaded once per (style, date) and multiplied by the three models' weights as one n × 3 block
+
+
+# Inputs: factor returns, betas by date, weights by (style, date)
+with telemetry.section("load") as sec:
+    factors = artifacts.read_parquet("french_factors.parquet").sort_values("date").set_index("date")
+    factors = factors[FACTORS].apply(pd.to_numeric, errors="coerce")
+
+    beta_cols = [f"beta_{m}_{c}" for m, cols in MODELS.items() for c in cols]
+    betas = pq.ParquetDataset(PARTS_DIR).read(columns=["permno", "date", *beta_cols]).to_pandas()
+    betas = betas.drop_duplicates(["permno", "date"], keep="last")
+    betas_by_date = {d: g.set_index("permno") for d, g in betas.groupby("date")}
+
+    weights = {}
+    for fp in sorted(WGT_DIR.glob("weights_*.parquet")):
+        style, model = fp.stem.split("_")[1:]
+        for d, g in artifacts.read_parquet(fp).groupby("date"):
+            weights.setdefault((style, pd.Timestamp(d)), {})[model] = g.set_index("permno")["weight"]
+    sec.add_rows(len(betas))
+
+# Decomposition, one Σ load per (style, date)
+summary, contrib = [], []
+t0 = time.perf_counter()
+with telemetry.section("attribution") as sec:
+    for (style, date), by_model in sorted(weights.items()):
+        fp = COV_DIR / f"Σ_{style}_{date:%Y%m%d}.joblib"
+        if not fp.exists():
+            continue
+        with telemetry.hot("cov_load"):
+            payload = joblib.load(fp)
+        permnos = np.asarray(payload["permnos"])
+        Sigma = payload["cov"].astype(float)
+        models = [m for m in MODELS if m in by_model]
+
+        # n × models weight block on Σ's PERMNO order; one product serves every model
+        Wm = np.column_stack([by_model[m].reindex(permnos).fillna(0).to_numpy() for m in models])
+        SW = Sigma @ Wm
+        var = np.einsum("nm,nm->m", Wm, SW)
+        vol = np.sqrt(var)
+        comp = Wm * SW / vol
+
+        fwin = factors.loc[:date].iloc[-COV_WINDOW:].dropna()
+        Omega = np.cov(fwin.to_numpy(), rowvar=False, ddof=0) if len(fwin) == COV_WINDOW else None
+        B = betas_by_date.get(date, pd.DataFrame(columns=beta_cols)).reindex(permnos)
+
+        for j, mdl in enumerate(models):
+            w = Wm[:, j]
+            held = np.flatnonzero(w > 0)
+            pct = comp[held, j] / vol[j]
+            top = held[np.argmax(pct)]
+            row = {"style": style, "model": mdl, "date": date, "n_sigma": len(permnos), "n_holdings": len(held),
+                   "vol": vol[j], "var": var[j], "top_permno": int(permnos[top]), "top_pct": pct.max(),
+                   "eff_n_risk": 1 / (pct ** 2).sum()}
+
+            # Factor vs specific with the model's own betas (stocks without betas count as pure specific)
+            cols = MODELS[mdl]
+            Bm = B[[f"beta_{mdl}_{c}" for c in cols]].to_numpy(float)
+            has = ~np.isnan(Bm).any(axis=1)
+            row["beta_coverage"] = w[has].sum()
+            if Omega is not None:
+                ix = [FACTORS.index(c) for c in cols]
+                b = np.nan_to_num(Bm).T @ w
+                Ob = Omega[np.ix_(ix, ix)] @ b
+                row["factor_var"] = b @ Ob
+                row["specific_var"] = var[j] - row["factor_var"]
+                row["factor_share"] = row["factor_var"] / var[j]
+                row.update({f"var_{c}": b_k * Ob_k for c, b_k, Ob_k in zip(cols, b, Ob)})
+            summary.append(row)
+
+            contrib.append(pd.DataFrame({"style": style, "model": mdl, "date": date, "permno": permnos[held],
+                                         "weight": w[held], "marginal": SW[held, j] / vol[j],
+                                         "component": comp[held, j], "pct": pct}))
+        sec.add_rows(len(models))
+
+summary = pd.DataFrame(summary)
+cols = ["style", "model", "date", "n_sigma", "n_holdings", "vol", "var", "factor_var", "specific_var", "factor_share",
+        *[f"var_{c}" for c in FACTORS], "beta_coverage", "top_permno", "top_pct", "eff_n_risk"]
+summary = summary.reindex(columns=cols).astype({"style": "category", "model": "category"})
+summary.to_parquet(OUT_DIR / "risk_attribution.parquet", index=False)
+
+contrib = pd.concat(contrib, ignore_index=True)
+contrib = contrib.astype({"style": "category", "model": "category", "permno": "int32",
+                          **{c: "float32" for c in ["weight", "marginal", "component", "pct"]}})
+contrib.to_parquet(OUT_DIR / "risk_contributions.parquet", index=False)
+print(f"{len(summary):,} portfolios, {len(contrib):,} stock contributions in {time.perf_counter() - t0:.1f} s")
+
+# Console output
+pd.set_option("display.width", 160)
+print("\n=====  Average ex-ante risk by strategy (monthly)  =====")
+avg = summary.groupby(["style", "model"], observed=True)[["vol", "factor_share", "top_pct", "eff_n_risk", "beta_coverage"]].mean()
+print(avg.to_string(float_format="{:.4f}".format))
+
+print("\nSaved risk_attribution.parquet and risk_contributions.parquet")
@@ -0,0 +1,119 @@
+import sys, time
+from pathlib import Path
+import numpy as np, pandas as pd
+import pyarrow.parquet as pq
+import artifacts
+import telemetry
+import wide_panel
+
+telemetry.start_stage("19_fama_macbeth")
+
+# Paths & constants
+OUT_DIR = Path("outputs")
+PARTS_DIR = OUT_DIR / "beta_parts"      # stage-03 betas (rolling); beta_parts_{tag}/ for another estimator
+LAMBDA_FILE = OUT_DIR / "fm_lambda.parquet"
+MIN_STOCKS = 20  # stocks a month needs for its cross-section
+
+FACTORS = ["MKT_RF", "SMB", "HML", "RMW", "CMA"]
+MODELS = {"CAPM": ["MKT_RF"], "FF3": ["MKT_RF", "SMB", "HML"], "FF5": FACTORS}
+
+# Fama-MacBeth: each month t + 1, rexcess is regressed across stocks on a constant and the betas
+# estimated to t, for every factor set. The regressions of all months are one batched solve on
+# grouped Gram matrices (one bincount per pair of regressors). Premia are the means of the monthly
+# slopes; Shanken (1992) scales their variance by 1 + λ'Σ_f⁻¹λ for the betas being estimated, plus
+# Σ_f / T on the factor premia. The monthly slopes, indexed by the return month, are written to
+# fm_lambda.parquet: LAMBDA_SOURCE=fm in 03 rolls them into μ in place of the factor-return means
+
+
+def grouped_ls(g: np.ndarray, T: int, Z: np.ndarray, y: np.ndarray):
+    # Per-group OLS of y on Z: g holds each row's group in [0, T). Returns slopes (T, k), rows per
+    # group and R², NaN for groups with fewer than MIN_STOCKS rows or a singular design
+    k = Z.shape[1]
+    G = np.empty((T, k, k))
+    for i in range(k):
+        for j in range(i, k):
+            G[:, i, j] = G[:, j, i] = np.bincount(g, Z[:, i] * Z[:, j], minlength=T)
+    b = np.column_stack([np.bincount(g, Z[:, i] * y, minlength=T) for i in range(k)])
+    yy = np.bincount(g, y * y, minlength=T)
+    n = np.bincount(g, minlength=T)
+
+    ok = (n >= max(MIN_STOCKS, k + 1)) & (np.abs(np.linalg.det(G)) > 0)
+    theta = np.full((T, k), np.nan)
+    theta[ok] = np.linalg.solve(G[ok], b[ok][..., None])[..., 0]
+    rss = yy - (theta * b).sum(axis=1)
+    tss = yy - b[:, 0] ** 2 / np.maximum(n, 1)  # Z[:, 0] is the constant
+    return theta, n, 1 - rss / tss
+
+
+# Inputs: betas at t, rexcess at t + 1, factor returns
+with telemetry.section("load") as sec:
+    W = wide_panel.load()
+    beta_cols = [f"beta_{m}_{c}" for m, cols in MODELS.items() for c in cols]
+    betas = pq.ParquetDataset(PARTS_DIR).read(columns=["permno", "date", *beta_cols]).to_pandas()
+    betas = betas.drop_duplicates(["permno", "date"], keep="last")
+    betas["ret_date"] = betas["date"] + pd.offsets.MonthEnd(1)
+    betas["rexcess"] = W.lookup(W.rexcess, betas["ret_date"], betas["permno"])
+    betas = betas.dropna(subset=["rexcess"])
+
+    factors = artifacts.read_parquet("french_factors.parquet").sort_values("date").set_index("date")
+    factors = factors[FACTORS].apply(pd.to_numeric, errors="coerce").astype(np.float64)
+    sec.add_rows(len(betas))
+
+months = pd.DatetimeIndex(np.sort(betas["ret_date"].unique()))
+g = months.get_indexer(betas["ret_date"])
+y = betas["rexcess"].to_numpy(np.float64)
+print(f"{len(betas):,} stock-months over {len(months)} return months")
+
+# Monthly cross-sections, every month of a model in one solve
+t0 = time.perf_counter()
+lam, summary, rows = [], [], []
+with telemetry.section("cross_sections") as sec:
+    for mdl, cols in MODELS.items():
+        X = betas[[f"beta_{mdl}_{c}" for c in cols]].to_numpy(np.float64)
+        live = ~np.isnan(X).any(axis=1)
+        Z = np.column_stack([np.ones(live.sum()), X[live]])
+        theta, n, r2 = grouped_ls(g[live], len(months), Z, y[live])
+
+        lt = pd.DataFrame(theta, index=months, columns=["const", *cols]).dropna()
+        lam.append(lt.assign(model=mdl))
+        T = len(lt)
+        if T < 2:
+            print(f"[{mdl}] {T} usable months; skipped")
+            continue
+
+        # Fama-MacBeth and Shanken standard errors
+        f = factors.reindex(lt.index)[cols]
+        Sf = np.atleast_2d(np.cov(f.to_numpy(), rowvar=False))
+        prem = lt.mean()
+        var_fm = lt.var() / T
+        c = float(prem[cols] @ np.linalg.solve(Sf, prem[cols]))
+        var_sh = (1 + c) * var_fm + pd.Series([0.0, *np.diag(Sf) / T], index=lt.columns)
+        for term in lt.columns:
+            rows.append({"model": mdl, "term": term, "premium": prem[term],
+                         "ts_mean": f[term].mean() if term in cols else np.nan,
+                         "se_fm": np.sqrt(var_fm[term]), "t_fm": prem[term] / np.sqrt(var_fm[term]),
+                         "se_shanken": np.sqrt(var_sh[term]), "t_shanken": prem[term] / np.sqrt(var_sh[term]),
+                         "n_months": T})
+        used = months.isin(lt.index)
+        summary.append({"model": mdl, "n_months": T, "avg_stocks": n[used].mean(),
+                        "avg_r2": r2[used].mean(), "shanken_c": c})
+        sec.add_rows(int(live.sum()))
+
+print(f"Cross-sections solved in {time.perf_counter() - t0:.2f} s")
+
+# Monthly slopes for 03 (LAMBDA_SOURCE=fm) and the tables
+lam = pd.concat(lam).rename_axis("date").reset_index()
+lam = lam[["date", "model", "const", *FACTORS]].astype({"model": "category"})
+artifacts.to_parquet(lam, LAMBDA_FILE, index=False)
+res = pd.DataFrame(rows, columns=["model", "term", "premium", "ts_mean", "se_fm", "t_fm", "se_shanken", "t_shanken", "n_months"])
+res.to_csv(OUT_DIR / "fama_macbeth.csv", index=False)
+if res.empty:
+    print(f"\nNo usable months: no model has 2 cross-sections of {MIN_STOCKS}+ stocks; "
+          f"wrote empty outputs/fama_macbeth.csv and {LAMBDA_FILE}")
+    sys.exit(0)
+
+pd.set_option("display.width", 160)
+print("\n=====  Fama-MacBeth premia (monthly)  =====")
+print(res.set_index(["model", "term"]).drop(columns="n_months").to_string(float_format="{:.4f}".format))
+print("\n" + pd.DataFrame(summary).set_index("model").to_string(float_format="{:.3f}".format))
+print(f"\nSaved outputs/fama_macbeth.csv and {LAMBDA_FILE}")
@@ -0,0 +1,123 @@
+import sys, time
+from pathlib import Path
+import numpy as np, pandas as pd
+import artifacts
+import cov_store
+import telemetry
+import wide_panel
+
+telemetry.start_stage("20_cov_eval")
+
+# Paths & constants
+OUT_DIR = Path("outputs")
+WGT_DIR = OUT_DIR / "weights"
+HORIZON = 1       # months of returns behind the realised variance, at the weights held fixed (not drifted)
+MZ_WINDOW = 60    # months per rolling Mincer-Zarnowitz regression
+MIN_COVERAGE = 0.99  # weight a portfolio must have inside Σ's PERMNOs to be evaluated
+
+# Every stored Σ (cov_mats/ and each cov_mats_{tag}/ from 04 and 17) against what followed: the
+# predicted variance w'Σw of the stage-05 weights and of equal- and value-weighted portfolios of Σ's
+# stocks, next to the realised variance, the mean squared excess return over the next HORIZON months.
+#   bias   RMS of r / σ̂ (1 when σ̂ is right; ±√(2/T) band), and mean realised / predicted
+#   QLIKE  mean of log σ̂² + realised / σ̂², lower is better and robust to noise in the proxy
+#   MZ     realised = a + b σ̂² + e over the whole sample and rolling MZ_WINDOW months (a = 0, b = 1)
+# Each directory is read through cov_store's memory map; per Σ one n × k product serves all k portfolios
+
+
+def cov_dirs() -> dict[str, Path]:
+    dirs = sorted(d for d in OUT_DIR.glob("cov_mats*") if d.is_dir() and any(d.glob("Σ_*.joblib")))
+    return {("lw" if d.name == "cov_mats" else d.name[len("cov_mats_"):]): d for d in dirs}
+
+
+def rolling_mz(g: pd.DataFrame) -> pd.DataFrame:
+    r = g[["pred", "real"]].rolling(MZ_WINDOW, min_periods=MZ_WINDOW)
+    m, c = r.mean(), r.cov(pairwise=True).unstack()
+    b = c[("pred", "real")] / c[("pred", "pred")]
+    return pd.DataFrame({"mz_a": m["real"] - b * m["pred"], "mz_b": b}, index=g.index)
+
+
+# Inputs: weights by (style, date), the wide return and market-cap arrays
+with telemetry.section("load") as sec:
+    W = wide_panel.load()
+    weights = {}
+    for fp in sorted(WGT_DIR.glob("weights_*.parquet")):
+        style, model = fp.stem.split("_")[1:]
+        for d, g in artifacts.read_parquet(fp).groupby("date"):
+            weights.setdefault((style, pd.Timestamp(d)), {})[model] = g.set_index("permno")["weight"]
+    sec.add_rows(len(weights))
+
+# Predicted and realised variance, one pass over each store
+rows = []
+t0 = time.perf_counter()
+for tag, d in cov_dirs().items():
+    with telemetry.section(f"store_{tag}") as sec:
+        store = cov_store.load(d)
+        sec.add_rows(len(store))
+    with telemetry.section(f"quad_forms_{tag}") as sec:
+        for i in range(len(store)):
+            style, date, permnos, Sigma = store.entry(i)
+            ahead = [W.row(date + pd.offsets.MonthEnd(h)) for h in range(1, HORIZON + 1)]
+            t = W.row(date)
+            if t < 0 or min(ahead) < 0:
+                continue
+            cols = W.cols(permnos)
+
+            # n × k weights: the optimised portfolios, then EW and VW of Σ's stocks
+            names, P = [], []
+            for mdl, w in sorted(weights.get((style, date), {}).items()):
+                if w.reindex(permnos).sum() >= MIN_COVERAGE * w.sum():
+                    names.append(mdl)
+                    P.append(w.reindex(permnos).fillna(0).to_numpy())
+            cap = np.where(cols >= 0, W.mktcap[t, cols.clip(0)], np.nan)
+            cap = np.nan_to_num(cap)
+            names += ["EW", "VW"]
+            P += [np.full(len(permnos), 1 / len(permnos)), cap / cap.sum() if cap.sum() > 0 else np.full(len(permnos), np.nan)]
+            P = np.column_stack(P)
+
+            pred = np.einsum("nk,nk->k", P, Sigma @ P)
+
+            # Excess returns at the formation weights in each month ahead, renormalised over the stocks with a return
+            R = np.stack([np.where(cols >= 0, W.rexcess[a, cols.clip(0)], np.nan) for a in ahead])
+            have = ~np.isnan(R)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                real = ((np.nan_to_num(R) @ P) / (have @ P)) ** 2
+            rows.append(pd.DataFrame({"tag": tag, "style": style, "date": date, "portfolio": names,
+                                      "pred": pred, "real": real.mean(axis=0)}))
+            sec.add_rows(1)
+
+series = (pd.concat(rows, ignore_index=True) if rows
+          else pd.DataFrame(columns=["tag", "style", "date", "portfolio", "pred", "real"])).dropna(subset=["pred", "real"])
+series = series[series["pred"] > 0].sort_values(["tag", "style", "portfolio", "date"], ignore_index=True)
+if series.empty:
+    sys.exit("No Σ to evaluate: no cov_mats*/ directory with a date inside the return panel")
+print(f"{len(series):,} (Σ, portfolio) forecasts in {time.perf_counter() - t0:.1f} s")
+
+# Loss functions and Mincer-Zarnowitz
+with telemetry.section("evaluate") as sec:
+    key = ["tag", "style", "portfolio"]
+    series["z"] = np.sqrt(series["real"] / series["pred"])  # |r| / σ̂ at HORIZON = 1
+    series["qlike"] = np.log(series["pred"]) + series["real"] / series["pred"]
+    series = series.join(series.groupby(key, group_keys=False).apply(rolling_mz, include_groups=False))
+
+    def summarise(g: pd.DataFrame) -> pd.Series:
+        T = len(g)
+        b, a = np.polyfit(g["pred"], g["real"], 1) if T > 2 else (np.nan, np.nan)
+        r2 = np.corrcoef(g["pred"], g["real"])[0, 1] ** 2 if T > 2 else np.nan
+        return pd.Series({"n_months": T, "pred_vol": np.sqrt(g["pred"].mean()), "real_vol": np.sqrt(g["real"].mean()),
+                          "bias_stat": np.sqrt((g["z"] ** 2).mean()), "bias_band": np.sqrt(2 / T),
+                          "ratio": g["real"].mean() / g["pred"].mean(), "qlike": g["qlike"].mean(),
+                          "mz_a": a, "mz_b": b, "mz_r2": r2, "mz_b_roll_min": g["mz_b"].min(),
+                          "mz_b_roll_max": g["mz_b"].max()})
+
+    summary = series.groupby(key).apply(summarise, include_groups=False).reset_index().astype({"n_months": int})
+    sec.add_rows(len(series))
+
+series.astype({c: "category" for c in key}).to_parquet(OUT_DIR / "cov_eval_series.parquet", index=False)
+summary.to_parquet(OUT_DIR / "cov_eval.parquet", index=False)
+
+pd.set_option("display.width", 180)
+print("\n=====  Σ forecasts vs realised variance (monthly)  =====")
+print(summary.set_index(key).to_string(float_format="{:.4f}".format))
+print("\nQLIKE by estimator (lower is better):")
+print(summary.pivot_table(index="tag", columns="portfolio", values="qlike").to_string(float_format="{:.3f}".format))
+print("\nSaved outputs/cov_eval.parquet and outputs/cov_eval_series.parquet")
@@ -0,0 +1,61 @@
+import os
+from pathlib import Path
+import pandas as pd
+
+# In-process handoff between stages run by pipeline.py: frames written with to_parquet() stay in
+# memory, keyed by resolved path, and later read_parquet() calls on the same file are served from
+# there while the file on disk is unchanged. Off by default, so a standalone script reads and
+# writes Parquet exactly as before
+KEEP = os.environ.get("ARTIFACTS_KEEP", "") == "1"
+MAX_MB = float(os.environ.get("ARTIFACTS_MAX_MB", 4096))  # oldest frames are dropped beyond this
+
+_store: dict[Path, tuple[int, pd.DataFrame]] = {}
+hits = misses = 0
+
+
+def _key(path) -> Path:
+    return Path(path).resolve()
+
+
+def _mtime(key: Path) -> int:
+    return key.stat().st_mtime_ns
+
+
+def keep(on: bool = True) -> None:
+    global KEEP
+    KEEP = on
+    if not on:
+        _store.clear()
+
+
+def put(df: pd.DataFrame, path) -> None:
+    key = _key(path)
+    _store.pop(key, None)
+    _store[key] = (_mtime(key), df)
+    total = sum(d.memory_usage(index=True).sum() for _, d in _store.values()) / 2**20
+    while total > MAX_MB and len(_store) > 1:
+        _, old = _store.pop(next(iter(_store)))
+        total -= old.memory_usage(index=True).sum() / 2**20
+
+
+def to_parquet(df: pd.DataFrame, path, **kw) -> None:
+    df.to_parquet(path, **kw)
+    if KEEP:
+        put(df.reset_index(drop=True) if kw.get("index") is False else df, path)
+
+
+def read_parquet(path, columns=None) -> pd.DataFrame:
+    # A copy, so a stage that mutates what it reads cannot change what the next stage sees
+    global hits, misses
+    key = _key(path)
+    hit = _store.get(key)
+    if hit is not None and key.exists() and _mtime(key) == hit[0]:
+        hits += 1
+        df = hit[1]
+        return (df[list(columns)] if columns is not None else df).copy()
+    _store.pop(key, None)
+    misses += 1
+    df = pd.read_parquet(path, columns=columns)
+    if KEEP and columns is None:
+        put(df, path)
+    return df
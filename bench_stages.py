@@ -0,0 +1,127 @@
+import argparse, json, os, subprocess, sys, tempfile, time
+from pathlib import Path
+import numpy as np, pandas as pd
+
+import synth_panel
+
+REPO = Path(__file__).resolve().parent
+OUT = Path("outputs")
+
+# Stages that run offline on the synthetic panel; add 01_pull_clean.py to also time the pull
+# against the local SQLite stand-in (it still downloads the French CSVs on a cold query cache)
+STAGES = [
+    "02_feasible_panel-3.py",
+    "03_betas_mu-5.py",
+    "04_cov_mat.py",
+    "05_optimise-3.py",
+    "06_backtest_metrics.py",
+    "07_benchmark_pull.py",
+    "08_benchmark_comparison.py",
+    "09_plots-4.py",
+    "10_divergence_plots.py",
+    "11_portfolio_forecasts.py",
+    "12_clarkwest.py",
+    "13_bootstrap.py",
+    "14_stress_tests.py",
+    "15_monte_carlo.py",
+    "16_sharpe_tests.py",
+    "17_daily_betas_cov.py",
+    "18_risk_attribution.py",
+    "19_fama_macbeth.py",
+    "20_cov_eval.py",
+]
+# (PERMNOs, months)
+SCALES = [(100, 120), (200, 180), (400, 240)]
+
+
+def run_scale(n_permnos: int, n_months: int, missing: float, stages: list[str], seed: int) -> list[dict]:
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="vgo_bench_") as tmp:
+        with_db = "01_pull_clean.py" in stages
+        info = synth_panel.generate(tmp, n_permnos, n_months, missing, seed=seed, db="sqlite" if with_db else None,
+                                    daily="17_daily_betas_cov.py" in stages)
+        run_id = f"bench-{n_permnos}x{n_months}"
+        env = {**os.environ, "RUN_ID": run_id, "RUN_LOG": str(Path(tmp) / "run_log.jsonl"),
+               "WRDS_BACKEND": f"sqlite:{Path(tmp) / 'wrds_local'}",
+               "QUERY_CACHE_DIR": str(Path(tmp) / "cache" / "queries")}
+
+        for script in stages:
+            t0 = time.perf_counter()
+            proc = subprocess.run([sys.executable, str(REPO / script)], cwd=tmp, env=env,
+                                  capture_output=True, text=True)
+            wall = time.perf_counter() - t0
+            if proc.returncode != 0:
+                err = proc.stderr.strip().splitlines()[-1:] or ["?"]
+                print(f"  {script}: FAILED ({err[0]})")
+
+            rows.append({"stage": script, "permnos": n_permnos, "months": n_months,
+                         "panel_rows": info["crsp_rows"], "wall_s": wall, "ok": proc.returncode == 0})
+            print(f"  {script:<28} {wall:8.2f} s")
+
+        log = Path(env["RUN_LOG"])
+        if log.exists():
+            sections = [json.loads(l) for l in log.read_text().splitlines()]
+            peak = {}
+            for rec in sections:
+                if rec["section"] == "__stage__":
+                    peak[rec["stage"]] = rec["peak_rss_process_mb"]
+            for r in rows:
+                key = Path(r["stage"]).stem.rsplit("-", 1)[0]
+                r["peak_rss_mb"] = peak.get(key, np.nan)
+            rows.append({"stage": "__sections__", "permnos": n_permnos, "months": n_months,
+                         "panel_rows": info["crsp_rows"], "sections": sections})
+    return rows
+
+
+def scaling_table(res: pd.DataFrame) -> pd.DataFrame:
+    # Throughput at each scale and the log-log slope of wall time on panel rows
+    res = res[res["ok"]].copy()
+    res["rows_per_s"] = res["panel_rows"] / res["wall_s"]
+    out = []
+    for stage, g in res.groupby("stage", sort=False):
+        slope = np.nan
+        if len(g) >= 2:
+            slope = np.polyfit(np.log(g["panel_rows"]), np.log(g["wall_s"]), 1)[0]
+        out.append({"stage": stage, "scaling_exp": slope,
+                    **{f"rows/s @ {r.permnos}x{r.months}": r.rows_per_s for r in g.itertuples()}})
+    return pd.DataFrame(out).set_index("stage")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Time each stage on synthetic panels of several sizes")
+    ap.add_argument("--scales", nargs="*", default=[f"{p}x{m}" for p, m in SCALES], help="PERMNOSxMONTHS")
+    ap.add_argument("--stages", nargs="*", default=STAGES)
+    ap.add_argument("--missing", type=float, default=0.02)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", type=Path, help="earlier bench_results.csv to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="flag slow-downs above this fraction")
+    a = ap.parse_args()
+
+    results, sections = [], []
+    for sc in a.scales:
+        p, m = map(int, sc.lower().split("x"))
+        print(f"\n[{p} PERMNOs x {m} months]")
+        for r in run_scale(p, m, a.missing, a.stages, a.seed):
+            (sections if r["stage"] == "__sections__" else results).append(r)
+
+    res = pd.DataFrame(results)
+    OUT.mkdir(exist_ok=True)
+    res.to_csv(OUT / "bench_results.csv", index=False)
+    pd.DataFrame([{**s, "permnos": b["permnos"], "months": b["months"]}
+                  for b in sections for s in b["sections"]]).to_csv(OUT / "bench_sections.csv", index=False)
+
+    print("\n=====  Throughput & scaling  =====")
+    print(scaling_table(res).to_string(float_format="{:,.2f}".format))
+
+    if a.baseline:
+        base = pd.read_csv(a.baseline)
+        cmp = res.merge(base, on=["stage", "permnos", "months"], suffixes=("", "_base"))
+        cmp["ratio"] = cmp["wall_s"] / cmp["wall_s_base"]
+        slow = cmp[cmp["ratio"] > 1 + a.tolerance]
+        print(f"\n=====  Regressions vs {a.baseline} (>{a.tolerance:.0%} slower)  =====")
+        print(slow[["stage", "permnos", "months", "wall_s_base", "wall_s", "ratio"]].to_string(index=False)
+              if not slow.empty else "none")
+        if not slow.empty:
+            sys.exit(1)
+
+    print(f"\nSaved {OUT / 'bench_results.csv'} and {OUT / 'bench_sections.csv'}")
@@ -0,0 +1,157 @@
+import os
+import numpy as np
+
+# Recursive least squares: each new month is a rank-one update of (X'ΛX)^-1 and the coefficients,
+# O(k²) per stock-month instead of refitting a whole window. The state of each fit can be saved and
+# restored, so a later run feeds only the months added since
+
+
+def ewma_lambda(halflife: float) -> float:
+    # Forgetting factor whose weights halve every `halflife` observations
+    return 0.5 ** (1.0 / halflife)
+
+
+class RecursiveLS:
+    # Exponentially weighted (lam < 1) or expanding-window (lam = 1) least squares. The first
+    # min_obs rows are accumulated and solved directly, so every estimate equals the batch
+    # weighted OLS fit on all rows so far (weights lam**age). The weighted residual sum of
+    # squares is carried along, so the residual volatility is O(k²) per month as well
+    def __init__(self, k: int, lam: float = 1.0):
+        self.k, self.lam = k, lam
+        self.xx = np.zeros((k, k))
+        self.xy = np.zeros(k)
+        self.yy = 0.0
+        self.sw = 0.0  # Σ lam**age
+        self.P = None
+        self.theta = None
+        self.rss = None
+        self.n = 0
+
+    def update(self, x: np.ndarray, y: float) -> None:
+        self.n += 1
+        self.sw = self.lam * self.sw + 1.0
+        if self.P is None:
+            self.xx = self.lam * self.xx + np.outer(x, x)
+            self.xy = self.lam * self.xy + x * y
+            self.yy = self.lam * self.yy + y * y
+            return
+        Px = self.P @ x
+        denom = self.lam + x @ Px
+        err = y - x @ self.theta
+        gain = Px / denom
+        self.theta = self.theta + gain * err
+        self.rss = self.lam * self.rss + self.lam * err * err / denom
+        P = (self.P - np.outer(gain, Px)) / self.lam
+        self.P = 0.5 * (P + P.T)
+
+    def start(self) -> None:
+        # Switch from direct accumulation to the recursion
+        self.P = np.linalg.pinv(self.xx)
+        self.theta = self.P @ self.xy
+        self.rss = max(self.yy - self.theta @ self.xy, 0.0)
+
+    def state(self) -> dict:
+        # Everything update() needs to carry on from the last observation
+        s = {"k": self.k, "lam": self.lam, "xx": self.xx, "xy": self.xy, "yy": self.yy, "sw": self.sw, "n": self.n}
+        if self.P is not None:
+            s.update(P=self.P, theta=self.theta, rss=self.rss)
+        return s
+
+    @classmethod
+    def from_state(cls, s: dict) -> "RecursiveLS":
+        m = cls(int(s["k"]), float(s["lam"]))
+        m.xx, m.xy, m.yy, m.sw, m.n = np.array(s["xx"]), np.array(s["xy"]), float(s["yy"]), float(s["sw"]), int(s["n"])
+        if "P" in s:
+            m.P, m.theta, m.rss = np.array(s["P"]), np.array(s["theta"]), float(s["rss"])
+        return m
+
+    def resvol(self) -> float:
+        # Residual standard deviation, dof-corrected (sqrt(mse_resid) of OLS when lam = 1)
+        return np.sqrt(max(self.rss, 0.0) / (self.sw - self.k)) if self.sw > self.k else np.nan
+
+    def fit(self, X: np.ndarray, y: np.ndarray, min_obs: int):
+        # Coefficient and residual-volatility paths, one row per observation; NaN until
+        # min_obs rows have been seen
+        out = np.full((len(y), self.k), np.nan)
+        vol = np.full(len(y), np.nan)
+        for t in range(len(y)):
+            self.update(X[t], y[t])
+            if self.P is None and self.n >= min_obs:
+                self.start()
+            if self.theta is not None:
+                out[t] = self.theta
+                vol[t] = self.resvol()
+        return out, vol
+
+
+def recursive_betas(y: np.ndarray, X: np.ndarray, cols: list[str], factor_sets: dict,
+                    lam: float, min_obs: int, models: dict | None = None):
+    # X holds the factor columns named in `cols`; returns {"beta_{model}_{factor}": path} plus
+    # {"resvol_{model}": path}, and the fits {model: RecursiveLS}. Pass the fits of an earlier call
+    # (or load_state) as `models` to carry on with the observations that followed
+    const = np.ones((len(y), 1))
+    out, models = {}, dict(models or {})
+    for mdl, fs in factor_sets.items():
+        Z = np.hstack([const, X[:, [cols.index(c) for c in fs]]])
+        m = models.setdefault(mdl, RecursiveLS(Z.shape[1], lam))
+        theta, vol = m.fit(Z, y, min_obs)
+        for i, c in enumerate(fs, 1):
+            out[f"beta_{mdl}_{c}"] = theta[:, i]
+        out[f"resvol_{mdl}"] = vol
+    return out, models
+
+
+def save_state(path, models: dict, last_date) -> None:
+    # One .npz per stock: each model's RecursiveLS state and the date of the last observation fed
+    arrays = {f"{mdl}.{k}": np.asarray(v) for mdl, m in models.items() for k, v in m.state().items()}
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, last_date=np.datetime64(last_date, "ns"), **arrays)
+    os.replace(tmp, path)
+
+
+def load_state(path):
+    # ({model: RecursiveLS}, last date fed)
+    with np.load(path) as z:
+        by_model = {}
+        for key in z.files:
+            if key != "last_date":
+                mdl, field = key.split(".", 1)
+                by_model.setdefault(mdl, {})[field] = z[key]
+        return {mdl: RecursiveLS.from_state(s) for mdl, s in by_model.items()}, z["last_date"]
+
+
+def window_grid_betas(y: np.ndarray, X: np.ndarray, cols: list[str], factor_sets: dict,
+                      windows: list[int]) -> dict[int, dict[str, np.ndarray]]:
+    # Cumulative cross-products of z = [1, X, y]: the Gram matrix of the window of length w ending
+    # at t is C[t] - C[t-w], so each extra window length is one subtraction and a small batched
+    # solve per month. CAPM / FF3 are sub-blocks of the FF5 Gram matrix.
+    # Returns {w: {"beta_{model}_{factor}": path, "resvol_{model}": path}}, NaN until w rows have been seen
+    n = len(y)
+    Z = np.column_stack([np.ones(n), X, y])
+    C = np.zeros((n + 1, Z.shape[1], Z.shape[1]))
+    np.cumsum(Z[:, :, None] * Z[:, None, :], axis=0, out=C[1:])
+
+    out = {}
+    for w in windows:
+        if n < w:
+            continue
+        G = C[w:] - C[:-w]
+        paths = {}
+        for mdl, fs in factor_sets.items():
+            ix = [0] + [1 + cols.index(c) for c in fs]
+            A, b = G[:, ix][:, :, ix], G[:, ix, -1]
+            try:
+                theta = np.linalg.solve(A, b[..., None])[..., 0]
+            except np.linalg.LinAlgError:
+                theta = (np.linalg.pinv(A) @ b[..., None])[..., 0]
+            for i, c in enumerate(fs, 1):
+                path = np.full(n, np.nan)
+                path[w - 1:] = theta[:, i]
+                paths[f"beta_{mdl}_{c}"] = path
+            rss = np.maximum(G[:, -1, -1] - np.einsum("ti,ti->t", b, theta), 0.0)
+            path = np.full(n, np.nan)
+            path[w - 1:] = np.sqrt(rss / (w - len(ix)))
+            paths[f"resvol_{mdl}"] = path
+        out[w] = paths
+    return out
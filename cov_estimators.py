@@ -0,0 +1,91 @@
+import numpy as np
+
+# Covariance estimators sharing one pass per window: the demeaned return block X (T x N) and its
+# Gram matrix S = X'X / T are computed once, and each estimator only adds its own shrinkage step.
+# Every estimator takes a WindowMoments and returns an N x N matrix in its dtype (float64 unless the
+# caller asks for float32, which halves the block and the Gram product)
+
+
+class WindowMoments:
+    def __init__(self, block: np.ndarray, dtype=np.float64):
+        X = np.asarray(block, dtype=dtype)
+        self.X = X - X.mean(axis=0)
+        self.T, self.N = self.X.shape
+        self.S = self.X.T @ self.X / self.T  # maximum-likelihood sample covariance (sklearn's empirical_covariance)
+        self.trace = np.trace(self.S)
+
+
+def _to_identity(m: WindowMoments, shrinkage: float) -> np.ndarray:
+    # (1 - shrinkage) S + shrinkage (tr S / N) I
+    cov = (1.0 - shrinkage) * m.S
+    cov.flat[:: m.N + 1] += shrinkage * m.trace / m.N
+    return cov
+
+
+def sample(m: WindowMoments) -> np.ndarray:
+    return m.S.copy()
+
+
+def ledoit_wolf(m: WindowMoments) -> np.ndarray:
+    # sklearn.covariance.ledoit_wolf_shrinkage, written in terms of S: sum((X²)'X²) is the sum of
+    # squared row norms, so the extra cost over S is O(TN)
+    if m.N == 1:
+        return m.S.copy()
+    T, N, mu = m.T, m.N, m.trace / m.N
+    beta_ = np.sum(np.sum(m.X ** 2, axis=1) ** 2)
+    delta_ = np.sum(m.S ** 2)
+    beta = (beta_ / T - delta_) / (N * T)
+    delta = (delta_ - 2.0 * mu * m.trace + N * mu ** 2) / N
+    beta = min(beta, delta)
+    return _to_identity(m, 0.0 if beta == 0 else beta / delta)
+
+
+def oas(m: WindowMoments) -> np.ndarray:
+    # Oracle approximating shrinkage, as in sklearn.covariance.oas
+    if m.N == 1:
+        return m.S.copy()
+    alpha = np.mean(m.S ** 2)
+    mu2 = (m.trace / m.N) ** 2
+    num = alpha + mu2
+    den = (m.T + 1) * (alpha - mu2 / m.N)
+    return _to_identity(m, 1.0 if den == 0 else min(num / den, 1.0))
+
+
+def ewma(m: WindowMoments, halflife: float = 24) -> np.ndarray:
+    # Exponentially weighted covariance, the latest month weighted most; the rows are re-centred on
+    # the weighted mean, so mean and covariance use the same weights
+    w = 0.5 ** (np.arange(m.T - 1, -1, -1) / halflife)
+    w = (w / w.sum()).astype(m.X.dtype)
+    Xw = (m.X - w @ m.X) * np.sqrt(w)[:, None]
+    return Xw.T @ Xw
+
+
+def nonlinear(m: WindowMoments) -> np.ndarray:
+    # Analytical nonlinear shrinkage (Ledoit & Wolf, 2020): each sample eigenvalue is replaced by
+    # a kernel estimate of its oracle value; one eigendecomposition of S per window
+    n, p = m.T - 1, m.N  # one degree of freedom used by demeaning
+    lam, u = np.linalg.eigh(m.S * m.T / n)
+    lam = lam[max(0, p - n):].clip(min=1e-18)
+    L = np.tile(lam, (min(p, n), 1)).T
+    h = n ** (-1 / 3)
+    H = h * L.T
+    x = (L - L.T) / H
+    ftilde = (3 / 4 / np.sqrt(5)) * np.mean(np.maximum(1 - x ** 2 / 5, 0) / H, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Hftemp = ((-3 / 10 / np.pi) * x + (3 / 4 / np.sqrt(5) / np.pi) * (1 - x ** 2 / 5)
+                  * np.log(np.abs((np.sqrt(5) - x) / (np.sqrt(5) + x))))
+    edge = np.abs(x) == np.sqrt(5)
+    Hftemp[edge] = (-3 / 10 / np.pi) * x[edge]
+    Hftilde = np.mean(Hftemp / H, axis=1)
+    if p <= n:
+        d = lam / ((np.pi * (p / n) * lam * ftilde) ** 2 + (1 - p / n - np.pi * (p / n) * lam * Hftilde) ** 2)
+    else:
+        Hftilde0 = ((1 / np.pi) * (3 / 10 / h ** 2 + 3 / 4 / np.sqrt(5) / h * (1 - 1 / 5 / h ** 2)
+                    * np.log((1 + np.sqrt(5) * h) / (1 - np.sqrt(5) * h))) * np.mean(1 / lam))
+        d0 = 1 / (np.pi * (p - n) / n * Hftilde0)
+        d1 = lam / (np.pi ** 2 * lam ** 2 * (ftilde ** 2 + Hftilde ** 2))
+        d = np.concatenate([np.full(p - n, d0), d1])
+    return (u * d) @ u.T
+
+
+ESTIMATORS = {"sample": sample, "lw": ledoit_wolf, "oas": oas, "ewma": ewma, "nonlinear": nonlinear}
@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+import numpy as np, pandas as pd
+import joblib
+
+# The Σ files of one covariance directory (Σ_{style}_{YYYYMMDD}.joblib from 04 / 17, compressed)
+# packed into one flat float32 file read through a memory map, so a stage that walks the whole
+# history gets each matrix as a zero-copy view instead of decompressing a file per month. The pack
+# lives next to the Σ files and is rebuilt when any of them is newer or the set has changed
+STORE, PERMNOS, INDEX = "store.f32", "store_permnos.i32", "store_index.parquet"
+
+
+def _files(cov_dir: Path) -> list[Path]:
+    return sorted(cov_dir.glob("Σ_*.joblib"))
+
+
+def stale(cov_dir) -> bool:
+    cov_dir = Path(cov_dir)
+    files, index = _files(cov_dir), cov_dir / INDEX
+    if not index.exists():
+        return True
+    built = index.stat().st_mtime_ns
+    return len(pd.read_parquet(index, columns=["offset"])) != len(files) or any(f.stat().st_mtime_ns > built for f in files)
+
+
+def build(cov_dir) -> int:
+    # One pass over the Σ files, appending raw float32 blocks; the index is written last, so an
+    # interrupted build is simply stale
+    cov_dir = Path(cov_dir)
+    rows, off, poff = [], 0, 0
+    with open(cov_dir / (STORE + ".tmp"), "wb") as fs, open(cov_dir / (PERMNOS + ".tmp"), "wb") as fp:
+        for f in _files(cov_dir):
+            payload = joblib.load(f)
+            cov = np.ascontiguousarray(payload["cov"], dtype=np.float32)
+            _, style, date = f.stem.split("_")
+            fs.write(cov.tobytes())
+            fp.write(np.asarray(payload["permnos"], dtype=np.int32).tobytes())
+            rows.append({"style": style, "date": pd.Timestamp(date), "n": len(cov), "offset": off, "poff": poff})
+            off += cov.size
+            poff += len(cov)
+    os.replace(cov_dir / (STORE + ".tmp"), cov_dir / STORE)
+    os.replace(cov_dir / (PERMNOS + ".tmp"), cov_dir / PERMNOS)
+    pd.DataFrame(rows, columns=["style", "date", "n", "offset", "poff"]).to_parquet(cov_dir / INDEX, index=False)
+    return len(rows)
+
+
+class CovStore:
+    def __init__(self, cov_dir):
+        cov_dir = Path(cov_dir)
+        if stale(cov_dir):
+            build(cov_dir)
+        self.index = pd.read_parquet(cov_dir / INDEX)
+        size = int((self.index["n"] ** 2).sum())
+        self.cov = np.memmap(cov_dir / STORE, dtype=np.float32, mode="r", shape=(size,)) if size else np.empty(0, np.float32)
+        self.permnos = np.fromfile(cov_dir / PERMNOS, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.index)
+
+    def entry(self, i: int):
+        # (style, date, PERMNOs, Σ) of index row i; Σ is a read-only view of the map
+        r = self.index.iloc[i]
+        n, off, poff = int(r["n"]), int(r["offset"]), int(r["poff"])
+        return r["style"], r["date"], self.permnos[poff:poff + n], self.cov[off:off + n * n].reshape(n, n)
+
+    def get(self, style: str, date):
+        hit = np.flatnonzero((self.index["style"] == style).to_numpy() & (self.index["date"] == pd.Timestamp(date)).to_numpy())
+        return self.entry(hit[0])[2:] if len(hit) else None
+
+
+def load(cov_dir) -> CovStore:
+    return CovStore(cov_dir)
@@ -0,0 +1,10 @@
+# Crisis windows (first and last month-end), shared by the risk metrics of 06 and the historical
+# replays of 14 so both use the same dates. 06 also reports the full sample, FULL
+FULL = ("1900-01-31", "2100-12-31")
+CRISES = {
+    "Black87"     : ("1987-08-31",  "1987-12-31"),
+    "DotCom"      : ("2000-03-31",  "2002-09-30"),
+    "GFC"         : ("2007-07-31",  "2009-03-31"),
+    "Covid"       : ("2020-02-29",  "2021-03-31"),
+    "RateShock22" : ("2022-01-31",  "2023-10-31"),
+}
@@ -0,0 +1,62 @@
+from pathlib import Path
+import numpy as np
+import wide_panel
+
+# Per-date feasibility index, built by 02 next to the wide arrays. For each mask (dates × PERMNOs) a
+# bitmap (np.packbits along PERMNOs, one bit per cell) and its prefix sums over dates, so the count
+# of flagged months in rows [lo, hi) is P[hi] - P[lo] and "a complete N-month window ending at t" is
+# one subtraction per stock, whatever N
+#   ret    rexcess present (the Σ windows of 04)
+#   valid  rexcess and all five factors present (the beta fits of 03, the 60-month screen of 02)
+MASKS = ["ret", "valid"]
+BLOCK = 4096  # PERMNO columns per build step
+
+
+def build(W: wide_panel.WidePanel = None, root=wide_panel.WIDE_DIR) -> None:
+    if W is None:
+        W = wide_panel.load(root)
+    root = Path(root)
+    T, N = W.shape
+    ptype = np.int16 if T < np.iinfo(np.int16).max else np.int32
+    for name in MASKS:
+        bits = np.lib.format.open_memmap(root / f"bits_{name}.npy", mode="w+", dtype=np.uint8, shape=(T, (N + 7) // 8))
+        prefix = np.lib.format.open_memmap(root / f"prefix_{name}.npy", mode="w+", dtype=ptype, shape=(T + 1, N))
+        prefix[0] = 0
+        for lo in range(0, N, BLOCK):  # BLOCK is a multiple of 8, so blocks map to whole bytes
+            hi = min(lo + BLOCK, N)
+            m = ~np.isnan(W.rexcess[:, lo:hi]) if name == "ret" else np.asarray(W.valid[:, lo:hi])
+            bits[:, lo // 8:(hi + 7) // 8] = np.packbits(m, axis=1)
+            np.cumsum(m, axis=0, dtype=ptype, out=prefix[1:, lo:hi])
+        bits.flush()
+        prefix.flush()
+        del bits, prefix
+
+
+class FeasibilityIndex:
+    def __init__(self, root=wide_panel.WIDE_DIR):
+        root = Path(root)
+        self.bits = {n: np.load(root / f"bits_{n}.npy", mmap_mode="r") for n in MASKS}
+        self.prefix = {n: np.load(root / f"prefix_{n}.npy", mmap_mode="r") for n in MASKS}
+        self.n_permnos = self.prefix[MASKS[0]].shape[1]
+
+    def row(self, name: str, t: int) -> np.ndarray:
+        # The mask at date row t, unpacked to one bool per PERMNO column
+        return np.unpackbits(self.bits[name][t], count=self.n_permnos).astype(bool)
+
+    def count(self, name: str, lo: int, hi: int, cols=slice(None)) -> np.ndarray:
+        # Flagged months in date rows [lo, hi) per PERMNO column
+        P = self.prefix[name]
+        return P[hi, cols].astype(np.int64) - P[lo, cols]
+
+    def total(self, name: str, cols=slice(None)) -> np.ndarray:
+        return self.count(name, 0, self.prefix[name].shape[0] - 1, cols)
+
+    def complete(self, name: str, t: int, n: int, cols=slice(None)) -> np.ndarray:
+        # Columns flagged in all n date rows ending at row t (False when fewer than n rows precede)
+        if t + 1 < n:
+            return np.zeros(self.prefix[name][0, cols].shape, dtype=bool)
+        return self.count(name, t + 1 - n, t + 1, cols) == n
+
+
+def load(root=wide_panel.WIDE_DIR) -> FeasibilityIndex:
+    return FeasibilityIndex(root)
@@ -0,0 +1,143 @@
+import numpy as np
+import telemetry
+
+# Long-only minimum-variance portfolio with a floor on expected excess return
+TARGET = 0.005 # ≥0.5% monthly expected excess return
+SOLVER = "ECOS"
+
+
+def solve(mu_vec, Sigma, target=TARGET, solver=SOLVER):
+    # Returns (weights or None, solver status)
+    import cvxpy as cp  # deferred: ~1 s to import, and only the solve needs it
+    n = len(mu_vec)
+    w = cp.Variable(n)
+    prob = cp.Problem(cp.Minimize(cp.quad_form(w, Sigma)), [cp.sum(w) == 1, w >= 0, mu_vec @ w >= target])
+    with telemetry.hot("cvxpy_solve", rows=n):
+        prob.solve(solver=solver, warm_start=True)
+    return (None if w.value is None else w.value.round(10)), prob.status
+
+
+def optimise(mu_vec, Sigma, target=TARGET, solver=SOLVER):
+    return solve(mu_vec, Sigma, target, solver)[0]
+
+
+# Batched solver (SOLVER = "BATCH" in 05): ADMM on the split x = z over a padded stack of problems.
+# The models of one month share Σ, so they share one factorisation; months are stacked (dates, n, n)
+#   x-step  min x'Σx + ρ/2 |x - z + u|²  s.t. 1'x = 1, μ'x ≥ target   closed form, two multipliers
+#   z-step  projection of x + u onto the simplex {z ≥ 0, 1'z = 1}      sort-based, vectorised
+# The support of z is then polished: the QP restricted to it, with the budget (and the return
+# target when it binds) as equalities, is solved exactly and kept when every KKT condition holds.
+# Anything else goes to ECOS, so each weight vector is either KKT-verified or the cvxpy answer
+BATCH_ITER = 3000
+BATCH_TOL = 1e-7         # on max |x - z| and max |z - z_prev|, in weight units
+BATCH_CELLS = 8_000_000  # 05 solves a block once its Σ cells reach this (~64 MB of float64)
+batch_stats = {"polished": 0, "fallback": 0, "infeasible": 0}
+
+
+def project_simplex(v: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # Euclidean projection of each row of v onto {z ≥ 0, Σz = 1}, over the entries where mask is set
+    vs = -np.sort(-np.where(mask, v, -np.inf), axis=-1)
+    css = np.cumsum(np.where(np.isfinite(vs), vs, 0.0), axis=-1)
+    k = np.arange(1, v.shape[-1] + 1)
+    r = (vs - (css - 1) / k > 0).sum(axis=-1, keepdims=True).clip(min=1)
+    theta = (np.take_along_axis(css, r - 1, axis=-1) - 1) / r
+    return np.where(mask, np.maximum(v - theta, 0.0), 0.0)
+
+
+def _polish(Sigma, mu, z, target, return_first):
+    # Exact solution on supp(z) with the return target active or not; None unless it is KKT-optimal
+    S = np.flatnonzero(z > 0)
+    k = len(S)
+    for with_ret in (return_first, not return_first):
+        m = 2 if with_ret else 1
+        A = np.zeros((k + m, k + m))
+        A[:k, :k] = 2 * Sigma[np.ix_(S, S)]
+        A[:k, k] = A[k, :k] = -1.0
+        rhs = np.zeros(k + m)
+        rhs[k] = -1.0
+        if with_ret:
+            A[:k, k + 1] = A[k + 1, :k] = -mu[S]
+            rhs[k + 1] = -target
+        try:
+            sol = np.linalg.solve(A, rhs)
+        except np.linalg.LinAlgError:
+            continue
+        nu, lam = sol[k], (sol[k + 1] if with_ret else 0.0)
+        w = np.zeros(len(z))
+        w[S] = sol[:k]
+        g = 2 * Sigma @ w - nu - lam * mu  # reduced costs, ≥ 0 off the support
+        tol = 1e-6 * max(abs(nu), 1e-12)
+        if (sol[:k].min() >= -1e-10 and lam >= -tol and mu @ w >= target - 1e-10
+                and (g[z <= 0].min(initial=0.0) >= -tol)):
+            return w.clip(min=0).round(10)
+    return None
+
+
+def solve_batch(problems, target=TARGET, fallback=SOLVER):
+    # problems: [(Sigma, {key: mu_vec})], one Σ per month and a μ per model; returns
+    # [{key: (weights or None, status)}] in the same order
+    keys = list(dict.fromkeys(key for _, mus in problems for key in mus))
+    D, M, n = len(problems), len(keys), max(len(S) for S, _ in problems)
+    Sig, mu = np.zeros((D, n, n)), np.zeros((D, M, n))
+    mask, act = np.zeros((D, n), dtype=bool), np.zeros((D, M), dtype=bool)
+    for d, (S, mus) in enumerate(problems):
+        Sig[d, :len(S), :len(S)] = S
+        mask[d, :len(S)] = True
+        for j, key in enumerate(keys):
+            if key in mus:
+                mu[d, j, :len(S)], act[d, j] = mus[key], True
+
+    # Padding rows get a unit-scale variance and no budget or return weight, so they stay at 0
+    scale = np.einsum("dii->d", Sig) / mask.sum(axis=1)
+    diag = np.arange(n)
+    Sig[:, diag, diag] += np.where(mask, 0.0, scale[:, None])
+    rho = 2 * scale
+    feas = act & (np.where(mask[:, None, :], mu, -np.inf).max(axis=-1) >= target)
+
+    with telemetry.hot("admm_batch", rows=int(act.sum())):
+        K = np.linalg.inv(2 * Sig + rho[:, None, None] * np.eye(n))
+        m = mask.astype(np.float64)
+        k1 = np.einsum("dn,dnk->dk", m, K)
+        kmu = mu @ K
+        s11 = (m * k1).sum(axis=-1)[:, None]
+        s1m = (mu * k1[:, None, :]).sum(axis=-1)
+        smm = (mu * kmu).sum(axis=-1)
+        det = s11 * smm - s1m ** 2
+        det_ok = det > 1e-12 * s11 * smm
+
+        z = np.broadcast_to(m[:, None, :] / m.sum(axis=1)[:, None, None], (D, M, n)).copy()
+        u = np.zeros_like(z)
+        for it in range(BATCH_ITER):
+            a = (rho[:, None, None] * (z - u)) @ K
+            c1 = 1 - (a * m[:, None, :]).sum(axis=-1)
+            c2 = target - (a * mu).sum(axis=-1)
+            lam = np.where(det_ok, (s11 * c2 - s1m * c1) / np.where(det_ok, det, 1.0), 0.0).clip(min=0)
+            nu = (c1 - lam * s1m) / s11
+            x = a + nu[..., None] * k1[:, None, :] + lam[..., None] * kmu
+            z_prev, z = z, project_simplex(x + u, mask[:, None, :])
+            u += x - z
+            if it % 10 == 9:
+                res = np.maximum(np.abs(x - z).max(axis=-1), np.abs(z - z_prev).max(axis=-1))
+                if (res[feas] < BATCH_TOL).all():
+                    break
+
+    out = []
+    for d, (S, mus) in enumerate(problems):
+        k, res = len(S), {}
+        for j, key in enumerate(keys):
+            if key not in mus:
+                continue
+            if not feas[d, j]:
+                batch_stats["infeasible"] += 1
+                res[key] = (None, "infeasible")
+                continue
+            zj = z[d, j, :k]
+            w = _polish(S, mus[key], zj, target, return_first=mus[key] @ zj <= target + 1e-6)
+            if w is not None:
+                batch_stats["polished"] += 1
+                res[key] = (w, "optimal")
+            else:
+                batch_stats["fallback"] += 1
+                res[key] = solve(mus[key], S, target, fallback)
+        out.append(res)
+    return out
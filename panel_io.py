@@ -0,0 +1,169 @@
+import os, shutil
+from pathlib import Path
+import numpy as np, pandas as pd
+import pyarrow as pa, pyarrow.dataset as ds, pyarrow.parquet as pq
+import artifacts
+
+# Compact on-disk schema shared by crsp_clean / comp_clean / french_factors / crsp_factors
+STYLES = ["Growth", "Neutral", "Value"]
+STYLE_DTYPE = pd.CategoricalDtype(STYLES)
+# STYLE_FREQ=monthly: 01 also relabels every month (style_monthly) and 02 makes that the panel's
+# "style", keeping the fiscal-year labels as style_annual, so 03–18 use it unchanged
+STYLE_FREQ = os.environ.get("STYLE_FREQ", "annual")
+if STYLE_FREQ not in ("annual", "monthly"):
+    raise ValueError(f"STYLE_FREQ must be annual or monthly, not {STYLE_FREQ!r}")
+FACTOR_COLS = ["MKT_RF", "SMB", "HML", "RMW", "CMA", "RF"]
+
+SCHEMA = {
+    "permno": "int32",
+    "fyear": "int16",
+    "year": "int16",
+    "shrcd": "int8",
+    "exchcd": "int8",
+    "ret": "float32",
+    "dlret": "float32",
+    "prc": "float32",
+    "shrout": "float32",
+    "mktcap": "float32",
+    "retx": "float32",
+    "rexcess": "float32",
+    "be": "float32",
+    "style": STYLE_DTYPE,
+    "style_monthly": STYLE_DTYPE,
+    "style_annual": STYLE_DTYPE,
+    **{c: "float32" for c in FACTOR_COLS},
+}
+DATE_COLS = ["date", "start"]
+
+
+def month_end(s: pd.Series) -> pd.Series:
+    # CRSP dates are the last trading day; everything downstream keys on calendar month-ends
+    return (pd.to_datetime(s) + pd.offsets.MonthEnd(0)).dt.normalize()
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    # Cast known columns to the compact schema; integer columns with gaps use nullable ints
+    casts = {}
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if isinstance(dtype, str) and dtype.startswith("int") and df[col].isna().any():
+            dtype = dtype.capitalize()
+        casts[col] = dtype
+    df = df.astype(casts)
+    for col in DATE_COLS:
+        if col in df.columns and not df[col].isna().all():
+            df[col] = month_end(df[col])
+    return df
+
+
+def monthly_styles(panel: pd.DataFrame, comp: pd.DataFrame, lag: int = 6, max_age: int = 18) -> pd.Categorical:
+    # Book-to-market label for every panel row: the latest book equity public by the month-end
+    # (fiscal year-end at least `lag` and at most ~`max_age` months back) over that month's market
+    # cap, against the same month's NYSE 30/70 breakpoints. One as-of join and one grouped quantile
+    # over the whole panel; NaN where there is no book equity or no breakpoint
+    p = panel[["permno", "date", "mktcap", "exchcd"]].assign(_row=np.arange(len(panel)))
+    be = comp.loc[comp["be"] > 0, ["permno", "datadate", "be"]]
+    be = be.assign(permno=be["permno"].astype(p["permno"].dtype),
+                   avail=(month_end(be["datadate"]) + pd.offsets.MonthEnd(lag)).astype(p["date"].dtype))
+    be = be.sort_values("avail").drop_duplicates(["permno", "avail"], keep="last")
+    p = pd.merge_asof(p.sort_values("date", kind="stable"), be[["permno", "avail", "be"]],
+                      left_on="date", right_on="avail", by="permno", direction="backward",
+                      tolerance=pd.Timedelta(days=31 * (max_age - lag)))
+    p["bm"] = (p["be"] / p["mktcap"]).where(p["mktcap"] > 0)
+
+    bp = p.loc[p["exchcd"] == 1].groupby("date")["bm"].quantile([0.3, 0.7]).unstack()
+    bp.columns = ["p30", "p70"]
+    p = p.join(bp, on="date")
+    label = np.select([p["bm"] <= p["p30"], p["bm"] >= p["p70"]], ["Growth", "Value"], "Neutral").astype(object)
+    label[(p["bm"].isna() | p["p30"].isna()).to_numpy()] = None
+
+    out = np.full(len(panel), None, dtype=object)
+    out[p["_row"].to_numpy()] = label
+    return pd.Categorical(out, dtype=STYLE_DTYPE)
+
+
+def to_parquet(df: pd.DataFrame, path, **kw) -> None:
+    artifacts.to_parquet(compact(df), path, **kw)
+
+
+def float64(df: pd.DataFrame, cols) -> pd.DataFrame:
+    # Upcast compute columns; storage stays float32
+    return df.astype({c: np.float64 for c in cols if c in df.columns})
+
+
+# Year-partitioned panel (outputs/crsp_factors/year=YYYY/part-0.parquet), PERMNO-sorted row groups
+PANEL_DIR = Path("outputs/crsp_factors")
+FACTORS_FILE = Path("outputs/factors_monthly.parquet")
+ROW_GROUP_ROWS = 16_384
+
+
+def write_panel(df: pd.DataFrame, root=PANEL_DIR) -> None:
+    root = Path(root)
+    if root.exists():
+        shutil.rmtree(root)
+    df = compact(df)
+    df["year"] = df["date"].dt.year.astype("int16")
+    for yr, part in df.groupby("year", sort=True):
+        part_dir = root / f"year={yr}"
+        part_dir.mkdir(parents=True)
+        tbl = pa.Table.from_pandas(part.drop(columns="year").sort_values(["permno", "date"]), preserve_index=False)
+        pq.write_table(tbl, part_dir / "part-0.parquet", row_group_size=ROW_GROUP_ROWS, write_statistics=True)
+
+
+def read_panel(columns=None, start=None, end=None, permnos=None, styles=None, root=PANEL_DIR) -> pd.DataFrame:
+    # Column selection and date / PERMNO / style filters are pushed down to pyarrow, which skips
+    # whole year partitions and row groups whose min/max statistics miss the filter
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    filt = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        filt += [ds.field("year") >= start.year, ds.field("date") >= start]
+    if end is not None:
+        end = pd.Timestamp(end)
+        filt += [ds.field("year") <= end.year, ds.field("date") <= end]
+    if permnos is not None:
+        permnos = sorted(int(p) for p in permnos)
+        filt += [ds.field("permno").isin(permnos)]
+        if permnos:
+            filt += [ds.field("permno") >= permnos[0], ds.field("permno") <= permnos[-1]]
+    if styles is not None:
+        filt += [ds.field("style").isin(list(styles))]
+
+    expr = None
+    for f in filt:
+        expr = f if expr is None else expr & f
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+    return compact(df)
+
+
+# Daily CRSP returns (crsp_daily/year=YYYY/part-0.parquet), pulled by 01 with DAILY=1 and streamed a
+# year at a time by stage 17. Dates are trading days, so they are not snapped to month-ends
+DAILY_DIR = Path("crsp_daily")
+DAILY_FACTORS_FILE = Path("french_factors_daily.parquet")
+
+
+def write_daily_year(df: pd.DataFrame, year: int, root=DAILY_DIR) -> None:
+    part = Path(root) / f"year={year}"
+    part.mkdir(parents=True, exist_ok=True)
+    df = df[["permno", "date", "ret"]].astype({"permno": "int32", "ret": "float32"}).sort_values(["permno", "date"])
+    tmp = part / "part-0.parquet.tmp"  # write-then-rename, as for the monthly pull
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, row_group_size=ROW_GROUP_ROWS)
+    tmp.replace(part / "part-0.parquet")
+
+
+def daily_years(root=DAILY_DIR) -> list[int]:
+    return sorted(int(p.parent.name.split("=")[1]) for p in Path(root).glob("year=*/part-0.parquet"))
+
+
+def read_daily_year(year: int, permnos=None, root=DAILY_DIR) -> pd.DataFrame:
+    filt = [("permno", "in", sorted(int(p) for p in permnos))] if permnos is not None else None
+    return pq.read_table(Path(root) / f"year={year}" / "part-0.parquet", filters=filt).to_pandas()
+
+
+def write_factors(factors: pd.DataFrame, path=FACTORS_FILE) -> None:
+    to_parquet(factors[["date", *[c for c in FACTOR_COLS if c in factors.columns]]], path, index=False)
+
+
+def read_factors(columns=None, path=FACTORS_FILE) -> pd.DataFrame:
+    return artifacts.read_parquet(path, columns=columns)
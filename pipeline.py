@@ -0,0 +1,100 @@
+import argparse, os, runpy, sys, time, traceback
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent
+
+# One entry point for the numbered stage scripts. Stages run in this process, one after the other:
+# pandas / numpy / scipy are imported once, each script's heavier imports (statsmodels, cvxpy,
+# matplotlib, arch, wrds) only when that stage runs, and Parquet a stage writes is handed to the
+# next ones in memory (artifacts.py) instead of being read back from disk
+
+
+def stages() -> dict[str, Path]:
+    # "03" → 03_betas_mu-5.py; every numbered script in the repo is a stage
+    return {fp.name[:2]: fp for fp in sorted(REPO.glob("[0-9][0-9]_*.py"))}
+
+
+def alias(fp: Path) -> str:
+    return fp.stem[3:].rsplit("-", 1)[0]  # 03_betas_mu-5 → betas_mu
+
+
+def resolve(names: list[str], table: dict[str, Path]) -> list[str]:
+    # Stage numbers, aliases, inclusive ranges ("02-06") or "all"
+    by_alias = {alias(fp): k for k, fp in table.items()}
+    out = []
+    for n in names:
+        if n == "all":
+            out += list(table)
+        elif n in table or n in by_alias:
+            out.append(by_alias.get(n, n))
+        elif "-" in n and all(p.isdigit() for p in n.split("-")):
+            lo, hi = (f"{int(p):02d}" for p in n.split("-"))
+            out += [k for k in table if lo <= k <= hi]
+        else:
+            raise SystemExit(f"Unknown stage {n!r}; see `python pipeline.py --list`")
+    return list(dict.fromkeys(out))
+
+
+def run_stage(fp: Path) -> int:
+    # Runs the script as __main__ and returns its exit code; a stage that swaps sys.stdout (08's tee)
+    # gets it restored, so the next stage prints to the console only
+    stdout, argv, error = sys.stdout, sys.argv, None
+    sys.argv = [str(fp)]
+    try:
+        runpy.run_path(str(fp), run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+            error = e.code
+        return e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}"
+        return 1
+    finally:
+        # The stage record is written here rather than at interpreter exit, so a failure is logged
+        # against the stage that raised it
+        telemetry.end_stage(error)
+        if sys.stdout is not stdout:
+            sys.stdout.flush()
+            sys.stdout = stdout
+        sys.argv = argv
+
+
+if __name__ == "__main__":
+    table = stages()
+    ap = argparse.ArgumentParser(description="Run pipeline stages in one process, handing outputs over in memory")
+    ap.add_argument("stages", nargs="*", help="stage numbers, aliases, ranges such as 02-06, or all")
+    ap.add_argument("--list", action="store_true", help="list the stages and exit")
+    ap.add_argument("-C", "--dir", type=Path, help="working directory holding the inputs and outputs/")
+    ap.add_argument("--keep-going", action="store_true", help="run the remaining stages after a failure")
+    ap.add_argument("--no-handoff", action="store_true", help="read every input from disk")
+    a = ap.parse_args()
+
+    if a.list or not a.stages:
+        for k, fp in table.items():
+            print(f"  {k}  {alias(fp):<22} {fp.name}")
+        sys.exit(0)
+
+    todo = resolve(a.stages, table)
+    if a.dir:
+        os.chdir(a.dir)
+    sys.path.insert(0, str(REPO))
+    import artifacts, telemetry
+    artifacts.keep(not a.no_handoff)
+
+    timings, rc = [], 0
+    for k in todo:
+        print(f"\n>>> {table[k].name}", flush=True)
+        t0 = time.perf_counter()
+        rc = run_stage(table[k])
+        timings.append((table[k].name, time.perf_counter() - t0, rc))
+        if rc and not a.keep_going:
+            break
+
+    print("\n=====  Pipeline  =====")
+    for name, wall, code in timings:
+        print(f"  {name:<28} {wall:8.2f} s  {'ok' if code == 0 else f'FAILED ({code})'}")
+    print(f"  in-memory reads: {artifacts.hits}, from disk: {artifacts.misses}")
+    sys.exit(int(any(c for *_, c in timings)))
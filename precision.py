@@ -0,0 +1,87 @@
+import os, sys
+from pathlib import Path
+import numpy as np, pandas as pd
+
+# Compute precision for the hot paths of 03–06. PRECISION=float32 keeps the wide returns and factors
+# fed to the beta fits, the centred return blocks and Gram matrices behind Σ, the Σ handed to the
+# optimiser, the weights and the P&L sums in float32: half the memory and bandwidth of float64. Small
+# per-stock accumulators (the RLS / Gram-grid state in beta_estimators) stay float64, where the
+# cumulative sums would otherwise lose digits. float64 is the default and the reference
+PRECISION = os.environ.get("PRECISION", "float64")
+if PRECISION not in ("float32", "float64"):
+    raise ValueError(f"PRECISION must be float32 or float64, not {PRECISION!r}")
+DTYPE = np.dtype(PRECISION)
+
+# Accuracy guard: with PRECISION_REF pointing at the outputs/ of a float64 run on the same inputs,
+# 06 compares the weights, P&L and risk metrics against it and flags deviations above these
+# (absolute for weights and monthly excess returns, relative for risk metrics)
+REF_DIR = os.environ.get("PRECISION_REF")
+TOL = {"weights": 1e-3, "pnl": 1e-4, "metrics": 1e-2}
+REL_FLOOR = 1e-6  # relative deviations are taken against max(|reference|, this)
+
+
+def floats(df: pd.DataFrame) -> pd.DataFrame:
+    # Float columns in the compute dtype, for the frames the hot-path stages write
+    return df.astype({c: DTYPE for c in df.columns if pd.api.types.is_float_dtype(df[c])})
+
+
+def _row(check: str, item: str, n: int, dev: float) -> dict:
+    return {"check": check, "item": item, "n": n, "max_dev": dev, "tol": TOL[check]}
+
+
+def compare(ref: Path, out: Path = Path("outputs")) -> pd.DataFrame:
+    # One row per compared series: its largest deviation from the reference, the tolerance and
+    # whether it breaches it
+    ref, out, rows = Path(ref), Path(out), []
+
+    # Weights per strategy; a (date, PERMNO) held in only one run counts with weight 0 in the other
+    for fp in sorted((out / "weights").glob("weights_*.parquet")):
+        rfp = ref / "weights" / fp.name
+        if not rfp.exists():
+            continue
+        a = pd.read_parquet(rfp).set_index(["date", "permno"])["weight"].astype(np.float64)
+        b = pd.read_parquet(fp).set_index(["date", "permno"])["weight"].astype(np.float64)
+        a, b = a.align(b, join="outer", fill_value=0.0)
+        rows.append(_row("weights", fp.stem[len("weights_"):], len(a), float((a - b).abs().max())))
+
+    # Monthly P&L per strategy, on the months both runs have
+    if (out / "pnl_series.parquet").exists() and (ref / "pnl_series.parquet").exists():
+        a = pd.read_parquet(ref / "pnl_series.parquet").astype(np.float64)
+        b = pd.read_parquet(out / "pnl_series.parquet").astype(np.float64)
+        for col in b.columns.intersection(a.columns):
+            d = (a[col] - b[col]).dropna()
+            rows.append(_row("pnl", col, len(d), float(d.abs().max()) if len(d) else np.nan))
+
+    # Risk metrics per statistic, over every (window, strategy)
+    if (out / "risk_metrics.parquet").exists() and (ref / "risk_metrics.parquet").exists():
+        key = ["window", "strategy"]
+        a = pd.read_parquet(ref / "risk_metrics.parquet").set_index(key)
+        b = pd.read_parquet(out / "risk_metrics.parquet").set_index(key)
+        a, b = a.align(b, join="inner")
+        for col in a.select_dtypes("number").columns.drop("n_months", errors="ignore"):
+            ra, rb = a[col].astype(np.float64), b[col].astype(np.float64)
+            rel = ((ra - rb).abs() / ra.abs().clip(lower=REL_FLOOR)).dropna()
+            rows.append(_row("metrics", col, len(rel), float(rel.max()) if len(rel) else np.nan))
+
+    res = pd.DataFrame(rows, columns=["check", "item", "n", "max_dev", "tol"])
+    res["breach"] = res["max_dev"] > res["tol"]
+    return res
+
+
+def report(res: pd.DataFrame) -> None:
+    print("\n=====  Precision check vs float64 reference  =====")
+    print(res.groupby("check", sort=False).agg(series=("item", "size"), max_dev=("max_dev", "max"),
+                                               tol=("tol", "first"), breaches=("breach", "sum")).to_string())
+    bad = res[res["breach"]]
+    if len(bad):
+        print(f"\nWARNING: {len(bad)} series outside tolerance")
+        print(bad.to_string(index=False))
+
+
+if __name__ == "__main__":
+    # python precision.py REF_OUTPUTS [OUTPUTS]; exits 1 on any breach
+    if len(sys.argv) < 2:
+        raise SystemExit("usage: python precision.py REF_OUTPUTS [OUTPUTS]")
+    res = compare(Path(sys.argv[1]), Path(sys.argv[2]) if len(sys.argv) > 2 else Path("outputs"))
+    report(res)
+    sys.exit(int(res["breach"].any()))
@@ -0,0 +1,89 @@
+import os, sqlite3
+from pathlib import Path
+import pandas as pd
+
+# "wrds" (default), "sqlite:<dir>" or "duckdb:<dir>"; <dir> holds one database file per WRDS library
+BACKEND = os.environ.get("WRDS_BACKEND", "wrds")
+WRDS_USER = os.environ.get("WRDS_USER", "maryamahli")
+LIBRARIES = ["crsp", "comp"]
+
+
+class SQLiteConnection:
+    # Stand-in for wrds.Connection: <dir>/crsp.sqlite and <dir>/comp.sqlite are attached as
+    # schemas so the production SQL (crsp.msf, comp.funda, ...) runs unchanged
+    def __init__(self, db_dir):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        for lib in LIBRARIES:
+            fp = Path(db_dir) / f"{lib}.sqlite"
+            if fp.exists():
+                self.conn.execute(f"ATTACH DATABASE '{fp}' AS {lib}")
+
+    def raw_sql(self, sql, date_cols=None):
+        return pd.read_sql_query(sql, self.conn, parse_dates=date_cols)
+
+    def close(self):
+        self.conn.close()
+
+
+class DuckDBConnection:
+    def __init__(self, db_dir):
+        import duckdb  # optional dependency
+        self.conn = duckdb.connect()
+        for lib in LIBRARIES:
+            fp = Path(db_dir) / f"{lib}.duckdb"
+            if fp.exists():
+                self.conn.execute(f"ATTACH '{fp}' AS {lib} (READ_ONLY)")
+
+    def raw_sql(self, sql, date_cols=None):
+        df = self.conn.execute(sql).df()
+        for c in date_cols or []:
+            df[c] = pd.to_datetime(df[c])
+        return df
+
+    def close(self):
+        self.conn.close()
+
+
+def connect(backend: str = None):
+    backend = backend or BACKEND
+    if backend == "wrds":
+        import wrds
+        return wrds.Connection(wrds_username=WRDS_USER)
+    kind, _, path = backend.partition(":")
+    if kind == "sqlite":
+        return SQLiteConnection(path)
+    if kind == "duckdb":
+        return DuckDBConnection(path)
+    raise ValueError(f"Unknown WRDS_BACKEND {backend!r}")
+
+
+# Local database in the WRDS schema, built from frames shaped like the raw tables
+def write_local_db(db_dir, tables: dict[str, pd.DataFrame], kind: str = "sqlite") -> None:
+    db_dir = Path(db_dir)
+    db_dir.mkdir(parents=True, exist_ok=True)
+    for lib in LIBRARIES:
+        libs = {k.split(".", 1)[1]: v for k, v in tables.items() if k.startswith(lib + ".")}
+        if not libs:
+            continue
+        fp = db_dir / f"{lib}.{kind}"
+        fp.unlink(missing_ok=True)
+        if kind == "sqlite":
+            con = sqlite3.connect(fp)
+            for name, df in libs.items():
+                out = df.copy()
+                for c in out.select_dtypes("datetime").columns:  # ISO text so BETWEEN '...' works
+                    out[c] = out[c].dt.strftime("%Y-%m-%d")
+                out.to_sql(name, con, index=False)
+            for name in ("msf", "dsf"):
+                if name in libs:
+                    con.execute(f"CREATE INDEX {name}_date ON {name}(date)")
+            con.commit()
+            con.close()
+        else:
+            import duckdb
+            con = duckdb.connect(str(fp))
+            for name, df in libs.items():
+                con.register("_df", df)
+                con.execute(f"CREATE TABLE {name} AS SELECT * FROM _df")
+                con.unregister("_df")
+            con.close()
@@ -0,0 +1,86 @@
+import hashlib, json, os, sys, time
+from pathlib import Path
+import pandas as pd
+import query_backend
+
+# Shared on-disk cache for WRDS queries and downloaded files, stored as typed Parquet
+CACHE_DIR = Path(os.environ.get("QUERY_CACHE_DIR", "cache/queries"))
+TTL_HOURS = float(os.environ.get("QUERY_CACHE_TTL_HOURS", "inf"))  # entries older than this are re-fetched
+REFRESH = os.environ.get("QUERY_CACHE_REFRESH", "").lower() in ("1", "true", "yes")  # ignore every entry
+
+
+def normalise_sql(sql: str) -> str:
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+def cache_key(kind: str, text: str, params: dict = None) -> str:
+    blob = json.dumps({"kind": kind, "text": text, "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:24]
+
+
+def cached(key: str, loader, ttl_hours: float = None, refresh: bool = None, meta: dict = None) -> pd.DataFrame:
+    ttl_hours = TTL_HOURS if ttl_hours is None else ttl_hours
+    refresh = REFRESH if refresh is None else refresh
+    fp = CACHE_DIR / f"{key}.parquet"
+
+    if fp.exists() and not refresh:
+        age_h = (time.time() - fp.stat().st_mtime) / 3600
+        if age_h <= ttl_hours:
+            return pd.read_parquet(fp)
+
+    df = loader()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = fp.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, fp)
+    (CACHE_DIR / f"{key}.json").write_text(json.dumps({
+        **(meta or {}), "rows": len(df), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }, default=str, indent=1))
+    return df
+
+
+def cached_url(url: str, loader, ttl_hours: float = None, refresh: bool = None, **params) -> pd.DataFrame:
+    # loader(url, **params) -> DataFrame; the parsed frame is cached, not the raw download
+    key = cache_key("url", url, params)
+    return cached(key, lambda: loader(url, **params), ttl_hours, refresh, meta={"kind": "url", "url": url, "params": params})
+
+
+class CachedConnection:
+    # Drop-in for wrds.Connection: raw_sql() is served from the cache and only opens a
+    # backend connection on the first miss, so fully cached reruns never log in
+    def __init__(self, backend: str = None):
+        self.backend = backend or query_backend.BACKEND
+        self._conn = None
+
+    def raw_sql(self, sql, date_cols=None, params=None, ttl_hours=None, refresh=None) -> pd.DataFrame:
+        text = normalise_sql(sql)
+        key = cache_key("sql", text, {"date_cols": date_cols, "params": params, "backend": self.backend})
+        meta = {"kind": "sql", "sql": text, "params": params, "backend": self.backend}
+        return cached(key, lambda: self._query(sql, date_cols, params), ttl_hours, refresh, meta)
+
+    def _query(self, sql, date_cols, params):
+        if self._conn is None:
+            print(f"Connecting to {self.backend}")
+            self._conn = query_backend.connect(self.backend)
+        kw = {"params": params} if params is not None else {}
+        return self._conn.raw_sql(sql, date_cols=date_cols, **kw)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# List entries, or clear them with --clear
+if __name__ == "__main__":
+    entries = sorted(CACHE_DIR.glob("*.json"))
+    if "--clear" in sys.argv[1:]:
+        for fp in entries:
+            fp.unlink()
+            fp.with_suffix(".parquet").unlink(missing_ok=True)
+        print(f"Removed {len(entries)} cache entries from {CACHE_DIR}")
+    else:
+        for fp in entries:
+            m = json.loads(fp.read_text())
+            what = m.get("sql") or m.get("url") or ""
+            print(f"{fp.stem}  {m['created']}  {m['rows']:>10,} rows  {what[:80]}")
@@ -0,0 +1,159 @@
+import argparse, time
+from pathlib import Path
+import numpy as np, pandas as pd
+import cov_estimators
+import optimiser
+import panel_io
+import telemetry
+
+# One month's Value / Growth weights from the cached panel, without rerunning 02–05: only the
+# last beta window (stage 03), λ̄ (stage 03), the last Σ window (stage 04) and the three
+# optimisations (stage 05) are computed, for every stock in one batch
+OUT = Path("outputs")
+BETA_WINDOW = 36
+COV_WINDOW = 60
+LAMBDA_ROLL = 180
+LOOKBACK = 120  # months read back from the panel; stocks with fewer clean months in it get no beta
+STYLES = ["Value", "Growth"]
+MODELS = {"CAPM": ["MKT_RF"], "FF3": ["MKT_RF", "SMB", "HML"], "FF5": ["MKT_RF", "SMB", "HML", "RMW", "CMA"]}
+FACTORS = MODELS["FF5"]
+PANEL_COLS = ["permno", "date", "rexcess", "style", *FACTORS]
+
+
+def load_tail(date=None, new_month: pd.DataFrame = None) -> pd.DataFrame:
+    # Last LOOKBACK months of the partitioned panel, plus an optional month not yet in it
+    if date is not None:
+        end = pd.Timestamp(date) + pd.offsets.MonthEnd(0)
+    else:
+        end = pd.read_parquet(panel_io.FACTORS_FILE, columns=["date"])["date"].max()
+        if new_month is not None:
+            end = max(end, panel_io.month_end(new_month["date"]).max())
+    panel = panel_io.read_panel(PANEL_COLS, start=end - pd.offsets.MonthEnd(LOOKBACK - 1), end=end)
+    if new_month is not None:
+        new_month = panel_io.compact(new_month[PANEL_COLS])
+        panel = pd.concat([panel[~panel["date"].isin(new_month["date"])], new_month], ignore_index=True)
+        panel["style"] = panel["style"].astype(panel_io.STYLE_DTYPE)
+    return panel
+
+
+def last_window_betas(panel: pd.DataFrame, date) -> pd.DataFrame:
+    # Stage-03 betas at `date`: OLS over each stock's last BETA_WINDOW clean months, as one batched
+    # solve per model on masked Gram matrices (CAPM / FF3 are sub-blocks of FF5)
+    clean = panel.dropna(subset=["rexcess", *FACTORS])
+    clean = clean[clean["date"] <= date]
+    y = clean.pivot(index="date", columns="permno", values="rexcess").astype(np.float64)
+    live = y.columns[y.iloc[-1].notna()] if len(y) and y.index[-1] == date else y.columns[:0]
+    y = y[live]
+    fac = clean.drop_duplicates("date").set_index("date").loc[y.index, FACTORS].to_numpy(np.float64)
+
+    ok = y.notna().to_numpy()
+    rank = ok[::-1].cumsum(axis=0)[::-1]  # clean months from t to the end
+    mask = ok & (rank <= BETA_WINDOW)
+    full = mask.sum(axis=0) == BETA_WINDOW
+    mask, Y = mask[:, full], np.nan_to_num(y.to_numpy()[:, full])
+
+    Z = np.column_stack([np.ones(len(fac)), fac])
+    G = np.einsum("tn,ti,tj->nij", mask.astype(np.float64), Z, Z)
+    b = np.einsum("tn,ti,tn->ni", mask.astype(np.float64), Z, Y)
+
+    out = pd.DataFrame({"permno": y.columns[full].astype(np.int64), "date": date})
+    for mdl, cols in MODELS.items():
+        ix = [0] + [1 + FACTORS.index(c) for c in cols]
+        theta = np.linalg.solve(G[:, ix][:, :, ix], b[:, ix][..., None])[..., 0]
+        for i, c in enumerate(cols, 1):
+            out[f"beta_{mdl}_{c}"] = theta[:, i]
+    return out
+
+
+def lambda_bar(date) -> pd.Series:
+    # Stage-03 factor premia: LAMBDA_ROLL-month means of the French factors up to `date` (the
+    # latest available window when the French file does not reach `date` yet)
+    ff = pd.read_parquet("french_factors.parquet").sort_values("date").set_index("date")
+    tail = ff.loc[:date, ["MKT_RF", "SMB", "HML", "RMW", "CMA", "RF"]].apply(pd.to_numeric, errors="coerce").iloc[-LAMBDA_ROLL:]
+    return tail.mean().where(tail.count() == LAMBDA_ROLL)
+
+
+def mu_vectors(betas: pd.DataFrame, lam: pd.Series) -> pd.DataFrame:
+    mu = betas[["permno"]].copy()
+    for mdl, cols in MODELS.items():
+        mu[mdl] = sum(betas[f"beta_{mdl}_{c}"] * lam[c] for c in cols) + lam["RF"]
+    return mu.set_index("permno")
+
+
+def last_window_cov(panel: pd.DataFrame, style: str, date, estimator: str = "lw"):
+    # Stage-04 Σ at `date`: the last COV_WINDOW months holding the style, stocks in the style with
+    # a return in every one of them
+    sty = panel[panel["date"] <= date]
+    in_style = sty.pivot(index="date", columns="permno", values="style").eq(style)
+    rets = sty.pivot(index="date", columns="permno", values="rexcess").reindex(columns=in_style.columns)
+    rows = in_style.index[in_style.any(axis=1)]
+    if len(rows) < COV_WINDOW or rows[-1] != date:
+        return [], None
+    rows = rows[-COV_WINDOW:]
+    block = rets.loc[rows].to_numpy(np.float64)
+    keep = in_style.loc[rows].to_numpy().all(axis=0) & ~np.isnan(block).any(axis=0)
+    if keep.sum() < 2:
+        return [], None
+    m = cov_estimators.WindowMoments(block[:, keep])
+    Sigma = cov_estimators.ESTIMATORS[estimator](m).astype(np.float32).astype(float)  # as stored by 04
+    return rets.columns[keep].astype(np.int64).tolist(), Sigma
+
+
+def rebalance(date=None, new_month: pd.DataFrame = None, target=optimiser.TARGET,
+              solver=optimiser.SOLVER, cov_estimator: str = "lw"):
+    # Returns (weights: style / model / permno / weight, diagnostics: one row per style × model)
+    t0 = time.perf_counter()
+    panel = load_tail(date, new_month)
+    date = panel["date"].max()
+
+    betas = last_window_betas(panel, date)
+    mu = mu_vectors(betas, lambda_bar(date))
+
+    weights, diag = [], []
+    for style in STYLES:
+        permnos, Sigma = last_window_cov(panel, style, date, cov_estimator)
+        mu_s = mu.reindex(permnos)
+        for mdl in MODELS:
+            row = {"date": date, "style": style, "model": mdl, "n_assets": len(permnos), "status": "no_sigma"}
+            if Sigma is not None:
+                mu_vec = mu_s[mdl].to_numpy()
+                row["status"] = "missing_mu"
+                if not np.isnan(mu_vec).any():
+                    ts = time.perf_counter()
+                    try:
+                        w, row["status"] = optimiser.solve(mu_vec, Sigma, target, solver)
+                    except Exception as e:  # keep the other style / model solves going
+                        w, row["status"] = None, f"error: {e}"
+                    row["solve_s"] = time.perf_counter() - ts
+                    if w is not None:
+                        row.update(n_holdings=int((w > 0).sum()), max_weight=w.max(), exp_return=mu_vec @ w,
+                                   exp_vol=np.sqrt(w @ Sigma @ w))
+                        weights += [{"date": date, "style": style, "model": mdl, "permno": p, "weight": w_i}
+                                    for p, w_i in zip(permnos, w) if w_i > 0]
+            diag.append(row)
+
+    diag = pd.DataFrame(diag)
+    diag["n_betas"] = len(betas)
+    diag["total_s"] = time.perf_counter() - t0
+    return pd.DataFrame(weights, columns=["date", "style", "model", "permno", "weight"]), diag
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Value / Growth weights for one month from the cached panel")
+    ap.add_argument("--date", help="month-end to rebalance at (default: latest month in the panel)")
+    ap.add_argument("--append", type=Path, help="Parquet with the new month's rows (permno, date, rexcess, style, factors)")
+    ap.add_argument("--target", type=float, default=optimiser.TARGET)
+    ap.add_argument("--cov", default="lw", choices=sorted(cov_estimators.ESTIMATORS))
+    ap.add_argument("--out", type=Path, help="write the weights here (default outputs/rebalance/weights_YYYYMMDD.parquet)")
+    a = ap.parse_args()
+
+    telemetry.start_stage("rebalance")
+    new_month = pd.read_parquet(a.append) if a.append else None
+    w, diag = rebalance(a.date, new_month, target=a.target, cov_estimator=a.cov)
+
+    date = diag["date"].iloc[0]
+    out = a.out or OUT / "rebalance" / f"weights_{date:%Y%m%d}.parquet"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    w.to_parquet(out, index=False)
+    print(diag.drop(columns=["date"]).to_string(index=False, float_format="{:.4f}".format))
+    print(f"\nSaved {len(w):,} weights for {date:%Y-%m-%d} → {out}")
@@ -1,6 +1,9 @@
 import pandas as pd
 from scipy.stats import skew, kurtosis
 from pathlib import Path
+import telemetry
+
+telemetry.start_stage("sp500_moments")
 
 OUT = Path("outputs")
 bench = OUT / "benchmarks.parquet"
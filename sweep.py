@@ -0,0 +1,180 @@
+import argparse, hashlib, itertools, json, os, subprocess, sys, time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import pandas as pd
+
+REPO = Path(__file__).resolve().parent
+
+# Pipeline stages, their upstream stages and the parameters each one reads (env overrides in 03–05)
+STAGES = {
+    "02": ("02_feasible_panel-3.py", [], []),
+    "03": ("03_betas_mu-5.py", ["02"], ["BETA_WINDOW", "LAMBDA_ROLL"]),
+    "04": ("04_cov_mat.py", ["02"], ["COV_WINDOW"]),
+    "05": ("05_optimise-3.py", ["03", "04"], ["TARGET"]),
+    "06": ("06_backtest_metrics.py", ["05"], []),
+}
+# Pinned to the stage defaults (the estimators 05 reads), so an exported BETA_ESTIMATORS /
+# COV_ESTIMATORS does not multiply the work of every job
+JOB_ENV = {"BETA_ESTIMATORS": "rolling", "COV_ESTIMATORS": "lw"}
+SWEEP_GRID = {"BETA_WINDOW": [24, 36, 60], "COV_WINDOW": [60], "TARGET": [0.004, 0.005, 0.006]}
+NO_LINK = {"run_log.jsonl", "profiles"}
+
+
+def stage_params(stage: str) -> set[str]:
+    # Parameters a stage's outputs depend on, its own plus everything upstream
+    _, ups, own = STAGES[stage]
+    return set(own).union(*(stage_params(u) for u in ups))
+
+
+class Node:
+    def __init__(self, stage: str, params: dict):
+        self.stage, self.params = stage, params
+        tag = json.dumps(params, sort_keys=True)
+        self.key = f"{stage}_{hashlib.sha1(tag.encode()).hexdigest()[:10]}" if params else stage
+        self.deps = []    # (node, names to link or None for every output)
+
+
+def build_dag(points: list[dict]) -> tuple[dict[str, Node], list[dict[str, Node]]]:
+    # One node per (stage, relevant parameter values); grid points that agree on every parameter a
+    # stage reads share its node. 03 nodes that differ only in LAMBDA_ROLL reuse the beta parts of
+    # the first one and just rebuild μ
+    nodes, per_point, beta_owner = {}, [], {}
+
+    def node(stage, point):
+        params = {k: point[k] for k in sorted(stage_params(stage)) if k in point}
+        n = Node(stage, params)
+        if n.key in nodes:
+            return nodes[n.key]
+        nodes[n.key] = n
+        n.deps = [(node(u, point), None) for u in STAGES[stage][1]]
+        if stage == "03":
+            bw = params.get("BETA_WINDOW")
+            if bw in beta_owner:
+                n.deps.append((beta_owner[bw], ["beta_parts", "permnos_done.txt"]))
+            else:
+                beta_owner[bw] = n
+        return n
+
+    for point in points:
+        per_point.append({s: node(s, point) for s in STAGES})
+    return nodes, per_point
+
+
+def prepare(n: Node, base: Path, root: Path) -> Path:
+    # Job directory: raw inputs linked from the base, upstream outputs linked into outputs/
+    wd = root / "jobs" / n.key
+    out = wd / "outputs"
+    out.mkdir(parents=True, exist_ok=True)
+    for fp in base.iterdir():
+        if fp.is_file() and not (wd / fp.name).exists():
+            (wd / fp.name).symlink_to(fp.resolve())
+    for dep, names in n.deps:
+        for fp in (root / "jobs" / dep.key / "outputs").iterdir():
+            if fp.name in NO_LINK or (names is not None and fp.name not in names):
+                continue
+            if not (out / fp.name).exists() and not (out / fp.name).is_symlink():
+                (out / fp.name).symlink_to(fp.resolve())
+    return wd
+
+
+def run_job(script: str, wd: str, env: dict) -> tuple[int, float, str]:
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, str(REPO / script)], cwd=wd, env=env, capture_output=True, text=True)
+    Path(wd, "job.log").write_text(proc.stdout + proc.stderr)
+    return proc.returncode, time.perf_counter() - t0, (proc.stderr.strip().splitlines() or [""])[-1]
+
+
+def run_dag(nodes: dict[str, Node], base: Path, root: Path, workers: int) -> dict[str, bool]:
+    # Each job starts as soon as everything it depends on has finished; finished jobs (.done) are skipped
+    status = {k: True for k in nodes if (root / "jobs" / k / ".done").exists()}
+    pending = {k: n for k, n in nodes.items() if k not in status}
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        while pending or running:
+            for k, n in list(pending.items()):
+                deps = [d.key for d, _ in n.deps]
+                if any(status.get(d) is False for d in deps):
+                    status[k] = False
+                    del pending[k]
+                    print(f"  skip {k} (upstream failed)")
+                elif all(status.get(d) for d in deps):
+                    wd = prepare(n, base, root)
+                    env = {**os.environ, **JOB_ENV, **{p: str(v) for p, v in n.params.items()},
+                           "RUN_ID": f"sweep-{n.key}", "RUN_LOG": str(wd / "outputs" / "run_log.jsonl")}
+                    running[ex.submit(run_job, STAGES[n.stage][0], str(wd), env)] = (k, wd)
+                    del pending[k]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                k, wd = running.pop(fut)
+                rc, wall, err = fut.result()
+                status[k] = rc == 0
+                if rc == 0:
+                    (wd / ".done").touch()
+                print(f"  {k:<16} {wall:7.1f} s  {'ok' if rc == 0 else 'FAILED: ' + err}")
+    return status
+
+
+def collect(per_point: list[dict], points: list[dict], root: Path, window: str = "Full") -> pd.DataFrame:
+    rows = []
+    for point, chain in zip(points, per_point):
+        fp = root / "jobs" / chain["06"].key / "outputs" / "risk_metrics.parquet"
+        if not fp.exists():
+            continue
+        m = pd.read_parquet(fp)
+        m = m[m["window"] == window].drop(columns=["window", "start", "end"], errors="ignore")
+        rows.append(m.assign(**point, job=chain["06"].key))
+    return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+
+def parse_value(k: str, v: str):
+    # Integer where the text is one ("36"), float otherwise ("0.005", "5e-3")
+    try:
+        return int(v)
+    except ValueError:
+        try:
+            return float(v)
+        except ValueError:
+            raise SystemExit(f"Bad value {v!r} for sweep parameter {k}; expected a number") from None
+
+
+def parse_grid(items: list[str]) -> dict:
+    grid = {}
+    for it in items:
+        k, _, vals = it.partition("=")
+        if k not in stage_params("06"):
+            raise SystemExit(f"Unknown sweep parameter {k!r}; choose from {sorted(stage_params('06'))}")
+        grid[k] = [parse_value(k, v) for v in vals.split(",")]
+    return grid
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run stages 02–06 over a parameter grid, sharing intermediates")
+    ap.add_argument("--base", type=Path, default=Path("."), help="directory with crsp_clean / comp_clean / french_factors")
+    ap.add_argument("--out", type=Path, default=Path("sweeps/default"))
+    ap.add_argument("--grid", nargs="*", help="PARAM=v1,v2,... (default SWEEP_GRID)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    a = ap.parse_args()
+
+    grid = parse_grid(a.grid) if a.grid else SWEEP_GRID
+    points = [dict(zip(grid, combo)) for combo in itertools.product(*grid.values())]
+    nodes, per_point = build_dag(points)
+    naive = len(points) * len(STAGES)
+    print(f"{len(points)} grid points → {len(nodes)} jobs (vs {naive} without sharing)")
+
+    a.out.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    status = run_dag(nodes, a.base.resolve(), a.out.resolve(), a.workers)
+    print(f"\n{sum(status.values())}/{len(nodes)} jobs ok in {(time.perf_counter() - t0) / 60:.1f} min")
+
+    res = collect(per_point, points, a.out)
+    if res.empty:
+        sys.exit("No results collected")
+    res.to_parquet(a.out / "results.parquet", index=False)
+    res.to_csv(a.out / "results.csv", index=False)
+
+    pd.set_option("display.width", 160)
+    print("\n=====  Full-sample Sharpe by grid point  =====")
+    print(res.pivot_table(index=list(grid), columns="strategy", values="sharpe").to_string(float_format="{:+.4f}".format))
+    print(f"\nSaved {a.out / 'results.parquet'} ({len(res):,} rows)")
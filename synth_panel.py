@@ -0,0 +1,231 @@
+import argparse
+from pathlib import Path
+import numpy as np, pandas as pd
+import panel_io
+
+# Monthly factor moments (decimal), roughly matching the 1963-2024 French data
+FACTORS = ["MKT_RF", "SMB", "HML", "RMW", "CMA"]
+FACTOR_MU = np.array([0.0058, 0.0020, 0.0030, 0.0027, 0.0026])
+FACTOR_VOL = np.array([0.045, 0.030, 0.029, 0.022, 0.020])
+FACTOR_CORR = np.array([
+    [ 1.00,  0.28, -0.20, -0.22, -0.38],
+    [ 0.28,  1.00, -0.05, -0.35, -0.08],
+    [-0.20, -0.05,  1.00,  0.10,  0.68],
+    [-0.22, -0.35,  0.10,  1.00,  0.05],
+    [-0.38, -0.08,  0.68,  0.05,  1.00],
+])
+BETA_MU = np.array([1.0, 0.5, 0.2, 0.1, 0.05])
+BETA_SD = np.array([0.35, 0.6, 0.6, 0.4, 0.4])
+DAYS_PER_MONTH = 21
+
+
+def make_factors(dates: pd.DatetimeIndex, rng: np.random.Generator) -> pd.DataFrame:
+    cov = FACTOR_CORR * np.outer(FACTOR_VOL, FACTOR_VOL)
+    f = rng.multivariate_normal(FACTOR_MU, cov, size=len(dates))
+    rf = np.empty(len(dates))
+    rf[0] = 0.004
+    for t in range(1, len(dates)):  # slow-moving, non-negative T-bill rate
+        rf[t] = max(0.0, 0.0003 + 0.92 * rf[t - 1] + rng.normal(0, 0.0004))
+    out = pd.DataFrame(f, columns=FACTORS)
+    out.insert(0, "date", dates)
+    out["RF"] = rf
+    return out[["date", "HML", "MKT_RF", "RF", "SMB", "RMW", "CMA"]]
+
+
+def make_crsp(dates: pd.DatetimeIndex, factors: pd.DataFrame, n_permnos: int,
+              missing_rate: float, rng: np.random.Generator) -> pd.DataFrame:
+    T, N = len(dates), n_permnos
+
+    # Listing spells: some stocks live through the sample, others enter/exit
+    first = rng.integers(-T // 2, int(T * 0.8), size=N).clip(0, T - 12)
+    life = rng.geometric(1 / max(T * 0.6, 12), size=N).clip(12, None)
+    last = np.minimum(first + life, T) - 1
+
+    permno = 10000 + rng.choice(90000, size=N, replace=False)
+    beta = BETA_MU + rng.standard_normal((N, 5)) * BETA_SD
+    ivol = np.exp(rng.normal(np.log(0.08), 0.4, size=N))
+    exchcd = rng.choice([1.0, 2.0, 3.0], size=N, p=[0.4, 0.1, 0.5])  # float codes, as returned by raw_sql
+    shrcd = rng.choice([10.0, 11.0], size=N, p=[0.3, 0.7])
+
+    f = factors.set_index("date").loc[dates, FACTORS].to_numpy()
+    rf = factors.set_index("date").loc[dates, "RF"].to_numpy()
+
+    # Long panel of live stock-months
+    n_obs = last - first + 1
+    i_idx = np.repeat(np.arange(N), n_obs)
+    t_idx = np.concatenate([np.arange(a, b + 1) for a, b in zip(first, last)])
+
+    eps = rng.standard_normal(len(i_idx)) * ivol[i_idx]
+    ret = rf[t_idx] + np.einsum("nk,nk->n", beta[i_idx], f[t_idx]) + eps
+    ret = np.maximum(ret, -0.95)
+
+    # Prices follow the return path from a random start; ~5% bid/ask averages are negative
+    start_px = np.exp(rng.normal(3.0, 1.0, size=N))
+    grp_start = np.concatenate([[0], np.cumsum(n_obs)[:-1]])
+    log_growth = np.log1p(ret)
+    cum = np.cumsum(log_growth)
+    cum -= np.repeat(cum[grp_start] - log_growth[grp_start], n_obs)
+    prc = start_px[i_idx] * np.exp(cum)
+    prc[rng.random(len(prc)) < 0.05] *= -1
+    shrout = np.exp(rng.normal(10.0, 1.2, size=N))[i_idx] * np.exp(rng.normal(0, 0.02, len(i_idx)))
+
+    # Delisting returns on the final month of spells that end inside the sample
+    dlret = np.full(len(i_idx), np.nan)
+    grp_end = grp_start + n_obs - 1
+    delist = grp_end[(last < T - 1) & (rng.random(N) < 0.3)]
+    dlret[delist] = rng.normal(-0.10, 0.20, size=len(delist))
+
+    crsp = pd.DataFrame({
+        "permno": permno[i_idx],
+        "date": dates[t_idx],
+        "shrcd": shrcd[i_idx],
+        "exchcd": exchcd[i_idx],
+        "ret": ret,
+        "dlret": dlret,
+        "prc": prc,
+        "shrout": shrout,
+    })
+
+    # Missing data: half as absent stock-months, half as missing returns
+    u = rng.random(len(crsp))
+    crsp.loc[u < missing_rate / 2, "ret"] = np.nan
+    crsp = crsp[(u < missing_rate / 2) | (u >= missing_rate)].reset_index(drop=True)
+
+    crsp["mktcap"] = crsp["prc"].abs() * crsp["shrout"]
+    crsp["retx"] = (1 + crsp["ret"].fillna(0)) * (1 + crsp["dlret"].fillna(0)) - 1
+    return crsp
+
+
+def make_daily(crsp: pd.DataFrame, factors: pd.DataFrame, missing_rate: float, rng: np.random.Generator):
+    # Weekday returns over each stock's listed months, with the monthly moments scaled to a day.
+    # Drawn separately from the monthly panel (own betas, not aggregated into it)
+    dates = pd.bdate_range(crsp["date"].min() - pd.offsets.MonthBegin(1), crsp["date"].max())
+    month = dates + pd.offsets.MonthEnd(0)
+    cov = FACTOR_CORR * np.outer(FACTOR_VOL, FACTOR_VOL) / DAYS_PER_MONTH
+    f = rng.multivariate_normal(FACTOR_MU / DAYS_PER_MONTH, cov, size=len(dates))
+    rf = factors.set_index("date")["RF"].reindex(month).to_numpy() / DAYS_PER_MONTH
+    fac = pd.DataFrame(f, columns=FACTORS)
+    fac.insert(0, "date", dates)
+    fac["RF"] = rf
+
+    spans = crsp.groupby("permno")["date"].agg(["min", "max"])
+    first = dates.searchsorted(spans["min"] - pd.offsets.MonthBegin(1))
+    last = dates.searchsorted(spans["max"], side="right") - 1
+    N = len(spans)
+    beta = BETA_MU + rng.standard_normal((N, 5)) * BETA_SD
+    ivol = np.exp(rng.normal(np.log(0.08), 0.4, size=N)) / np.sqrt(DAYS_PER_MONTH)
+
+    n_obs = last - first + 1
+    i_idx = np.repeat(np.arange(N), n_obs)
+    t_idx = np.concatenate([np.arange(a, b + 1) for a, b in zip(first, last)])
+    ret = rf[t_idx] + np.einsum("nk,nk->n", beta[i_idx], f[t_idx]) + rng.standard_normal(len(i_idx)) * ivol[i_idx]
+    dsf = pd.DataFrame({"permno": spans.index.to_numpy()[i_idx], "date": dates[t_idx], "ret": np.maximum(ret, -0.95)})
+    return dsf[rng.random(len(dsf)) >= missing_rate].reset_index(drop=True), fac
+
+
+def make_comp_and_styles(crsp: pd.DataFrame, rng: np.random.Generator):
+    # Persistent stock-level book-to-market with a slow annual drift
+    crsp["year"] = crsp["date"].dt.year
+    dec = crsp.loc[crsp["date"].dt.month == 12, ["permno", "year", "mktcap", "exchcd"]]
+    dec = dec.rename(columns={"year": "fyear", "mktcap": "dec_mktcap"})
+
+    level = pd.Series(rng.normal(np.log(0.7), 0.8, size=dec["permno"].nunique()), index=dec["permno"].unique())
+    drift = rng.normal(0, 0.08, size=len(dec))
+    dec["log_bm"] = dec["permno"].map(level).to_numpy() + pd.Series(drift).groupby(dec["permno"].to_numpy()).cumsum().to_numpy()
+    comp = dec.assign(be=np.exp(dec["log_bm"]) * dec["dec_mktcap"])[["permno", "fyear", "be"]]
+
+    bm = dec.assign(bm=np.exp(dec["log_bm"]))
+    bp = bm[bm["exchcd"] == 1].groupby("fyear")["bm"].quantile([0.3, 0.7]).unstack()
+    bm = bm.join(bp, on="fyear", how="inner")
+    bm["style"] = np.select([bm["bm"] >= bm[0.7], bm["bm"] <= bm[0.3]], ["Value", "Growth"], "Neutral")
+
+    labels = bm[["permno", "fyear", "style"]].copy()
+    labels["start"] = pd.to_datetime(labels["fyear"].astype(str)) + pd.offsets.MonthEnd(6)
+    crsp = crsp.merge(labels[["permno", "style", "start"]],
+                      how="left", left_on=["permno", "date"], right_on=["permno", "start"])
+    crsp["style"] = crsp.groupby("permno")["style"].ffill()
+    return crsp, comp
+
+
+def wrds_tables(crsp: pd.DataFrame, comp: pd.DataFrame, sp500: pd.Series, dsf: pd.DataFrame = None) -> dict:
+    # Raw crsp.* / comp.* tables that reproduce the panel through the SQL in 01 and 07
+    msf = crsp[["permno", "date", "ret", "prc", "shrout"]]
+    names = (crsp.groupby("permno")
+                 .agg(namedt=("date", "min"), nameendt=("date", "max"), shrcd=("shrcd", "first"), exchcd=("exchcd", "first"))
+                 .reset_index())
+    names["namedt"] -= pd.offsets.MonthBegin(1)
+    delist = crsp.loc[crsp["dlret"].notna(), ["permno", "date", "dlret"]].rename(columns={"date": "dlstdt"})
+    gvkey = comp["permno"].map("{:06d}".format)
+    funda = pd.DataFrame({
+        "gvkey": gvkey, "datadate": pd.to_datetime(comp["fyear"].astype(str) + "-12-31"), "fyear": comp["fyear"],
+        "seq": comp["be"], "ceq": comp["be"], "txditc": 0.0, "pstkrv": 0.0,
+        "indfmt": "INDL", "datafmt": "STD", "consol": "C", "popsrc": "D",
+    })
+    link = (crsp.groupby("permno")["date"].agg(["min", "max"]).reset_index()
+                .rename(columns={"permno": "lpermno", "min": "linkdt", "max": "linkenddt"}))
+    link["linkdt"] -= pd.offsets.YearBegin(1)
+    link.insert(0, "gvkey", link["lpermno"].map("{:06d}".format))
+    link["linkenddt"] = link["linkenddt"].where(link["linkenddt"] < crsp["date"].max())  # open links are NULL
+    link["linktype"], link["linkprim"] = "LC", "P"
+    msi = sp500.rename("sprtrn").rename_axis("date").reset_index()
+    tables = {"crsp.msf": msf, "crsp.msenames": names, "crsp.msedelist": delist, "crsp.msi": msi,
+              "crsp.ccmxpf_linktable": link, "comp.funda": funda}
+    if dsf is not None:
+        tables["crsp.dsf"] = dsf
+    return tables
+
+
+def generate(out_dir=".", n_permnos=500, n_months=240, missing_rate=0.02,
+             start="1973-01-31", factor_lead=180, seed=0, db: str = None, daily: bool = False) -> dict:
+    # Writes crsp_clean / comp_clean / french_factors in the layout of 01, plus a local WRDS stand-in
+    # under <out>/wrds_local (only crsp.msi for 07 unless db asks for the full tables). daily adds
+    # crsp_daily/ and french_factors_daily.parquet as 01 writes them with DAILY=1
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    dates = pd.date_range(start, periods=n_months, freq="ME")
+    fac_dates = pd.date_range(dates[0] - pd.offsets.MonthEnd(factor_lead), periods=n_months + factor_lead, freq="ME")
+
+    factors = make_factors(fac_dates, rng)
+    crsp = make_crsp(dates, factors, n_permnos, missing_rate, rng)
+    crsp, comp = make_comp_and_styles(crsp, rng)
+
+    sp = factors.set_index("date")
+    sp500 = (sp["MKT_RF"] + sp["RF"] + rng.normal(0, 0.004, len(sp))).rename("SP500_TR").loc[dates[0]:]
+
+    panel_io.to_parquet(crsp, out_dir / "crsp_clean.parquet")
+    panel_io.to_parquet(comp, out_dir / "comp_clean.parquet")
+    panel_io.to_parquet(factors, out_dir / "french_factors.parquet", index=False)
+    dsf = None
+    if daily:
+        dsf, fac_daily = make_daily(crsp, factors, missing_rate, np.random.default_rng(seed + 1))
+        for yr, part in dsf.groupby(dsf["date"].dt.year):
+            panel_io.write_daily_year(part, yr, out_dir / panel_io.DAILY_DIR)
+        fac_daily.astype({c: "float32" for c in panel_io.FACTOR_COLS}).to_parquet(out_dir / panel_io.DAILY_FACTORS_FILE, index=False)
+
+    import query_backend
+    tables = wrds_tables(crsp, comp, sp500, dsf)
+    if not db:
+        tables = {"crsp.msi": tables["crsp.msi"]}
+    query_backend.write_local_db(out_dir / "wrds_local", tables, kind=db or "sqlite")
+    return {"crsp_rows": len(crsp), "permnos": crsp["permno"].nunique(), "months": n_months,
+            "daily_rows": 0 if dsf is None else len(dsf)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Write a synthetic CRSP/Compustat/French panel")
+    ap.add_argument("--out", default=".")
+    ap.add_argument("--permnos", type=int, default=500)
+    ap.add_argument("--months", type=int, default=240)
+    ap.add_argument("--missing", type=float, default=0.02, help="share of stock-months missing")
+    ap.add_argument("--start", default="1973-01-31")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--db", choices=["sqlite", "duckdb"], help="write every WRDS table to the local stand-in, not just crsp.msi")
+    ap.add_argument("--daily", action="store_true", help="also write daily returns and factors (stage 17)")
+    a = ap.parse_args()
+
+    info = generate(a.out, a.permnos, a.months, a.missing, a.start, seed=a.seed, db=a.db, daily=a.daily)
+    print(f"Synthetic panel written to {a.out}: {info['crsp_rows']:,} rows, "
+          f"{info['permnos']:,} PERMNOs, {info['months']} months"
+          + (f", {info['daily_rows']:,} daily rows" if a.daily else ""))
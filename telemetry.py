@@ -0,0 +1,220 @@
+import atexit, json, os, socket, sys, time, uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Run log & profiler settings (override via environment)
+RUN_LOG = Path(os.environ.get("RUN_LOG", "outputs/run_log.jsonl"))
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "outputs/profiles"))
+PROFILE = os.environ.get("PROFILE", "").lower()  # "", "cprofile" or "pyinstrument"
+RUN_ID = os.environ.get("RUN_ID") or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+
+_stage = None
+_profiler = None
+_hot = {}
+_open = []
+_registered = False
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class Section:
+    def __init__(self, name: str, stage: str | None):
+        self.name, self.stage = name, stage
+        self.rows = None
+        self.extra = {}
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._rss0 = peak_rss_mb()
+        self._ts = time.time()
+
+    def add_rows(self, n: int) -> None:
+        self.rows = (self.rows or 0) + int(n)
+
+    def record(self) -> dict:
+        # ru_maxrss only ever rises: peak_rss_process_mb is the process peak so far, rss_growth_mb how
+        # much this section raised it (0 when it stayed under an earlier peak)
+        peak = peak_rss_mb()
+        return {
+            "run_id": RUN_ID,
+            "stage": self.stage,
+            "section": self.name,
+            "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._ts)),
+            "wall_s": round(time.perf_counter() - self._wall0, 4),
+            "cpu_s": round(time.process_time() - self._cpu0, 4),
+            "peak_rss_process_mb": round(peak, 1),
+            "rss_growth_mb": round(peak - self._rss0, 1),
+            "rows": self.rows,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            **self.extra,
+        }
+
+    def end(self, error: str | None = None) -> None:
+        if self in _open:
+            _open.remove(self)
+        if error:
+            self.extra["error"] = error
+        _write(self.record())
+
+
+def _write(rec: dict) -> None:
+    RUN_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with RUN_LOG.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, default=str) + "\n")
+
+
+def _start_profiler(stage: str) -> None:
+    global _profiler
+    if PROFILE == "cprofile":
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    elif PROFILE == "pyinstrument":
+        from pyinstrument import Profiler  # optional sampling profiler
+        _profiler = Profiler()
+        _profiler.start()
+    elif PROFILE:
+        print(f"[telemetry] unknown PROFILE={PROFILE!r}; profiling disabled")
+
+
+def _stop_profiler(stage: str) -> str | None:
+    if _profiler is None:
+        return None
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    if PROFILE == "cprofile":
+        _profiler.disable()
+        out = PROFILE_DIR / f"{stage}_{RUN_ID}.prof"
+        _profiler.dump_stats(out)
+    else:
+        _profiler.stop()
+        out = PROFILE_DIR / f"{stage}_{RUN_ID}.html"
+        out.write_text(_profiler.output_html(), encoding="utf-8")
+    return str(out)
+
+
+def _flush_hot() -> None:
+    for rec in _hot.values():
+        _write(rec)
+    _hot.clear()
+
+
+def _describe(exc: BaseException) -> str:
+    return f"{type(exc).__name__}: {exc}"
+
+
+def end_stage(error: str | None = None) -> None:
+    # Writes the stage record; sections still open (begin() without end(), i.e. the script died inside
+    # them) are written first, marked with the error
+    global _stage
+    _flush_hot()
+    for sec in _open[::-1]:
+        sec.end(error or "not ended")
+    if _stage is None:
+        return
+    sec, _stage = _stage, None
+    prof = _stop_profiler(sec.stage)
+    if prof:
+        sec.extra["profile"] = prof
+    sec.end(error)
+
+
+def _at_exit() -> None:
+    # sys.last_value is set by the interpreter when the script ended on an uncaught exception
+    exc = getattr(sys, "last_value", None)
+    end_stage(_describe(exc) if exc is not None else None)
+
+
+def start_stage(stage: str) -> Section:
+    # Whole-script record, written at interpreter exit (also on sys.exit / Ctrl-C)
+    global _stage, _registered
+    end_stage()
+    _stage = Section("__stage__", stage)
+    _start_profiler(stage)
+    if not _registered:
+        atexit.register(_at_exit)
+        _registered = True
+    return _stage
+
+
+def begin(name: str, rows: int | None = None) -> Section:
+    # Start/stop form of section() for top-level script blocks: sec = begin(...) ... sec.end(). A block
+    # that raises before end() is written by end_stage() with the exception as its "error"
+    sec = Section(name, _stage.stage if _stage else None)
+    if rows is not None:
+        sec.add_rows(rows)
+    _open.append(sec)
+    return sec
+
+
+@contextmanager
+def section(name: str, rows: int | None = None):
+    sec = begin(name, rows)
+    try:
+        yield sec
+    except Exception as exc:
+        sec.end(_describe(exc))
+        raise
+    finally:
+        if sec in _open:
+            sec.end()
+
+
+@contextmanager
+def hot(name: str, rows: int | None = None):
+    # Like section(), but aggregated over many short calls into one record at stage end
+    sec = Section(name, _stage.stage if _stage else None)
+    if rows is not None:
+        sec.add_rows(rows)
+    try:
+        yield sec
+    finally:
+        rec = sec.record()
+        agg = _hot.setdefault(name, {**rec, "wall_s": 0.0, "cpu_s": 0.0, "rows": None, "calls": 0})
+        agg["wall_s"] = round(agg["wall_s"] + rec["wall_s"], 4)
+        agg["cpu_s"] = round(agg["cpu_s"] + rec["cpu_s"], 4)
+        agg["peak_rss_process_mb"] = rec["peak_rss_process_mb"]
+        agg["rss_growth_mb"] = max(agg["rss_growth_mb"], rec["rss_growth_mb"])
+        agg["calls"] += 1
+        if rec["rows"] is not None:
+            agg["rows"] = (agg["rows"] or 0) + rec["rows"]
+
+
+def load_log(path: Path = RUN_LOG):
+    import pandas as pd
+    return pd.read_json(path, lines=True)
+
+
+# Summary of one run (default: latest) or comparison of two runs
+if __name__ == "__main__":
+    log = load_log()
+    runs = log["run_id"].drop_duplicates().tolist()
+    picked = sys.argv[1:] or runs[-1:]
+    cols = ["wall_s", "cpu_s", "peak_rss_process_mb", "rss_growth_mb", "rows"]
+
+    tables = {}
+    for rid in picked:
+        sub = log[log["run_id"] == rid]
+        tables[rid] = sub.groupby(["stage", "section"], sort=False)[cols].agg(
+            {"wall_s": "sum", "cpu_s": "sum", "peak_rss_process_mb": "max", "rss_growth_mb": "max", "rows": "sum"})
+
+    if len(tables) == 1:
+        rid, tab = next(iter(tables.items()))
+        print(f"Run {rid}")
+        print(tab.to_string())
+    else:
+        import pandas as pd
+        cmp = pd.concat(tables, axis=1)
+        a, b = picked[:2]
+        cmp[("delta", "wall_s")] = cmp[(b, "wall_s")] - cmp[(a, "wall_s")]
+        print(cmp.to_string())
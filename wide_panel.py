@@ -0,0 +1,95 @@
+from pathlib import Path
+import numpy as np, pandas as pd
+import panel_io
+
+# Dense date × PERMNO arrays as memory-mapped .npy files, shared read-only by every stage
+WIDE_DIR = Path("outputs/wide")
+REQUIRED = ["rexcess", "MKT_RF", "SMB", "HML", "RMW", "CMA"]
+NO_STYLE = -1
+
+
+def build(panel: pd.DataFrame = None, root=WIDE_DIR) -> int:
+    # rexcess / mktcap (float32, NaN = missing), style (int8 code into panel_io.STYLES, -1 = none),
+    # valid (rexcess and all five factors present) plus the date and PERMNO index arrays. Returns the
+    # number of duplicate (permno, date) rows dropped
+    if panel is None:
+        panel = panel_io.read_panel(["permno", "date", "rexcess", "mktcap", "style", *REQUIRED[1:]])
+    root = Path(root)
+
+    # One row per cell: of duplicate (permno, date) rows the first with a return is kept, in panel
+    # order, rather than whichever the scatter below happens to write last
+    n_rows = len(panel)
+    if panel.duplicated(["permno", "date"]).any():
+        order = panel["rexcess"].isna().to_numpy().argsort(kind="stable")
+        panel = panel.iloc[order].drop_duplicates(["permno", "date"], keep="first")
+    root.mkdir(parents=True, exist_ok=True)
+
+    dates = np.sort(panel["date"].unique()).astype("datetime64[ns]")
+    permnos = np.sort(panel["permno"].unique()).astype(np.int32)
+    ti = np.searchsorted(dates, panel["date"].to_numpy().astype("datetime64[ns]"))
+    pi = np.searchsorted(permnos, panel["permno"].to_numpy())
+    shape = (len(dates), len(permnos))
+
+    np.save(root / "dates.npy", dates)
+    np.save(root / "permnos.npy", permnos)
+
+    def _fill(name, values, dtype, fill):
+        arr = np.lib.format.open_memmap(root / f"{name}.npy", mode="w+", dtype=dtype, shape=shape)
+        arr[:] = fill
+        arr[ti, pi] = values
+        arr.flush()
+        del arr
+
+    style = panel["style"].astype(panel_io.STYLE_DTYPE).cat.codes.to_numpy().astype(np.int8)
+    _fill("rexcess", panel["rexcess"].to_numpy(np.float32, na_value=np.nan), np.float32, np.nan)
+    _fill("mktcap", panel["mktcap"].to_numpy(np.float32, na_value=np.nan), np.float32, np.nan)
+    _fill("style", style, np.int8, NO_STYLE)
+    _fill("valid", panel[REQUIRED].notna().all(axis=1).to_numpy(), np.bool_, False)
+    return n_rows - len(panel)
+
+
+class WidePanel:
+    def __init__(self, root=WIDE_DIR):
+        root = Path(root)
+        self.dates = pd.DatetimeIndex(np.load(root / "dates.npy"))
+        self.permnos = np.load(root / "permnos.npy")
+        self.rexcess = np.load(root / "rexcess.npy", mmap_mode="r")
+        self.mktcap = np.load(root / "mktcap.npy", mmap_mode="r")
+        self.style = np.load(root / "style.npy", mmap_mode="r")
+        self.valid = np.load(root / "valid.npy", mmap_mode="r")
+
+    @property
+    def shape(self):
+        return self.rexcess.shape
+
+    def rows(self, start=None, end=None) -> slice:
+        # Date range as a slice, so array[rows] stays a zero-copy view of the memmap
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), "left")
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), "right")
+        return slice(lo, hi)
+
+    def row(self, date) -> int:
+        i = self.dates.searchsorted(pd.Timestamp(date))
+        return i if i < len(self.dates) and self.dates[i] == pd.Timestamp(date) else -1
+
+    def cols(self, permnos) -> np.ndarray:
+        # Column positions of the given PERMNOs (-1 where absent)
+        permnos = np.asarray(permnos)
+        j = np.searchsorted(self.permnos, permnos).clip(0, len(self.permnos) - 1)
+        return np.where(self.permnos[j] == permnos, j, -1)
+
+    def style_code(self, style: str) -> int:
+        return panel_io.STYLES.index(style)
+
+    def lookup(self, arr: np.ndarray, dates, permnos, dtype=np.float64) -> np.ndarray:
+        # Gather arr[date, permno] for long-format keys; NaN where the pair is outside the grid
+        ti = self.dates.get_indexer(pd.DatetimeIndex(dates))
+        pj = self.cols(permnos)
+        ok = (ti >= 0) & (pj >= 0)
+        out = np.full(len(ti), np.nan, dtype=dtype)
+        out[ok] = arr[ti[ok], pj[ok]]
+        return out
+
+
+def load(root=WIDE_DIR) -> WidePanel:
+    return WidePanel(root)